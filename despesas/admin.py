@@ -1,6 +1,6 @@
 from django.contrib import admin
 from django.db.models import QuerySet
-from .models import Categoria, Despesa, ItemDespesa, Usuario
+from .models import Categoria, Despesa, EmitenteCNPJ, ItemDespesa, Usuario
 
 class OwnedByUserAdmin(admin.ModelAdmin):
     owner_field_name = "user" 
@@ -47,4 +47,11 @@ class DespesaAdmin(OwnedByUserAdmin):
 @admin.register(Usuario)
 class UsuarioAdmin(admin.ModelAdmin):
     list_display = ("user", "email", "moeda")
-    def email(self, obj): return obj.user.email
\ No newline at end of file
+    def email(self, obj): return obj.user.email
+
+@admin.register(EmitenteCNPJ)
+class EmitenteCNPJAdmin(admin.ModelAdmin):
+    list_display = ("cnpj", "nome", "categoria_padrao", "host_sefaz", "notas_importadas", "atualizado_em")
+    list_filter = ("categoria_padrao", "host_sefaz")
+    search_fields = ("cnpj", "nome", "nome_normalizado")
+    readonly_fields = ("notas_importadas", "criado_em", "atualizado_em")
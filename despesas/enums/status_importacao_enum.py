@@ -0,0 +1,8 @@
+from django.db import models
+
+class StatusImportacao(models.TextChoices):
+    PENDENTE = "PENDENTE", "Pendente"
+    PROCESSANDO = "PROCESSANDO", "Processando"
+    CONCLUIDA = "CONCLUIDA", "Concluída"
+    ERRO = "ERRO", "Erro"
+    CANCELADA = "CANCELADA", "Cancelada"
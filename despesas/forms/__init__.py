@@ -1,6 +1,6 @@
 from .categoria import CategoriaForm
 from .despesa import DespesaForm, ItemDespesaForm, ItemDespesaFormSet
-from .leitura_nf import UploadNFeForm
+from .leitura_nf import UploadNFeForm, UploadLoteNFeForm
 from .receita import ReceitaForm
 from .configuracao import ConfiguracaoNotificacaoForm, ConfiguracaoRendaForm
 
@@ -11,6 +11,7 @@ __all__ = [
     "ItemDespesaForm", 
     "ItemDespesaFormSet",
     "UploadNFeForm",
+    "UploadLoteNFeForm",
     "ReceitaForm",
     "ConfiguracaoNotificacaoForm",
     "ConfiguracaoRendaForm"
@@ -3,6 +3,7 @@ from django import forms
 from django.forms import inlineformset_factory
 from despesas.models import Despesa, Categoria, ItemDespesa
 from despesas.enums.forma_pagamento_enum import FormaPagamento
+from despesas.services.chave_acesso import validar_chave_acesso
 
 def converter_para_decimal(valor_raw):
     """
@@ -65,7 +66,7 @@ class DespesaForm(forms.ModelForm):
         model = Despesa
         fields = [
             "categoria", "emitente_nome", "emitente_cnpj", "descricao", 
-            "valor", "desconto", "forma_pagamento", "tipo", "data", "observacoes"
+            "valor", "desconto", "forma_pagamento", "tipo", "data", "observacoes", "chave_acesso"
         ]
         widgets = {
             "categoria": forms.Select(attrs={"class": "form-select"}),
@@ -76,11 +77,13 @@ class DespesaForm(forms.ModelForm):
             "tipo": forms.Select(attrs={"class": "form-select"}),
             "data": forms.DateInput(format='%Y-%m-%d', attrs={"class": "form-control", "type": "date"}),
             "observacoes": forms.Textarea(attrs={"class": "form-control", "rows": 2}),
+            "chave_acesso": forms.HiddenInput(),
         }
 
     def __init__(self, *args, **kwargs):
         user = kwargs.pop("user", None)
         super().__init__(*args, **kwargs)
+        self.user = user
         if user:
             self.fields["categoria"].queryset = Categoria.objects.filter(user=user).order_by("nome")
         
@@ -100,6 +103,24 @@ class DespesaForm(forms.ModelForm):
     def clean_desconto(self):
         return converter_para_decimal(self.cleaned_data.get('desconto'))
 
+    def clean_chave_acesso(self):
+        """
+        Valida a chave da nota importada e impede lançar a mesma nota duas vezes.
+
+        Raises:
+            forms.ValidationError: Se o dígito verificador não confere ou se o usuário
+            já tem uma despesa com a mesma chave.
+        """
+        chave = (self.cleaned_data.get('chave_acesso') or '').strip() or None
+        if not chave:
+            return None
+        if not validar_chave_acesso(chave):
+            raise forms.ValidationError("Chave de acesso inválida.")
+        user_id = self.user.pk if self.user else self.instance.user_id
+        if user_id and Despesa.objects.filter(user_id=user_id, chave_acesso=chave).exclude(pk=self.instance.pk).exists():
+            raise forms.ValidationError("Esta nota já foi lançada.")
+        return chave
+
 
 class ItemDespesaForm(forms.ModelForm):
     """
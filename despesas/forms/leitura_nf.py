@@ -1,12 +1,104 @@
-
+import os
 from django import forms
+from django.conf import settings
+from despesas.uploads import descrever_tamanho
+
+TIPOS_ZIP = {"application/zip", "application/x-zip-compressed"}
+TIPOS_XML = {"application/xml", "text/xml"}
+
+EXTENSOES_NOTA = {
+    ".jpg": "image/jpeg",
+    ".jpeg": "image/jpeg",
+    ".png": "image/png",
+    ".pdf": "application/pdf",
+    ".xml": "application/xml",
+}
+
+
+def eh_zip(f) -> bool:
+    return (f.content_type or "").lower() in TIPOS_ZIP or (f.name or "").lower().endswith(".zip")
+
+
+def expandir_zip(f, extensoes: dict) -> list:
+    """
+    Extrai de um ZIP os arquivos com as extensões aceitas.
+
+    Args:
+        f (UploadedFile): Arquivo ZIP enviado.
+        extensoes (dict): Extensões aceitas e o content-type atribuído a cada uma.
+
+    Cada membro é descompactado em streaming para um arquivo temporário, como os
+    demais uploads, sem passar inteiro pela memória.
+
+    Returns:
+        list[TemporaryUploadedFile]: Arquivos extraídos, na ordem do ZIP.
+
+    Raises:
+        forms.ValidationError: Se o ZIP é inválido ou excede `NFE_LOTE_TAMANHO_MAXIMO_ZIP`
+            (ou um membro excede `NFE_UPLOAD_TAMANHO_MAXIMO`).
+    """
+    import shutil
+    from zipfile import ZipFile, BadZipFile
+    from django.core.files.uploadedfile import TemporaryUploadedFile
+
+    try:
+        with ZipFile(f) as zf:
+            membros = [m for m in zf.infolist() if not m.is_dir()]
+            if sum(m.file_size for m in membros) > settings.NFE_LOTE_TAMANHO_MAXIMO_ZIP:
+                limite = descrever_tamanho(settings.NFE_LOTE_TAMANHO_MAXIMO_ZIP)
+                raise forms.ValidationError(f"O arquivo ZIP é grande demais (limite de {limite} descompactado).")
+            extraidos = []
+            for membro in membros:
+                nome = os.path.basename(membro.filename)
+                ext = os.path.splitext(nome)[1].lower()
+                if nome.startswith(".") or ext not in extensoes:
+                    continue
+                if membro.file_size > settings.NFE_UPLOAD_TAMANHO_MAXIMO:
+                    limite = descrever_tamanho(settings.NFE_UPLOAD_TAMANHO_MAXIMO)
+                    raise forms.ValidationError(f"{nome}: o arquivo é grande demais (limite de {limite} por nota).")
+                extraido = TemporaryUploadedFile(nome, extensoes[ext], membro.file_size, None)
+                with zf.open(membro) as origem:
+                    shutil.copyfileobj(origem, extraido.file, 1024 * 1024)
+                extraido.file.seek(0)
+                extraidos.append(extraido)
+            return extraidos
+    except BadZipFile:
+        raise forms.ValidationError(f"O arquivo {f.name} não é um ZIP válido.")
+
+
+class FormularioUpload(forms.Form):
+    """
+    Base dos formulários de upload: reporta os arquivos recusados durante a leitura.
+
+    Args:
+        recusados (list[tuple[str, int]], optional): Arquivos descartados pelo
+            `LimiteTamanhoUploadHandler` e o limite aplicado a cada um (`request.uploads_recusados`).
+    """
+    campo_arquivo = None
+
+    def __init__(self, *args, recusados=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.recusados = list(recusados or [])
 
-class UploadNFeForm(forms.Form):
+    def clean(self):
+        cleaned_data = super().clean()
+        if self.recusados:
+            self._errors.pop(self.campo_arquivo, None)
+            for nome, limite in self.recusados:
+                self.add_error(
+                    self.campo_arquivo,
+                    f"{nome}: arquivo grande demais (limite de {descrever_tamanho(limite)}).",
+                )
+        return cleaned_data
+
+
+class UploadNFeForm(FormularioUpload):
+    campo_arquivo = "imagem"
     imagem = forms.FileField(
-        label="Imagem ou PDF da NF-e",
+        label="Imagem, PDF ou XML da NF-e",
         widget=forms.ClearableFileInput(
             attrs={
-                "accept": "image/*,application/pdf",
+                "accept": "image/*,application/pdf,.xml,.zip",
             }
         ),
     )
@@ -15,14 +107,69 @@ class UploadNFeForm(forms.Form):
         f = self.cleaned_data["imagem"]
         ct = (f.content_type or "").lower()
 
+        if eh_zip(f):
+            extraidos = expandir_zip(f, {".xml": "application/xml", ".pdf": "application/pdf"})
+            xmls = [a for a in extraidos if a.content_type == "application/xml"]
+            if not (xmls or extraidos):
+                raise forms.ValidationError("O ZIP não contém o XML nem o PDF da nota fiscal.")
+            return (xmls or extraidos)[0]
+
         tipos_permitidos = {
             "image/jpeg",
             "image/png",
             "application/pdf",
-        }
+        } | TIPOS_XML
 
-        if ct not in tipos_permitidos:
+        if ct not in tipos_permitidos and not (f.name or "").lower().endswith(".xml"):
             raise forms.ValidationError(
-                "Envie uma imagem (JPG/PNG) ou um PDF da nota fiscal."
+                "Envie uma imagem (JPG/PNG), o PDF ou o XML da nota fiscal."
             )
         return f
+
+
+class MultipleFileInput(forms.ClearableFileInput):
+    allow_multiple_selected = True
+
+
+class MultipleFileField(forms.FileField):
+    def __init__(self, *args, **kwargs):
+        kwargs.setdefault("widget", MultipleFileInput())
+        super().__init__(*args, **kwargs)
+
+    def clean(self, data, initial=None):
+        limpar_um = super().clean
+        if isinstance(data, (list, tuple)):
+            return [limpar_um(d, initial) for d in data]
+        return [limpar_um(data, initial)]
+
+
+class UploadLoteNFeForm(FormularioUpload):
+    campo_arquivo = "arquivos"
+    arquivos = MultipleFileField(
+        label="Imagens, PDFs, XMLs ou ZIP das notas",
+        widget=MultipleFileInput(
+            attrs={
+                "accept": "image/*,application/pdf,.xml,.zip",
+            }
+        ),
+    )
+
+    def clean_arquivos(self):
+        arquivos = []
+        for f in self.cleaned_data["arquivos"]:
+            ct = (f.content_type or "").lower()
+            ext = os.path.splitext(f.name or "")[1].lower()
+            if eh_zip(f):
+                arquivos.extend(expandir_zip(f, EXTENSOES_NOTA))
+            elif ct in EXTENSOES_NOTA.values() or ct in TIPOS_XML or ext == ".xml":
+                arquivos.append(f)
+            else:
+                raise forms.ValidationError(
+                    f"{f.name}: envie imagens (JPG/PNG), PDFs, XMLs ou um ZIP com as notas."
+                )
+
+        if not arquivos:
+            raise forms.ValidationError("Nenhuma nota encontrada nos arquivos enviados.")
+        if len(arquivos) > settings.NFE_LOTE_MAX_ARQUIVOS:
+            raise forms.ValidationError(f"Envie no máximo {settings.NFE_LOTE_MAX_ARQUIVOS} notas por lote.")
+        return arquivos
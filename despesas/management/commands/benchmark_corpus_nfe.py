@@ -0,0 +1,210 @@
+import json
+import logging
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from io import BytesIO
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from despesas.management.commands.benchmark_nfe import (
+    EMITENTES_EXEMPLO,
+    gerar_foto_qr,
+    gerar_html_nfce,
+    gerar_pdf_danfe,
+)
+from despesas.services.nfe_service import NFeService
+
+CORPUS_PADRAO = Path(__file__).resolve().parents[2] / "benchmarks" / "corpus"
+ETAPAS = ["decodificacao", "html", "pdf", "categoria"]
+
+URL_QR_CORPUS = "https://www.sefaz.rs.gov.br/NFCE/NFCE-COM.aspx?p=43260106990590000123650010000012341000012342|2|1|1|ABCDEF"
+ITENS_HTML = [10, 50, 150, 500]
+PAGINAS_PDF = [1, 5, 10, 20]
+ITENS_POR_PAGINA_PDF = 60
+FOTOS = [(1280, 960, 240), (2048, 1536, 380), (4000, 3000, 600)]
+
+
+class _ServiceSemDiretorio(NFeService):
+    """Serviço que não consulta nem atualiza o diretório de emitentes (mede só a extração)."""
+
+    def aplicar_diretorio_emitentes(self, dados: dict, url: str | None = None) -> dict:
+        return dados
+
+
+def gerar_corpus(destino: Path) -> dict:
+    """
+    Grava o corpus sintético de benchmark e o manifesto com os valores esperados.
+
+    Args:
+        destino (Path): Diretório do corpus (criado se não existir).
+
+    Returns:
+        dict: Manifesto gravado em `manifesto.json`.
+    """
+    for pasta in ("html", "pdf", "fotos"):
+        (destino / pasta).mkdir(parents=True, exist_ok=True)
+
+    manifesto = {"html": [], "pdf": [], "fotos": [], "emitentes": "emitentes.txt"}
+    for itens in ITENS_HTML:
+        arquivo = f"html/nfce_{itens:04d}.html"
+        (destino / arquivo).write_text(gerar_html_nfce(itens), encoding="utf-8")
+        manifesto["html"].append({"arquivo": arquivo, "itens": itens})
+
+    for paginas in PAGINAS_PDF:
+        itens = paginas * ITENS_POR_PAGINA_PDF - 10
+        arquivo = f"pdf/danfe_{paginas:02d}p.pdf"
+        (destino / arquivo).write_bytes(gerar_pdf_danfe(itens, ITENS_POR_PAGINA_PDF))
+        manifesto["pdf"].append({"arquivo": arquivo, "paginas": paginas, "itens": itens})
+
+    for largura, altura, lado_qr in FOTOS:
+        arquivo = f"fotos/qr_{largura}x{altura}.jpg"
+        (destino / arquivo).write_bytes(gerar_foto_qr(URL_QR_CORPUS, lado_qr=lado_qr, largura=largura, altura=altura))
+        manifesto["fotos"].append({"arquivo": arquivo, "largura": largura, "altura": altura, "lado_qr": lado_qr, "conteudo": URL_QR_CORPUS})
+
+    (destino / manifesto["emitentes"]).write_text("\n".join(EMITENTES_EXEMPLO) + "\n", encoding="utf-8")
+    (destino / "manifesto.json").write_text(json.dumps(manifesto, indent=2, ensure_ascii=False) + "\n", encoding="utf-8")
+    return manifesto
+
+
+def _commit_atual() -> str | None:
+    try:
+        saida = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=CORPUS_PADRAO.parent, capture_output=True, text=True, timeout=5
+        )
+        return saida.stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def _versoes() -> dict:
+    versoes = {}
+    for modulo in ("cv2", "lxml.etree", "pdfplumber", "bs4"):
+        try:
+            importado = __import__(modulo, fromlist=["_"])
+            versoes[modulo.split(".")[0]] = str(getattr(importado, "__version__", getattr(importado, "LXML_VERSION", "")))
+        except ImportError:
+            versoes[modulo.split(".")[0]] = None
+    return versoes
+
+
+class Command(BaseCommand):
+    help = (
+        "Mede cada etapa da importação de NFe (decodificação do QR, extração da página da SEFAZ, "
+        "leitura do DANFE em PDF e categorização) sobre o corpus versionado e grava o resultado em JSON."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--corpus", default=str(CORPUS_PADRAO), help="Diretório do corpus (com manifesto.json).")
+        parser.add_argument("--gerar", action="store_true", help="Regera o corpus sintético antes de medir.")
+        parser.add_argument("--etapas", nargs="+", choices=ETAPAS, default=ETAPAS, help="Etapas a medir.")
+        parser.add_argument("--repeticoes", type=int, default=10, help="Execuções por arquivo.")
+        parser.add_argument("--saida", help="Arquivo JSON de saída; sem ele, o JSON é escrito na saída padrão.")
+        parser.add_argument("--comparar", help="JSON de uma execução anterior para comparar as medianas.")
+
+    def _medir(self, funcao, repeticoes: int) -> tuple[object, dict]:
+        resultado = funcao()
+        tempos = []
+        for _ in range(repeticoes):
+            inicio = time.perf_counter()
+            funcao()
+            tempos.append((time.perf_counter() - inicio) * 1000)
+        tempos.sort()
+        return resultado, {
+            "repeticoes": repeticoes,
+            "min_ms": round(tempos[0], 3),
+            "mediana_ms": round(statistics.median(tempos), 3),
+            "p95_ms": round(tempos[min(len(tempos) - 1, int(len(tempos) * 0.95))], 3),
+            "media_ms": round(statistics.fmean(tempos), 3),
+        }
+
+    def _decodificacao(self, corpus: Path, manifesto: dict, repeticoes: int):
+        service = NFeService()
+        for foto in manifesto["fotos"]:
+            img_bytes = (corpus / foto["arquivo"]).read_bytes()
+            lido, tempos = self._medir(lambda: service.decodificar_qr_code_local(img_bytes), max(1, repeticoes // 2))
+            parametros = {"largura": foto["largura"], "altura": foto["altura"], "lado_qr": foto["lado_qr"]}
+            yield foto["arquivo"], parametros, lido == foto["conteudo"], tempos
+
+    def _html(self, corpus: Path, manifesto: dict, repeticoes: int):
+        from despesas.services.parsers_sefaz import PORTAL_NFCE
+        service = NFeService()
+        for pagina in manifesto["html"]:
+            html = (corpus / pagina["arquivo"]).read_text(encoding="utf-8")
+            # O parser direto: mede só a extração e não soma o benchmark às métricas de produção.
+            dados, tempos = self._medir(lambda: PORTAL_NFCE.extrair(html, service), repeticoes)
+            yield pagina["arquivo"], {"itens": pagina["itens"]}, len(dados["itens"]) == pagina["itens"], tempos
+
+    def _pdf(self, corpus: Path, manifesto: dict, repeticoes: int):
+        service = _ServiceSemDiretorio()
+        for danfe in manifesto["pdf"]:
+            conteudo = (corpus / danfe["arquivo"]).read_bytes()
+            dados, tempos = self._medir(lambda: service.processar_danfe_pdf(BytesIO(conteudo)), max(1, repeticoes // 2))
+            parametros = {"paginas": danfe["paginas"], "itens": danfe["itens"]}
+            yield danfe["arquivo"], parametros, len(dados["itens"]) == danfe["itens"], tempos
+
+    def _categoria(self, corpus: Path, manifesto: dict, repeticoes: int):
+        from despesas.services.categorizacao import sugerir_categoria
+
+        nomes = (corpus / manifesto["emitentes"]).read_text(encoding="utf-8").split("\n")
+        nomes = [nome for nome in nomes if nome.strip()]
+        sugestoes, tempos = self._medir(lambda: [sugerir_categoria(nome) for nome in nomes], repeticoes * 10)
+        tempos = {chave: (round(valor / len(nomes), 4) if chave.endswith("_ms") else valor) for chave, valor in tempos.items()}
+        yield manifesto["emitentes"], {"emitentes": len(nomes), "tempo_por": "emitente"}, any(sugestoes), tempos
+
+    def _comparar(self, resultados: list[dict], caminho: str):
+        try:
+            anterior = json.loads(Path(caminho).read_text(encoding="utf-8"))
+        except (OSError, ValueError) as e:
+            raise CommandError(f"Não foi possível ler {caminho}: {e}")
+        base = {(r["etapa"], r["arquivo"]): r for r in anterior.get("resultados", [])}
+        self.stdout.write(f"Comparação com {anterior.get('commit') or caminho}:")
+        for r in resultados:
+            antes = base.get((r["etapa"], r["arquivo"]))
+            if not antes or not r["mediana_ms"]:
+                continue
+            razao = antes["mediana_ms"] / r["mediana_ms"]
+            self.stdout.write(
+                f"  {r['etapa']:<13} {r['arquivo']:<24} {antes['mediana_ms']:>10.3f} -> {r['mediana_ms']:>10.3f} ms ({razao:.2f}x)"
+            )
+
+    def handle(self, *args, **options):
+        corpus = Path(options["corpus"])
+        if options["gerar"]:
+            gerar_corpus(corpus)
+            self.stderr.write(f"Corpus gerado em {corpus}.")
+        try:
+            manifesto = json.loads((corpus / "manifesto.json").read_text(encoding="utf-8"))
+        except (OSError, ValueError) as e:
+            raise CommandError(f"Manifesto do corpus não encontrado em {corpus} ({e}); use --gerar.")
+
+        resultados = []
+        logging.disable(logging.INFO)
+        try:
+            for etapa in options["etapas"]:
+                for arquivo, parametros, ok, tempos in getattr(self, f"_{etapa}")(corpus, manifesto, options["repeticoes"]):
+                    resultados.append({"etapa": etapa, "arquivo": arquivo, "parametros": parametros, "ok": ok, **tempos})
+                    if options["saida"]:
+                        self.stdout.write(f"{etapa:<13} {arquivo:<24} mediana {tempos['mediana_ms']:>10.3f} ms  {'ok' if ok else 'FALHOU'}")
+        finally:
+            logging.disable(logging.NOTSET)
+
+        relatorio = {
+            "commit": _commit_atual(),
+            "data": timezone.now().isoformat(),
+            "python": sys.version.split()[0],
+            "plataforma": platform.platform(),
+            "bibliotecas": _versoes(),
+            "resultados": resultados,
+        }
+        texto = json.dumps(relatorio, indent=2, ensure_ascii=False)
+        if options["saida"]:
+            Path(options["saida"]).write_text(texto + "\n", encoding="utf-8")
+        else:
+            self.stdout.write(texto)
+        if options["comparar"]:
+            self._comparar(resultados, options["comparar"])
@@ -0,0 +1,129 @@
+import json
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from despesas.management.commands.benchmark_corpus_nfe import CORPUS_PADRAO
+
+
+def _memoria_mb() -> dict:
+    """RSS atual e pico do processo (Linux: /proc; demais: apenas o pico do getrusage)."""
+    try:
+        campos = dict(
+            linha.split(":", 1) for linha in Path("/proc/self/status").read_text().splitlines() if ":" in linha
+        )
+        return {
+            "rss_mb": round(int(campos["VmRSS"].split()[0]) / 1024, 1),
+            "pico_rss_mb": round(int(campos["VmHWM"].split()[0]) / 1024, 1),
+        }
+    except (OSError, KeyError, ValueError):
+        import resource
+        pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return {"rss_mb": None, "pico_rss_mb": round(pico / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)}
+
+
+class Command(BaseCommand):
+    help = (
+        "Compara os backends do detector neural de QR (torch/QReader, onnxruntime e cv2.dnn): "
+        "tempo de carga a frio, memória (RSS) e latência por imagem, cada um em um processo novo."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--backends", nargs="+", choices=["torch", "onnxruntime", "opencv"], default=["torch", "onnxruntime", "opencv"])
+        parser.add_argument("--modelo", default=settings.QR_DETECTOR_MODELO, help="Modelo ONNX exportado.")
+        parser.add_argument("--modelo-int8", help="Modelo ONNX quantizado (medido com o onnxruntime).")
+        parser.add_argument("--fotos", nargs="+", help="Fotos a decodificar (padrão: as fotos do corpus de benchmark).")
+        parser.add_argument("--repeticoes", type=int, default=5, help="Execuções por foto após a primeira.")
+        parser.add_argument("--saida", help="Arquivo JSON de saída.")
+        parser.add_argument("--filho", help="Uso interno: mede um backend no processo atual.")
+
+    def _fotos(self, options) -> list[str]:
+        if options["fotos"]:
+            return options["fotos"]
+        manifesto = json.loads((CORPUS_PADRAO / "manifesto.json").read_text(encoding="utf-8"))
+        return [str(CORPUS_PADRAO / foto["arquivo"]) for foto in manifesto["fotos"]]
+
+    def _medir_no_processo(self, backend: str, modelo: str, fotos: list[str], repeticoes: int) -> dict:
+        from despesas.services.qr_cascata import carregar_imagem
+
+        imagens = [carregar_imagem(Path(foto).read_bytes()).imagem for foto in fotos]
+        memoria_antes = _memoria_mb()
+        inicio = time.perf_counter()
+        from despesas.services.detector_qr import criar_leitor
+        leitor = criar_leitor(backend, modelo if backend != "torch" else None)
+        carga_ms = (time.perf_counter() - inicio) * 1000
+
+        inicio = time.perf_counter()
+        lidos = [bool(any(leitor.detect_and_decode(image=imagem))) for imagem in imagens]
+        primeira_ms = (time.perf_counter() - inicio) * 1000 / len(imagens)
+
+        tempos = []
+        for _ in range(repeticoes):
+            for imagem in imagens:
+                inicio = time.perf_counter()
+                leitor.detect_and_decode(image=imagem)
+                tempos.append((time.perf_counter() - inicio) * 1000)
+
+        # Mesmas fotos em uma chamada em lote (apenas os leitores ONNX expõem a API).
+        lote_ms = None
+        if hasattr(leitor, "detect_and_decode_lote"):
+            tempos_lote = []
+            for _ in range(max(1, repeticoes)):
+                inicio = time.perf_counter()
+                leitor.detect_and_decode_lote(imagens)
+                tempos_lote.append((time.perf_counter() - inicio) * 1000 / len(imagens))
+            lote_ms = round(statistics.median(tempos_lote), 1)
+        return {
+            "backend": backend,
+            "modelo": modelo,
+            "carga_ms": round(carga_ms, 1),
+            "primeira_imagem_ms": round(primeira_ms, 1),
+            "mediana_ms": round(statistics.median(tempos), 1) if tempos else None,
+            "lote_ms_por_imagem": lote_ms,
+            "lidas": sum(lidos),
+            "fotos": len(imagens),
+            "rss_antes_mb": memoria_antes["rss_mb"],
+            **_memoria_mb(),
+        }
+
+    def handle(self, *args, **options):
+        fotos = self._fotos(options)
+        if options["filho"]:
+            resultado = self._medir_no_processo(options["filho"], options["modelo"], fotos, options["repeticoes"])
+            self.stdout.write(json.dumps(resultado))
+            return
+
+        casos = [(backend, options["modelo"] if backend != "torch" else "qreader n") for backend in options["backends"]]
+        if options["modelo_int8"]:
+            casos.append(("onnxruntime", options["modelo_int8"]))
+
+        resultados = []
+        for backend, modelo in casos:
+            comando = [
+                sys.executable, str(Path(settings.BASE_DIR) / "manage.py"), "benchmark_detector_qr",
+                "--filho", backend, "--modelo", modelo, "--repeticoes", str(options["repeticoes"]), "--fotos", *fotos,
+            ]
+            execucao = subprocess.run(comando, capture_output=True, text=True)
+            linhas = execucao.stdout.strip().splitlines()
+            if execucao.returncode != 0 or not linhas:
+                erro = (execucao.stderr.strip().splitlines() or ["sem saída"])[-1]
+                self.stderr.write(f"{backend} ({modelo}): falhou - {erro}")
+                resultados.append({"backend": backend, "modelo": modelo, "erro": erro})
+                continue
+            resultado = json.loads(linhas[-1])
+            resultados.append(resultado)
+            self.stdout.write(
+                f"{backend:<12} carga {resultado['carga_ms']:>8.1f} ms  1ª imagem {resultado['primeira_imagem_ms']:>7.1f} ms  "
+                f"mediana {resultado['mediana_ms'] or 0:>7.1f} ms  lote {resultado.get('lote_ms_por_imagem') or 0:>7.1f} ms/img  RSS {resultado['rss_mb'] or 0:>7.1f} MB "
+                f"(pico {resultado['pico_rss_mb']:.1f})  lidas {resultado['lidas']}/{resultado['fotos']}"
+            )
+
+        if not any("erro" not in r for r in resultados):
+            raise CommandError("Nenhum backend pôde ser medido.")
+        if options["saida"]:
+            Path(options["saida"]).write_text(json.dumps({"resultados": resultados}, indent=2) + "\n", encoding="utf-8")
@@ -0,0 +1,277 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from despesas.services.nfe_service import NFeService
+
+
+def gerar_html_nfce(qtd_itens: int) -> str:
+    """Gera uma página de consulta de NFC-e sintética no layout padrão da SEFAZ."""
+    linhas = []
+    for i in range(1, qtd_itens + 1):
+        linhas.append(
+            f'<tr id="Item + {i}"><td><span class="txtTit">PRODUTO {i}</span>'
+            f'<span class="RCod">(Código: {i:06d})</span>'
+            f'<span class="Rqtd"><strong>Qtde.:</strong>{i % 5 + 1}</span>'
+            f'<span class="RUN"><strong>UN: </strong>UN</span>'
+            f'<span class="RvlUnit"><strong>Vl. Unit.:</strong> {i},50</span></td>'
+            f'<td class="txtTit noWrap">Vl. Total<br><span class="valor">{(i % 5 + 1) * i},50</span></td></tr>'
+        )
+    return (
+        "<html><head><script>var x = 1;</script></head><body><div id=\"conteudo\">"
+        '<div class="txtTopo">MERCADO BENCHMARK LTDA</div>'
+        '<div class="text">CNPJ: 06.990.590/0001-23 , Rua A, 100</div>'
+        f'<table id="tabResult">{"".join(linhas)}</table>'
+        '<div id="totalNota">'
+        f'<div id="linhaTotal"><label>Qtd. total de itens:</label><span class="totalNumb">{qtd_itens}</span></div>'
+        '<div id="linhaTotal"><label>Valor total R$:</label><span class="totalNumb">1.000,00</span></div>'
+        '<div id="linhaTotal"><label>Descontos R$:</label><span class="totalNumb">10,00</span></div>'
+        '<div id="linhaTotal"><label>Valor a pagar R$:</label><span class="totalNumb">990,00</span></div>'
+        '<div id="linhaForma"><label>Forma de pagamento:</label><span class="totalNumb txtTitR">Valor pago R$:</span></div>'
+        '<div id="linhaTotal"><label class="tx">Cartão de Crédito</label><span class="totalNumb">990,00</span></div>'
+        "</div>"
+        '<div id="infos"><ul><li><strong>Emissão: </strong>10/01/2026 12:00:00</li></ul></div>'
+        "</div></body></html>"
+    )
+
+
+def gerar_pdf(paginas: list[list[str]]) -> bytes:
+    """
+    Monta um PDF mínimo com uma linha de texto por entrada (Helvetica, WinAnsi).
+
+    Args:
+        paginas (list[list[str]]): Linhas de texto de cada página.
+
+    Returns:
+        bytes: Conteúdo do arquivo PDF.
+    """
+    def escapar(linha: str) -> bytes:
+        return linha.encode("cp1252").replace(b"\\", b"\\\\").replace(b"(", b"\\(").replace(b")", b"\\)")
+
+    objetos = [b"<< /Type /Catalog /Pages 2 0 R >>", b"", b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>"]
+    kids = []
+    for linhas in paginas:
+        fluxo = b"BT /F1 9 Tf 12 TL 36 810 Td " + b" ".join(b"(" + escapar(l) + b") Tj T*" for l in linhas) + b" ET"
+        objetos.append(b"<< /Length %d >>\nstream\n" % len(fluxo) + fluxo + b"\nendstream")
+        objetos.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] /Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>"
+            % (len(objetos))
+        )
+        kids.append(b"%d 0 R" % len(objetos))
+    objetos[1] = b"<< /Type /Pages /Kids [" + b" ".join(kids) + b"] /Count %d >>" % len(kids)
+
+    saida = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for numero, corpo in enumerate(objetos, start=1):
+        offsets.append(len(saida))
+        saida += b"%d 0 obj\n" % numero + corpo + b"\nendobj\n"
+    xref = len(saida)
+    saida += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objetos) + 1)
+    saida += b"".join(b"%010d 00000 n \n" % o for o in offsets)
+    saida += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objetos) + 1, xref)
+    return bytes(saida)
+
+
+def gerar_pdf_danfe(qtd_itens: int, itens_por_pagina: int = 60) -> bytes:
+    """Gera um DANFE sintético em texto (sem tabelas), com os itens distribuídos em páginas."""
+    cabecalho = [
+        "RECEBEMOS DE MERCADO PDF LTDA OS PRODUTOS CONSTANTES DA NOTA FISCAL INDICADA AO LADO",
+        "DANFE",
+        "CHAVE DE ACESSO",
+        "4326 0106 9905 9000 0123 6500 1000 0012 3410 0001 2342",
+        "DATA DA EMISSÃO 10/01/2026",
+        "CÁLCULO DO IMPOSTO",
+        "VALOR TOTAL DOS PRODUTOS VALOR TOTAL DA NOTA",
+        "22,00 21,00",
+        "DADOS DOS PRODUTOS / SERVIÇOS",
+    ]
+    itens = [f"ARROZ TIPO {i} 1006{i % 10000:04d} 000 5102 UN 2,0000 5,00 10,00" for i in range(1, qtd_itens + 1)]
+    paginas = [cabecalho + itens[:itens_por_pagina]]
+    for inicio in range(itens_por_pagina, qtd_itens, itens_por_pagina):
+        paginas.append(itens[inicio:inicio + itens_por_pagina])
+    paginas[-1] = paginas[-1] + ["DADOS ADICIONAIS"]
+    return gerar_pdf(paginas)
+
+
+def gerar_xml_nfe(qtd_itens: int) -> bytes:
+    """Gera um XML procNFe sintético com pagamento no crédito em três duplicatas."""
+    dets = "".join(
+        f'<det nItem="{i}"><prod><cProd>{i}</cProd><xProd>PRODUTO XML {i}</xProd><NCM>10063021</NCM>'
+        f"<uCom>un</uCom><qCom>2.0000</qCom><vUnCom>5.0000000000</vUnCom><vProd>10.00</vProd></prod>"
+        f"<imposto><vTotTrib>1.50</vTotTrib></imposto></det>"
+        for i in range(1, qtd_itens + 1)
+    )
+    total = qtd_itens * 10
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>'
+        '<nfeProc xmlns="http://www.portalfiscal.inf.br/nfe" versao="4.00"><NFe><infNFe Id="NFe43260106990590000123550010000012341000012340" versao="4.00">'
+        "<ide><cUF>43</cUF><mod>55</mod><dhEmi>2026-01-10T12:00:00-03:00</dhEmi></ide>"
+        "<emit><CNPJ>06990590000123</CNPJ><xNome>LOJA VIRTUAL XML LTDA</xNome><xFant>LOJA</xFant></emit>"
+        "<dest><CPF>12345678909</CPF><xNome>CLIENTE</xNome></dest>"
+        f"{dets}"
+        f"<total><ICMSTot><vProd>{total}.00</vProd><vDesc>5.00</vDesc><vNF>{total - 5}.00</vNF><vTotTrib>{qtd_itens * 1.5:.2f}</vTotTrib></ICMSTot></total>"
+        "<cobr><dup><nDup>001</nDup></dup><dup><nDup>002</nDup></dup><dup><nDup>003</nDup></dup></cobr>"
+        f"<pag><detPag><tPag>03</tPag><vPag>{total - 5}.00</vPag></detPag></pag>"
+        "</infNFe></NFe><protNFe><infProt><cStat>100</cStat></infProt></protNFe></nfeProc>"
+    ).encode("utf-8")
+
+
+def gerar_foto_qr(conteudo: str, lado_qr: int = 500, largura: int = 4000, altura: int = 3000) -> bytes:
+    """Gera uma "foto" JPEG sintética (12 MP por padrão) com o QR Code sobre um fundo texturizado."""
+    import cv2
+    import numpy as np
+
+    qr = cv2.QRCodeEncoder.create().encode(conteudo)
+    qr = cv2.resize(qr, (lado_qr, lado_qr), interpolation=cv2.INTER_NEAREST)
+    fundo = np.random.default_rng(1).normal(150, 25, (altura, largura)).clip(0, 255).astype(np.uint8)
+    foto = cv2.GaussianBlur(fundo, (9, 9), 0)
+    y, x = int(altura * 0.4), int(largura * 0.45)
+    borda = lado_qr // 10
+    foto[y - borda:y + lado_qr + borda, x - borda:x + lado_qr + borda] = 255
+    foto[y:y + lado_qr, x:x + lado_qr] = qr
+    foto = cv2.GaussianBlur(cv2.cvtColor(foto, cv2.COLOR_GRAY2BGR), (3, 3), 0)
+    return cv2.imencode(".jpg", foto, [cv2.IMWRITE_JPEG_QUALITY, 90])[1].tobytes()
+
+
+EMITENTES_EXEMPLO = [
+    "COMPANHIA ZAFFARI COMERCIO E INDUSTRIA", "WMS SUPERMERCADOS DO BRASIL LTDA", "CARREFOUR COMERCIO E INDUSTRIA LTDA",
+    "SENDAS DISTRIBUIDORA S/A", "ATACADAO S.A.", "DIA BRASIL SOCIEDADE LIMITADA", "COMERCIAL DE ALIMENTOS BIG BOM LTDA",
+    "IRMAOS MUFFATO S.A.", "SUPERMERCADOS BH COMERCIO DE ALIMENTOS S/A", "MERCADO LIVRE - EBAZAR.COM.BR LTDA",
+    "DIMED S/A DISTRIBUIDORA DE MEDICAMENTOS", "PANVEL FARMACIAS", "RAIA DROGASIL S/A", "EMPREENDIMENTOS PAGUE MENOS S/A",
+    "FARMÁCIAS SÃO JOÃO S.A.", "POSTO DE COMBUSTIVEIS ALECRIM LTDA", "IPIRANGA PRODUTOS DE PETROLEO S.A.",
+    "UBER DO BRASIL TECNOLOGIA LTDA.", "99 TECNOLOGIA LTDA", "AUTO POSTO BARAO LTDA", "ARCOS DOURADOS COMERCIO DE ALIMENTOS SA",
+    "BURGER KING DO BRASIL", "RESTAURANTE E LANCHERIA DO ZE", "PADARIA E CONFEITARIA BOM DIA", "BAR E RESTAURANTE KANTINA",
+    "BARBEARIA DOS AMIGOS", "LOJAS RENNER S.A.", "C&A MODAS S.A.", "ZARA BRASIL LTDA", "LEROY MERLIN CIA BRASILEIRA DE BRICOLAGEM",
+    "CASSOL CENTERLAR", "KABUM COMERCIO ELETRONICO S.A.", "MAGAZINE LUIZA S/A", "AMAZON SERVICOS DE VAREJO DO BRASIL LTDA",
+    "HOSPITAL MOINHOS DE VENTO", "LABORATORIO WEINMANN", "UNIMED PORTO ALEGRE", "SMARTFIT ESCOLA DE GINASTICA E DANCA SA",
+    "CINEMARK BRASIL S.A.", "PETZ COMERCIAL DE PRODUTOS ALIMENTICIOS", "COBASI COMERCIO DE PRODUTOS BASICOS",
+    "PORTO SEGURO COMPANHIA DE SEGUROS GERAIS", "NETFLIX ENTRETENIMENTO BRASIL LTDA", "ALE COMBUSTIVEIS S.A.",
+    "KANGURU BRINQUEDOS LTDA", "BIGODE CHOPERIA", "ESTACIONAMENTO CENTRAL", "CLINICA VETERINARIA AMIGO FIEL",
+]
+
+
+def _sugerir_por_substring(emitente_nome: str) -> str | None:
+    """Algoritmo anterior: monta as regras a cada chamada e procura substrings."""
+    from despesas.services.categorizacao import REGRAS_CATEGORIA
+
+    regras = {categoria: list(palavras) for categoria, palavras in REGRAS_CATEGORIA.items()}
+    txt = emitente_nome.lower()
+    for categoria, palavras in regras.items():
+        if any(palavra in txt for palavra in palavras):
+            return categoria
+    return None
+
+
+class Command(BaseCommand):
+    help = (
+        "Mede os caminhos de importação de NFe: extração HTML (lxml x BeautifulSoup), "
+        "leitura de QR em fotos, sugestão de categoria pelo emitente e DANFEs em PDF "
+        "(sequencial x páginas divididas entre o pool de processos)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--alvo", nargs="+", choices=["html", "qr", "categoria", "pdf"], default=["html", "qr", "categoria"], help="Cenários a medir.")
+        parser.add_argument("--itens", type=int, nargs="+", default=[10, 50, 150, 500], help="Quantidades de itens por nota.")
+        parser.add_argument("--lados-qr", type=int, nargs="+", default=[700, 400], help="Lados do QR (px) nas fotos de 12 MP.")
+        parser.add_argument("--paginas", type=int, nargs="+", default=[1, 5, 10, 20, 40], help="Páginas dos DANFEs em PDF.")
+        parser.add_argument("--processos", type=int, help="Processos do pool no cenário paralelo (padrão: NFE_PROCESSOS).")
+        parser.add_argument("--repeticoes", type=int, default=20, help="Execuções por cenário.")
+
+    def _medir(self, funcao, entrada, repeticoes: int) -> float:
+        inicio = time.perf_counter()
+        for _ in range(repeticoes):
+            funcao(entrada)
+        return (time.perf_counter() - inicio) * 1000 / repeticoes
+
+    def _html(self, options):
+        from despesas.services import sefaz_html
+
+        service = NFeService()
+        repeticoes = options["repeticoes"]
+        self.stdout.write(f"{'itens':>6} {'bs4 (ms)':>10} {'lxml (ms)':>10} {'ganho':>7}  iguais")
+        for qtd in options["itens"]:
+            html = gerar_html_nfce(qtd)
+            extrair_lxml = lambda h: sefaz_html.extrair_dados(h, service)
+            iguais = service.extrair_dados_html_bs4(html) == extrair_lxml(html)
+            tempo_bs4 = self._medir(service.extrair_dados_html_bs4, html, repeticoes)
+            tempo_lxml = self._medir(extrair_lxml, html, repeticoes)
+            self.stdout.write(
+                f"{qtd:>6} {tempo_bs4:>10.2f} {tempo_lxml:>10.2f} {tempo_bs4 / tempo_lxml:>6.1f}x  {'sim' if iguais else 'NÃO'}"
+            )
+
+    def _qr(self, options):
+        from despesas.services.qr_cascata import CascataDecodificadores, carregar_imagem
+
+        url = "https://www.sefaz.rs.gov.br/NFCE/NFCE-COM.aspx?p=43260106990590000123650010000012341000012342|2|1|1|ABCDEF"
+        repeticoes = max(1, options["repeticoes"] // 4)
+        cascata = CascataDecodificadores(["zbar", "opencv", "limiar"])
+        cenarios = {
+            "completa": lambda jpg: cascata.decodificar(carregar_imagem(jpg, reduzir=False, largura_maxima=1500)),
+            "reduzida": lambda jpg: cascata.decodificar(carregar_imagem(jpg)),
+        }
+        self.stdout.write(f"{'lado QR':>8} {'completa (ms)':>14} {'reduzida (ms)':>14} {'ganho':>7}  lidos")
+        for lado in options["lados_qr"]:
+            foto = gerar_foto_qr(url, lado_qr=lado)
+            lidos = "/".join("sim" if funcao(foto) == url else "não" for funcao in cenarios.values())
+            tempos = [self._medir(funcao, foto, repeticoes) for funcao in cenarios.values()]
+            self.stdout.write(f"{lado:>8} {tempos[0]:>14.1f} {tempos[1]:>14.1f} {tempos[0] / tempos[1]:>6.1f}x  {lidos}")
+
+    def _categoria(self, options):
+        from despesas.services.categorizacao import sugerir_categoria
+
+        repeticoes = options["repeticoes"] * 50
+        por_consulta = lambda funcao: self._medir(lambda nomes: [funcao(n) for n in nomes], EMITENTES_EXEMPLO, repeticoes) * 1000 / len(EMITENTES_EXEMPLO)
+        tempo_antigo = por_consulta(_sugerir_por_substring)
+        tempo_novo = por_consulta(sugerir_categoria)
+        self.stdout.write(
+            f"categoria: substring {tempo_antigo:.1f}µs, regex compilado {tempo_novo:.1f}µs por consulta "
+            f"({tempo_antigo / tempo_novo:.1f}x, {len(EMITENTES_EXEMPLO)} emitentes)"
+        )
+        for nome in EMITENTES_EXEMPLO:
+            antes, depois = _sugerir_por_substring(nome), sugerir_categoria(nome)
+            if antes != depois:
+                self.stdout.write(f"  {nome}: {antes} -> {depois}")
+
+    def _pdf(self, options):
+        from django.test import override_settings
+        from despesas.processamento_paralelo import obter_pool
+
+        service = NFeService()
+        repeticoes = max(1, options["repeticoes"] // 10)
+        processos = options["processos"] or settings.NFE_PROCESSOS
+        if processos < 2:
+            self.stderr.write("Com 1 processo o cenário paralelo equivale ao sequencial; use --processos.")
+        with override_settings(NFE_PROCESSOS=processos):
+            # Sobe os processos do pool antes de medir: o custo de inicialização é pago uma vez por worker.
+            obter_pool()
+            self._comparar_pdf(service, options["paginas"], repeticoes)
+        self.stdout.write(f"({processos} processos; em produção a partir de NFE_PDF_PAGINAS_PARALELO={settings.NFE_PDF_PAGINAS_PARALELO} páginas)")
+
+    def _comparar_pdf(self, service, lista_paginas: list[int], repeticoes: int):
+        from io import BytesIO
+        from django.test import override_settings
+
+        self.stdout.write(f"{'páginas':>8} {'itens':>6} {'sequencial (ms)':>16} {'paralelo (ms)':>14} {'ganho':>7}  iguais")
+        for paginas in lista_paginas:
+            pdf = gerar_pdf_danfe(paginas * 60 - 10)
+            with override_settings(NFE_PDF_PAGINAS_PARALELO=0):
+                sequencial = service._extrair_danfe_pdf(BytesIO(pdf))
+                tempo_sequencial = self._medir(lambda conteudo: service._extrair_danfe_pdf(BytesIO(conteudo)), pdf, repeticoes)
+            with override_settings(NFE_PDF_PAGINAS_PARALELO=1):
+                paralelo = service._extrair_danfe_pdf(BytesIO(pdf))
+                tempo_paralelo = self._medir(lambda conteudo: service._extrair_danfe_pdf(BytesIO(conteudo)), pdf, repeticoes)
+            self.stdout.write(
+                f"{paginas:>8} {len(sequencial['itens']):>6} {tempo_sequencial:>16.1f} {tempo_paralelo:>14.1f} "
+                f"{tempo_sequencial / tempo_paralelo:>6.1f}x  {'sim' if sequencial == paralelo else 'NÃO'}"
+            )
+
+    def handle(self, *args, **options):
+        if "html" in options["alvo"]:
+            self._html(options)
+        if "qr" in options["alvo"]:
+            self._qr(options)
+        if "categoria" in options["alvo"]:
+            self._categoria(options)
+        if "pdf" in options["alvo"]:
+            self._pdf(options)
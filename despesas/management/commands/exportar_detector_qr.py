@@ -0,0 +1,41 @@
+import shutil
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = (
+        "Exporta o detector do QReader (YOLOv8 nano do qrdet) para ONNX, opcionalmente também "
+        "quantizado em int8, para uso com QR_DETECTOR_BACKEND=onnxruntime ou opencv. "
+        "O lote de entrada fica dinâmico (inferência em lote). Requer torch, qreader e ultralytics apenas na máquina que gera o arquivo."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--saida", default=settings.QR_DETECTOR_MODELO, help="Arquivo .onnx de destino.")
+        parser.add_argument("--tamanho", type=int, default=settings.QR_DETECTOR_TAMANHO, help="Lado da entrada do modelo.")
+        parser.add_argument("--opset", type=int, default=12, help="Opset ONNX (o cv2.dnn suporta até o 17).")
+        parser.add_argument("--int8", action="store_true", help="Gera também <saida>-int8.onnx (somente onnxruntime).")
+
+    def handle(self, *args, **options):
+        try:
+            from qrdet import QRDetector
+        except ImportError as e:
+            raise CommandError(f"Instale qreader/qrdet (com torch e ultralytics) para exportar o modelo: {e}")
+
+        saida = Path(options["saida"])
+        saida.parent.mkdir(parents=True, exist_ok=True)
+        modelo = QRDetector(model_size="n").model
+        exportado = modelo.export(format="onnx", imgsz=options["tamanho"], opset=options["opset"], dynamic=True, simplify=False)
+        shutil.copyfile(exportado, saida)
+        self.stdout.write(self.style.SUCCESS(f"Detector exportado: {saida} ({saida.stat().st_size / 1e6:.1f} MB)"))
+
+        if options["int8"]:
+            try:
+                from onnxruntime.quantization import QuantType, quantize_dynamic
+            except ImportError as e:
+                raise CommandError(f"Instale o onnxruntime para quantizar o modelo: {e}")
+            saida_int8 = saida.with_name(f"{saida.stem}-int8{saida.suffix}")
+            quantize_dynamic(str(saida), str(saida_int8), weight_type=QuantType.QUInt8)
+            self.stdout.write(self.style.SUCCESS(f"Detector int8: {saida_int8} ({saida_int8.stat().st_size / 1e6:.1f} MB)"))
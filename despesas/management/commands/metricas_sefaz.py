@@ -0,0 +1,34 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from despesas.services import circuito_sefaz, parsers_sefaz
+
+
+class Command(BaseCommand):
+    help = (
+        "Exibe, por host da SEFAZ, a taxa de sucesso e o tempo médio de cada parser de página "
+        "(somando os workers) e o estado do circuit breaker (compartilhado apenas com CACHE_REDIS_URL)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--json", action="store_true", help="Escreve o resultado em JSON.")
+
+    def handle(self, *args, **options):
+        parsers = parsers_sefaz.metricas()
+        circuitos = circuito_sefaz.metricas(host for host in parsers if host != "desconhecido")
+        if options["json"]:
+            self.stdout.write(json.dumps({"parsers": parsers, "circuitos": circuitos}, indent=2))
+            return
+
+        if not parsers:
+            self.stdout.write("Nenhuma extração de página da SEFAZ registrada.")
+            return
+        for host, por_parser in sorted(parsers.items()):
+            circuito = circuitos.get(host)
+            estado = f"  circuito {circuito['estado']} ({circuito['falhas']}/{circuito['requisicoes']} falhas)" if circuito else ""
+            self.stdout.write(f"{host}{estado}")
+            for nome, m in por_parser.items():
+                self.stdout.write(
+                    f"  {nome:<14} {m['chamadas']:>6} chamadas  {m['taxa_sucesso']:>5.0%} sucesso  {m['tempo_medio_ms']:>7.1f} ms"
+                )
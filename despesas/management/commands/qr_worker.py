@@ -0,0 +1,36 @@
+import json
+import signal
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from despesas.services.qr_worker import ServidorQRWorker, status_worker
+
+
+class Command(BaseCommand):
+    help = "Inicia o processo dedicado de leitura de QR Code (QReader pré-carregado)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--status", action="store_true", help="Exibe o estado do worker em execução e sai.")
+
+    def handle(self, *args, **options):
+        endereco = settings.QR_WORKER_ENDERECO
+        if not endereco:
+            raise CommandError("Defina QR_WORKER_ENDERECO para usar o QR worker.")
+
+        if options["status"]:
+            estado = status_worker()
+            if estado is None:
+                raise CommandError(f"QR worker não responde em {endereco}.")
+            self.stdout.write(json.dumps(estado))
+            return
+
+        servidor = ServidorQRWorker(endereco, capacidade_fila=settings.QR_WORKER_CAPACIDADE_FILA)
+        signal.signal(signal.SIGTERM, lambda *_: servidor.encerrar())
+        servidor.iniciar()
+        try:
+            servidor.servir()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            servidor.encerrar()
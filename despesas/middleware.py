@@ -1,6 +1,8 @@
+from django.conf import settings
 from django.shortcuts import redirect
 from django.urls import reverse
 from despesas.models import Usuario
+from despesas.services import medicao
 
 class OnboardingMiddleware:
     def __init__(self, get_response):
@@ -27,4 +29,27 @@ class OnboardingMiddleware:
                 return redirect('onboarding_renda')
 
         response = self.get_response(request)
-        return response
\ No newline at end of file
+        return response
+
+
+class ServerTimingMiddleware:
+    """
+    Mede as etapas da importação de notas executadas na requisição.
+
+    Ativa uma medição por requisição (`despesas.services.medicao`); quando alguma etapa
+    foi registrada (QR, SEFAZ, parsing, categorização, formulário), grava a linha de log
+    estruturada e devolve os tempos no cabeçalho `Server-Timing`, com a origem, o host
+    e a quantidade de itens na descrição do total. O cabeçalho expõe detalhes internos,
+    então só é enviado com `NFE_SERVER_TIMING` (padrão: DEBUG) ou para usuários staff.
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with medicao.medir() as medicao_requisicao:
+            response = self.get_response(request)
+        if medicao_requisicao.etapas:
+            medicao_requisicao.registrar_log(f"{request.method} {request.path} medida")
+            if settings.NFE_SERVER_TIMING or getattr(getattr(request, "user", None), "is_staff", False):
+                response["Server-Timing"] = medicao_requisicao.server_timing()
+        return response
@@ -0,0 +1,74 @@
+# Generated by Django 5.1.3 on 2026-10-18 02:51
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("despesas", "0017_alter_itemdespesa_quantidade"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ImportacaoNFe",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "arquivo",
+                    models.FileField(blank=True, upload_to="importacoes_nfe/%Y/%m/"),
+                ),
+                ("nome_arquivo", models.CharField(blank=True, max_length=255)),
+                ("content_type", models.CharField(blank=True, max_length=100)),
+                ("hash_arquivo", models.CharField(max_length=64)),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("PENDENTE", "Pendente"),
+                            ("PROCESSANDO", "Processando"),
+                            ("CONCLUIDA", "Concluída"),
+                            ("ERRO", "Erro"),
+                            ("CANCELADA", "Cancelada"),
+                        ],
+                        default="PENDENTE",
+                        max_length=12,
+                    ),
+                ),
+                ("url", models.TextField(blank=True)),
+                ("resultado", models.JSONField(blank=True, null=True)),
+                ("erro", models.TextField(blank=True)),
+                ("criado_em", models.DateTimeField(auto_now_add=True)),
+                ("atualizado_em", models.DateTimeField(auto_now=True)),
+                ("concluido_em", models.DateTimeField(blank=True, null=True)),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="importacoes_nfe",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["-criado_em"],
+                "indexes": [
+                    models.Index(
+                        fields=["user", "hash_arquivo"],
+                        name="despesas_im_user_id_a871a2_idx",
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 5.1.3 on 2026-10-18 02:53
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("despesas", "0018_importacaonfe"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="LoteImportacaoNFe",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("total_arquivos", models.PositiveIntegerField(default=0)),
+                ("criado_em", models.DateTimeField(auto_now_add=True)),
+                ("iniciado_em", models.DateTimeField(blank=True, null=True)),
+                ("concluido_em", models.DateTimeField(blank=True, null=True)),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="lotes_importacao_nfe",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["-criado_em"],
+            },
+        ),
+        migrations.AddField(
+            model_name="importacaonfe",
+            name="lote",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="importacoes",
+                to="despesas.loteimportacaonfe",
+            ),
+        ),
+    ]
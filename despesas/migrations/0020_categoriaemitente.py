@@ -0,0 +1,70 @@
+# Generated by Django 5.1.3 on 2026-10-18 03:11
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("despesas", "0019_loteimportacaonfe"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CategoriaEmitente",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("chave", models.CharField(max_length=220)),
+                ("ultima_data", models.DateField(blank=True, null=True)),
+                ("contagens", models.JSONField(blank=True, default=dict)),
+                ("atualizado_em", models.DateTimeField(auto_now=True)),
+                (
+                    "categoria_frequente",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="+",
+                        to="despesas.categoria",
+                    ),
+                ),
+                (
+                    "ultima_categoria",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="+",
+                        to="despesas.categoria",
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="categorias_emitente",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("user", "chave"),
+                        name="uniq_categoria_emitente_por_usuario",
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,69 @@
+import re
+import unicodedata
+
+from django.db import migrations
+
+# Cópia congelada de `indice_categoria.chaves_emitente` (e de `normalizar_nome`) na data
+# desta migração: mudanças futuras no serviço não devem alterar o índice gerado aqui.
+TAMANHO_CHAVE = 220
+
+
+def _normalizar_nome(texto):
+    sem_acento = unicodedata.normalize("NFKD", texto).encode("ascii", "ignore").decode("ascii")
+    sem_acento = sem_acento.lower().replace("'", "")
+    return " ".join(re.sub(r"[^a-z0-9&+]+", " ", sem_acento).split())
+
+
+def chaves_emitente(emitente_nome, emitente_cnpj):
+    chaves = []
+    digitos = re.sub(r"\D", "", emitente_cnpj or "")
+    if len(digitos) == 14:
+        chaves.append(f"cnpj:{digitos}")
+    nome = _normalizar_nome(emitente_nome or "")
+    if nome:
+        chaves.append(f"nome:{nome}"[:TAMANHO_CHAVE])
+    return chaves
+
+
+def preencher_indice(apps, schema_editor):
+    """Monta o índice emitente -> categoria a partir das despesas já gravadas."""
+    Despesa = apps.get_model("despesas", "Despesa")
+    CategoriaEmitente = apps.get_model("despesas", "CategoriaEmitente")
+
+    linhas = {}
+    despesas = (
+        Despesa.objects.filter(categoria__isnull=False)
+        .order_by("data", "pk")
+        .values_list("user_id", "categoria_id", "emitente_nome", "emitente_cnpj", "data")
+    )
+    for user_id, categoria_id, nome, cnpj, data in despesas.iterator(chunk_size=2000):
+        for chave in chaves_emitente(nome, cnpj):
+            linha = linhas.setdefault((user_id, chave), {"contagens": {}, "ultima": None, "data": None})
+            linha["contagens"][str(categoria_id)] = linha["contagens"].get(str(categoria_id), 0) + 1
+            linha["ultima"], linha["data"] = categoria_id, data
+
+    objetos = []
+    for (user_id, chave), linha in linhas.items():
+        contagens = linha["contagens"]
+        ultima = str(linha["ultima"])
+        frequente = max(contagens, key=lambda c: (contagens[c], c == ultima))
+        objetos.append(CategoriaEmitente(
+            user_id=user_id,
+            chave=chave,
+            ultima_categoria_id=linha["ultima"],
+            ultima_data=linha["data"],
+            categoria_frequente_id=int(frequente),
+            contagens=contagens,
+        ))
+    CategoriaEmitente.objects.bulk_create(objetos, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("despesas", "0020_categoriaemitente"),
+    ]
+
+    operations = [
+        migrations.RunPython(preencher_indice, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.1.3 on 2026-10-18 03:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("despesas", "0021_preencher_categoriaemitente"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="EmitenteCNPJ",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("cnpj", models.CharField(max_length=14, unique=True)),
+                ("nome", models.CharField(blank=True, max_length=200)),
+                ("nome_normalizado", models.CharField(blank=True, max_length=200)),
+                ("categoria_padrao", models.CharField(blank=True, max_length=100)),
+                ("host_sefaz", models.CharField(blank=True, max_length=255)),
+                ("notas_importadas", models.PositiveIntegerField(default=0)),
+                ("criado_em", models.DateTimeField(auto_now_add=True)),
+                ("atualizado_em", models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                "ordering": ["nome"],
+            },
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.1.3 on 2026-10-18 03:15
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("despesas", "0022_emitentecnpj"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="despesa",
+            name="chave_acesso",
+            field=models.CharField(
+                blank=True, max_length=44, null=True, verbose_name="Chave de Acesso"
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="despesa",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("chave_acesso__isnull", False)),
+                fields=("user", "chave_acesso"),
+                name="uniq_despesa_chave_acesso_por_usuario",
+            ),
+        ),
+    ]
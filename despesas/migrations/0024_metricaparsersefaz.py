@@ -0,0 +1,42 @@
+# Generated by Django 5.1.3 on 2026-10-18 04:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("despesas", "0023_despesa_chave_acesso"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="MetricaParserSefaz",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("host", models.CharField(max_length=255)),
+                ("parser", models.CharField(max_length=50)),
+                ("chamadas", models.PositiveBigIntegerField(default=0)),
+                ("sucessos", models.PositiveBigIntegerField(default=0)),
+                ("tempo_us", models.PositiveBigIntegerField(default=0)),
+                ("atualizado_em", models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                "ordering": ["host", "parser"],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("host", "parser"),
+                        name="metrica_parser_sefaz_host_parser",
+                    )
+                ],
+            },
+        ),
+    ]
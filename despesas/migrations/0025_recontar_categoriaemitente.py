@@ -0,0 +1,80 @@
+import re
+import unicodedata
+
+from django.db import migrations
+
+# Cópia congelada das regras do índice na data desta migração (`indice_categoria`):
+# mudanças futuras no serviço não devem alterar a recontagem feita aqui.
+TAMANHO_CHAVE = 220
+RE_RECORRENCIA = re.compile(r"\(Recorrência (\d+)/\d+\)\s*$")
+
+
+def _normalizar_nome(texto):
+    sem_acento = unicodedata.normalize("NFKD", texto).encode("ascii", "ignore").decode("ascii")
+    sem_acento = sem_acento.lower().replace("'", "")
+    return " ".join(re.sub(r"[^a-z0-9&+]+", " ", sem_acento).split())
+
+
+def chaves_emitente(emitente_nome, emitente_cnpj):
+    chaves = []
+    digitos = re.sub(r"\D", "", emitente_cnpj or "")
+    if len(digitos) == 14:
+        chaves.append(f"cnpj:{digitos}")
+    nome = _normalizar_nome(emitente_nome or "")
+    if nome:
+        chaves.append(f"nome:{nome}"[:TAMANHO_CHAVE])
+    return chaves
+
+
+def conta_como_compra(parcela_atual, observacoes):
+    if (parcela_atual or 1) > 1:
+        return False
+    recorrencia = RE_RECORRENCIA.search(observacoes or "")
+    return not (recorrencia and int(recorrencia.group(1)) > 1)
+
+
+def recontar_indice(apps, schema_editor):
+    """Refaz o índice emitente -> categoria com um voto por compra (sem as parcelas e recorrências seguintes)."""
+    Despesa = apps.get_model("despesas", "Despesa")
+    CategoriaEmitente = apps.get_model("despesas", "CategoriaEmitente")
+
+    linhas = {}
+    despesas = (
+        Despesa.objects.filter(categoria__isnull=False)
+        .order_by("data", "pk")
+        .values_list("user_id", "categoria_id", "emitente_nome", "emitente_cnpj", "data", "parcela_atual", "observacoes")
+    )
+    for user_id, categoria_id, nome, cnpj, data, parcela_atual, observacoes in despesas.iterator(chunk_size=2000):
+        if not conta_como_compra(parcela_atual, observacoes):
+            continue
+        for chave in chaves_emitente(nome, cnpj):
+            linha = linhas.setdefault((user_id, chave), {"contagens": {}, "ultima": None, "data": None})
+            linha["contagens"][str(categoria_id)] = linha["contagens"].get(str(categoria_id), 0) + 1
+            linha["ultima"], linha["data"] = categoria_id, data
+
+    objetos = []
+    for (user_id, chave), linha in linhas.items():
+        contagens = linha["contagens"]
+        ultima = str(linha["ultima"])
+        frequente = max(contagens, key=lambda c: (contagens[c], c == ultima))
+        objetos.append(CategoriaEmitente(
+            user_id=user_id,
+            chave=chave,
+            ultima_categoria_id=linha["ultima"],
+            ultima_data=linha["data"],
+            categoria_frequente_id=int(frequente),
+            contagens=contagens,
+        ))
+    CategoriaEmitente.objects.all().delete()
+    CategoriaEmitente.objects.bulk_create(objetos, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("despesas", "0024_metricaparsersefaz"),
+    ]
+
+    operations = [
+        migrations.RunPython(recontar_indice, migrations.RunPython.noop),
+    ]
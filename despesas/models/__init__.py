@@ -4,5 +4,10 @@ from .item_despesa import ItemDespesa
 from .usuario import Usuario
 from .receita import Receita
 from .alerta_orcamento import AlertaOrcamento
+from .importacao_nfe import ImportacaoNFe
+from .lote_importacao_nfe import LoteImportacaoNFe
+from .categoria_emitente import CategoriaEmitente
+from .emitente_cnpj import EmitenteCNPJ
+from .metrica_parser_sefaz import MetricaParserSefaz
 
-__all__ = ["Categoria", "Despesa", "ItemDespesa", "Usuario", "Receita", "AlertaOrcamento"]
\ No newline at end of file
+__all__ = ["Categoria", "Despesa", "ItemDespesa", "Usuario", "Receita", "AlertaOrcamento", "ImportacaoNFe", "LoteImportacaoNFe", "CategoriaEmitente", "EmitenteCNPJ", "MetricaParserSefaz"]
\ No newline at end of file
@@ -0,0 +1,28 @@
+from django.conf import settings
+from django.db import models
+from .categoria import Categoria
+
+
+class CategoriaEmitente(models.Model):
+    """
+    Índice por usuário de emitente -> categoria usada nas despesas.
+
+    Cada linha é identificada por `chave`: "cnpj:<14 dígitos>" ou "nome:<nome normalizado>".
+    Mantido pelos signals de `Despesa` a cada gravação/exclusão, guarda a última categoria
+    usada e a contagem por categoria (`contagens`, {id: quantidade}) de onde sai a mais frequente.
+    """
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="categorias_emitente")
+    chave = models.CharField(max_length=220)
+    ultima_categoria = models.ForeignKey(Categoria, on_delete=models.SET_NULL, null=True, blank=True, related_name="+")
+    ultima_data = models.DateField(null=True, blank=True)
+    categoria_frequente = models.ForeignKey(Categoria, on_delete=models.SET_NULL, null=True, blank=True, related_name="+")
+    contagens = models.JSONField(default=dict, blank=True)
+    atualizado_em = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["user", "chave"], name="uniq_categoria_emitente_por_usuario")
+        ]
+
+    def __str__(self):
+        return f"{self.chave} -> {self.ultima_categoria_id or self.categoria_frequente_id}"
@@ -22,11 +22,20 @@ class Despesa(models.Model):
     tipo = models.CharField("Tipo de Despesa", max_length=10, choices=TipoDespesa.choices, default=TipoDespesa.VARIAVEL)
     data = models.DateField(default=timezone.localdate)
     observacoes = models.TextField(blank=True, null=True)
+    # Chave de acesso da nota importada; gravada só no primeiro registro de parcelas/recorrências.
+    chave_acesso = models.CharField("Chave de Acesso", max_length=44, blank=True, null=True)
 
     class Meta:
         ordering = ["-data", "-id"]
         verbose_name = "Despesa"
         verbose_name_plural = "Despesas"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "chave_acesso"],
+                condition=models.Q(chave_acesso__isnull=False),
+                name="uniq_despesa_chave_acesso_por_usuario",
+            )
+        ]
 
     def __str__(self) -> str:
         if self.total_parcelas > 1:
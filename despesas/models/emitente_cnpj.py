@@ -0,0 +1,25 @@
+from django.db import models
+
+
+class EmitenteCNPJ(models.Model):
+    """
+    Diretório global de emitentes por CNPJ, compartilhado entre os usuários.
+
+    Preenchido pelas importações de notas: guarda o nome fantasia visto por último,
+    a categoria padrão do estabelecimento (nome de categoria, resolvido para a
+    categoria de cada usuário na consulta) e o host da SEFAZ onde a nota foi consultada.
+    """
+    cnpj = models.CharField(max_length=14, unique=True)
+    nome = models.CharField(max_length=200, blank=True)
+    nome_normalizado = models.CharField(max_length=200, blank=True)
+    categoria_padrao = models.CharField(max_length=100, blank=True)
+    host_sefaz = models.CharField(max_length=255, blank=True)
+    notas_importadas = models.PositiveIntegerField(default=0)
+    criado_em = models.DateTimeField(auto_now_add=True)
+    atualizado_em = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ["nome"]
+
+    def __str__(self):
+        return f"{self.nome} ({self.cnpj})"
@@ -0,0 +1,37 @@
+from django.conf import settings
+from django.db import models
+from despesas.enums.status_importacao_enum import StatusImportacao
+from .lote_importacao_nfe import LoteImportacaoNFe
+
+
+class ImportacaoNFe(models.Model):
+    """
+    Job de importação de nota fiscal processado em background.
+
+    Guarda o arquivo enviado até o fim do processamento e o rascunho extraído
+    (emitente, totais, itens) em `resultado`, consultado pelo endpoint de status.
+    """
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="importacoes_nfe")
+    lote = models.ForeignKey(LoteImportacaoNFe, on_delete=models.CASCADE, null=True, blank=True, related_name="importacoes")
+    arquivo = models.FileField(upload_to="importacoes_nfe/%Y/%m/", blank=True)
+    nome_arquivo = models.CharField(max_length=255, blank=True)
+    content_type = models.CharField(max_length=100, blank=True)
+    hash_arquivo = models.CharField(max_length=64)
+    status = models.CharField(max_length=12, choices=StatusImportacao.choices, default=StatusImportacao.PENDENTE)
+    url = models.TextField(blank=True)
+    resultado = models.JSONField(null=True, blank=True)
+    erro = models.TextField(blank=True)
+    criado_em = models.DateTimeField(auto_now_add=True)
+    atualizado_em = models.DateTimeField(auto_now=True)
+    concluido_em = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ["-criado_em"]
+        indexes = [models.Index(fields=["user", "hash_arquivo"])]
+
+    @property
+    def finalizada(self) -> bool:
+        return self.status in (StatusImportacao.CONCLUIDA, StatusImportacao.ERRO, StatusImportacao.CANCELADA)
+
+    def __str__(self):
+        return f"{self.nome_arquivo} ({self.get_status_display()})"
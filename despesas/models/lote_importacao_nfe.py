@@ -0,0 +1,34 @@
+from django.conf import settings
+from django.db import models
+
+
+class LoteImportacaoNFe(models.Model):
+    """
+    Agrupa os jobs de importação criados em um único envio de várias notas.
+
+    Registra início e fim do processamento para reportar a vazão do lote.
+    """
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="lotes_importacao_nfe")
+    total_arquivos = models.PositiveIntegerField(default=0)
+    criado_em = models.DateTimeField(auto_now_add=True)
+    iniciado_em = models.DateTimeField(null=True, blank=True)
+    concluido_em = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ["-criado_em"]
+
+    @property
+    def duracao_segundos(self) -> float | None:
+        if not (self.iniciado_em and self.concluido_em):
+            return None
+        return (self.concluido_em - self.iniciado_em).total_seconds()
+
+    @property
+    def arquivos_por_minuto(self) -> float | None:
+        duracao = self.duracao_segundos
+        if not duracao:
+            return None
+        return round(self.total_arquivos * 60 / duracao, 1)
+
+    def __str__(self):
+        return f"Lote {self.pk} ({self.total_arquivos} arquivos)"
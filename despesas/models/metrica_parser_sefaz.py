@@ -0,0 +1,26 @@
+from django.db import models
+
+
+class MetricaParserSefaz(models.Model):
+    """
+    Contadores acumulados de um parser de página da SEFAZ em um host.
+
+    Cada processo soma as tentativas em memória e as descarrega aqui em lotes, com
+    `F()` (ver `despesas.services.parsers_sefaz`), de modo que os workers não perdem
+    contagens uns dos outros nem gravam no banco a cada página lida.
+    """
+    host = models.CharField(max_length=255)
+    parser = models.CharField(max_length=50)
+    chamadas = models.PositiveBigIntegerField(default=0)
+    sucessos = models.PositiveBigIntegerField(default=0)
+    tempo_us = models.PositiveBigIntegerField(default=0)
+    atualizado_em = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ["host", "parser"]
+        constraints = [
+            models.UniqueConstraint(fields=("host", "parser"), name="metrica_parser_sefaz_host_parser"),
+        ]
+
+    def __str__(self):
+        return f"{self.host} / {self.parser}"
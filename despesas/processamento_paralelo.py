@@ -0,0 +1,93 @@
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Este módulo é importado pelos processos filhos antes do django.setup(); por isso fica
+# fora de despesas.services (cujo __init__ importa models) e só importa o NFeService sob demanda.
+
+_POOL = None
+_POOL_LOCK = threading.Lock()
+
+
+def _inicializar_processo():
+    import django
+    django.setup()
+
+
+def obter_pool() -> ProcessPoolExecutor:
+    """
+    Retorna o pool de processos compartilhado, criado sob demanda.
+
+    Usa o contexto 'spawn' porque o processo web é multithread (Gunicorn com threads);
+    cada filho executa django.setup() uma única vez e é reaproveitado entre lotes.
+    """
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is None:
+            _POOL = ProcessPoolExecutor(
+                max_workers=settings.NFE_PROCESSOS,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_inicializar_processo,
+            )
+        return _POOL
+
+
+def descartar_pool():
+    """Encerra o pool atual (ex.: após BrokenProcessPool) para que o próximo uso crie outro."""
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is not None:
+            _POOL.shutdown(wait=False, cancel_futures=True)
+            _POOL = None
+
+
+def processar_arquivo_em_processo(caminho: str, content_type: str, nome: str) -> tuple[dict, str | None]:
+    """
+    Executa a extração de uma nota (QR, SEFAZ ou PDF) dentro de um processo do pool.
+
+    Args:
+        caminho (str): Caminho do arquivo armazenado.
+        content_type (str): Content-Type informado no upload.
+        nome (str): Nome original do arquivo.
+
+    Returns:
+        tuple[dict, str | None]: Dados serializados da nota e a URL do QR Code.
+    """
+    from despesas.services import medicao
+    from despesas.services.importacao_nfe import processar_arquivo, serializar_dados
+    from despesas.services.nfe_service import NFeService
+
+    with medicao.medir() as medicao_arquivo:
+        with open(caminho, "rb") as arquivo:
+            dados, url = processar_arquivo(NFeService(), arquivo, content_type, nome)
+        if dados:
+            medicao_arquivo.marcar(itens=len(dados.get("itens") or []))
+            dados["medicao"] = medicao_arquivo.como_dict()
+        medicao_arquivo.registrar_log(f"Arquivo {nome} do lote medido")
+    return serializar_dados(dados), url
+
+
+
+def extrair_paginas_pdf_em_processo(caminho: str, inicio: int, fim: int) -> list[tuple[list[dict], str]]:
+    """
+    Lê uma faixa de páginas de um DANFE dentro de um processo do pool.
+
+    Args:
+        caminho (str): Caminho do PDF.
+        inicio (int): Índice da primeira página (base 0).
+        fim (int): Índice após a última página.
+
+    Returns:
+        list[tuple[list[dict], str]]: Itens das tabelas e texto de cada página, em ordem.
+    """
+    import pdfplumber
+    from despesas.services.nfe_service import NFeService
+
+    service = NFeService()
+    with pdfplumber.open(caminho, pages=list(range(inicio + 1, fim + 1))) as pdf:
+        return [service._ler_pagina_danfe(page) for page in pdf.pages]
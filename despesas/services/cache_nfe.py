@@ -0,0 +1,113 @@
+import hashlib
+import logging
+
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+_SEM_QR = "__sem_qr__"
+
+
+def novo_hash():
+    return hashlib.sha256()
+
+
+def hash_conteudo(conteudo: bytes) -> str:
+    """Retorna o SHA-256 do conteúdo enviado, usado como chave endereçada por conteúdo."""
+    hasher = novo_hash()
+    hasher.update(conteudo)
+    return hasher.hexdigest()
+
+
+def _chave_qr(hash_arquivo: str) -> str:
+    return f"nfe:qr:{hash_arquivo}"
+
+
+def obter_qr(hash_arquivo: str) -> tuple[bool, str | None]:
+    """
+    Consulta o resultado de decodificação já calculado para uma imagem.
+
+    Args:
+        hash_arquivo (str): Hash do conteúdo da imagem.
+
+    Returns:
+        tuple[bool, str | None]: (encontrado, conteúdo). Um resultado negativo em cache
+        retorna (True, None).
+    """
+    try:
+        valor = cache.get(_chave_qr(hash_arquivo))
+    except Exception as e:
+        logger.warning(f"Cache de QR indisponível: {e}")
+        return False, None
+    if valor is None:
+        return False, None
+    return True, (None if valor == _SEM_QR else valor)
+
+
+def obter_qrs(hashes: list[str]) -> dict[str, str | None]:
+    """
+    Consulta de uma vez os resultados em cache de várias imagens (`get_many`).
+
+    Args:
+        hashes (list[str]): Hashes do conteúdo das imagens.
+
+    Returns:
+        dict[str, str | None]: Apenas os hashes encontrados, com o conteúdo (None para
+        resultado negativo em cache).
+    """
+    try:
+        valores = cache.get_many([_chave_qr(h) for h in hashes])
+    except Exception as e:
+        logger.warning(f"Cache de QR indisponível: {e}")
+        return {}
+    return {
+        h: (None if valores[_chave_qr(h)] == _SEM_QR else valores[_chave_qr(h)])
+        for h in hashes
+        if _chave_qr(h) in valores
+    }
+
+
+def salvar_qr(hash_arquivo: str, conteudo: str | None):
+    """
+    Armazena o resultado da decodificação.
+
+    Resultados positivos ficam por `NFE_CACHE_QR_TTL`; imagens sem QR legível ficam
+    apenas por `NFE_CACHE_QR_TTL_NEGATIVO`, permitindo nova tentativa após ajustes.
+    """
+    try:
+        if conteudo:
+            cache.set(_chave_qr(hash_arquivo), conteudo, settings.NFE_CACHE_QR_TTL)
+        else:
+            cache.set(_chave_qr(hash_arquivo), _SEM_QR, settings.NFE_CACHE_QR_TTL_NEGATIVO)
+    except Exception as e:
+        logger.warning(f"Falha ao gravar cache de QR: {e}")
+
+
+def _chave_nota(chave_acesso: str) -> str:
+    return f"nfe:nota:{chave_acesso}"
+
+
+def obter_nota(chave_acesso: str) -> dict | None:
+    """
+    Retorna os dados já extraídos da página da SEFAZ para uma chave de acesso.
+
+    Args:
+        chave_acesso (str): Chave de 44 dígitos da nota.
+
+    Returns:
+        dict | None: Dados da nota (mesmo formato de `extrair_dados_url`) ou None.
+    """
+    try:
+        return cache.get(_chave_nota(chave_acesso))
+    except Exception as e:
+        logger.warning(f"Cache de notas indisponível: {e}")
+        return None
+
+
+def salvar_nota(chave_acesso: str, dados: dict):
+    """Armazena os dados da nota por `NFE_CACHE_NOTA_TTL`; uma nota emitida não muda."""
+    try:
+        cache.set(_chave_nota(chave_acesso), dados, settings.NFE_CACHE_NOTA_TTL)
+    except Exception as e:
+        logger.warning(f"Falha ao gravar cache de notas: {e}")
@@ -0,0 +1,95 @@
+import re
+import unicodedata
+
+# Palavras-chave de estabelecimentos por categoria, em ordem de prioridade.
+REGRAS_CATEGORIA = {
+    "Mercado": ["supermercado", "mercado", "zaffari", "carrefour", "big", "nacional", "atacado", "bistek", "center shop", "dia brasil", "stock center", "comercial zaffari", "maxxi", "kan", "macromix", "assai", "makro", "atacadao", "extra", "pao de acucar", "mambo", "condor", "angeloni", "fort atacadista", "savegnago", "bahamas", "guanabara", "zona sul", "mundial", "sonda", "festval", "gimba", "tenda", "todo dia"],
+    "Farmácia": ["farmacia", "drogaria", "panvel", "são joão", "pague menos", "raia", "drogasil", "bifarma", "ultrafarma", "extrafarma", "farmacia popular", "pacheco", "drogasmil", "nissei", "farmasil", "paguemenos", "droga raia", "poupa tempo", "venancio"],
+    "Transporte": ["posto", "combustivel", "ipiranga", "shell", "petrobras", "uber", "99pop", "abastecimento", "ale", "br distribuidora", "esso", "texaco", "raizen", "99", "cabify", "estacionamento", "pedagio", "sem parar", "veloe", "conectcar", "pneu", "borracharia", "mecanica"],
+    "Alimentação": ["restaurante", "lancheria", "burger", "mcdonalds", "subway", "ifood", "bar", "padaria", "confeitaria", "pizzaria", "bobs", "burger king", "habib's", "giraffa", "spoleto", "pizza hut", "dominos", "outback", "china in box", "ragazzo", "vivenda", "madero", "giraffas", "rappi", "ze delivery", "lanchonete", "delivery", "sorveteria", "açai", "acai"],
+    "Vestuário": ["lojas renner", "riachuelo", "c&a", "zara", "cea", "marisa", "pompéia", "shein", "hering", "farm", "shoulder", "forum", "polo wear", "nike", "adidas", "centauro", "decathlon", "pernambucanas", "leader", "magazine luiza roupa", "netshoes", "mercado livre moda", "track&field", "reserva"],
+    "Casa": ["ferragem", "construção", "leroy", "cassol", "telhanorte", "eletrica", "comercial dalacorte", "leroy merlin", "dicico", "c&c", "obramax", "constrular", "sodimac", "tok stok", "etna", "camicado", "utilplast", "loja de moveis", "movida"],
+    "Eletrônicos": ["kabum", "pichau", "terabyte", "kalunga", "dell", "samsung", "apple", "magazine luiza", "casas bahia", "ponto frio", "fast shop", "americanas", "extra eletrônicos", "ricardo eletro", "carrefour eletrônicos", "mercado livre", "amazon", "submarino", "shoptime", "multilaser", "positivo", "lenovo", "lg", "motorola", "xiaomi"],
+    "Saúde": ["hospital", "clinica", "laboratorio", "consulta", "medico", "dentista", "odonto", "unimed", "hapvida", "amil", "sulamerica", "bradesco saude", "notredame", "intermedica", "lavoisier", "fleury", "delboni", "hermes pardini", "einstein", "sirio libanes"],
+    "Educação": ["escola", "faculdade", "curso", "universidade", "kumon", "wizard", "ccaa", "fisk", "cultura inglesa", "cel lep", "cursinho", "etec", "senac", "senai", "sesi", "udemy", "hotmart", "eduzz"],
+    "Lazer": ["cinema", "cinemark", "cinepolis", "uci", "kinoplex", "teatro", "show", "ingresso.com", "eventim", "sympla", "parque", "clube", "boliche", "brinquedoteca", "netflix", "spotify", "amazon prime", "disney+", "hbo", "globoplay"],
+    "Pet Shop": ["pet shop", "petz", "cobasi", "petlove", "petco", "agropecuaria", "veterinaria", "clinica veterinaria", "banho e tosa", "petiscos", "racao"],
+    "Serviços": ["salao", "barbearia", "estetica", "academia", "smartfit", "bluefit", "bio ritmo", "bodytech", "lavanderia", "lavagem", "costureira", "assistencia tecnica", "conserto", "reforma"],
+    "Seguros": ["seguro", "porto seguro", "liberty", "azul seguros", "allianz", "itau seguros", "bradesco seguros", "mapfre", "tokio marine", "hdi seguros"],
+}
+
+
+def normalizar_nome(texto: str) -> str:
+    """
+    Normaliza um nome de estabelecimento para comparação.
+
+    Remove acentos e apóstrofos, converte para minúsculas e troca a pontuação
+    (exceto `&` e `+`, usados em marcas como "C&A") por espaços únicos.
+    """
+    sem_acento = unicodedata.normalize("NFKD", texto).encode("ascii", "ignore").decode("ascii")
+    sem_acento = sem_acento.lower().replace("'", "")
+    return " ".join(re.sub(r"[^a-z0-9&+]+", " ", sem_acento).split())
+
+
+def _regex_trie(palavras) -> str:
+    """
+    Monta a alternância das palavras fatorada por prefixo (uma trie em forma de regex).
+
+    O motor testa um único ramo por caractere em vez de cada palavra da lista, e o
+    sufixo opcional guloso faz o termo mais longo ("burger king") vencer o mais curto
+    ("burger") quando ambos casam na mesma posição.
+    """
+    trie: dict = {}
+    for palavra in palavras:
+        no = trie
+        for caractere in palavra:
+            no = no.setdefault(caractere, {})
+        no[""] = {}
+
+    def montar(no: dict) -> str:
+        terminal = "" in no
+        ramos = [re.escape(c) + montar(filho) for c, filho in sorted(no.items()) if c]
+        if not ramos:
+            return ""
+        corpo = ramos[0] if len(ramos) == 1 else "(?:" + "|".join(ramos) + ")"
+        if terminal:
+            return f"(?:{corpo})?"
+        return corpo
+
+    return montar(trie)
+
+
+def _compilar(regras: dict) -> tuple[re.Pattern, dict, dict]:
+    categoria_por_chave: dict[str, str] = {}
+    for categoria, palavras in regras.items():
+        for palavra in palavras:
+            categoria_por_chave.setdefault(normalizar_nome(palavra), categoria)
+    prioridade = {categoria: i for i, categoria in enumerate(regras)}
+    padrao = re.compile(rf"(?<![a-z0-9])({_regex_trie(categoria_por_chave)})(?:e?s)?(?![a-z0-9])")
+    return padrao, categoria_por_chave, prioridade
+
+
+_PADRAO, _CATEGORIA_POR_CHAVE, _PRIORIDADE = _compilar(REGRAS_CATEGORIA)
+
+
+def sugerir_categoria(emitente_nome: str) -> str | None:
+    """
+    Sugere o nome da categoria de um estabelecimento pelas palavras-chave.
+
+    Usa um único regex de alternância compilado na importação do módulo, casando
+    palavras inteiras (com plural opcional) sobre o nome sem acentos. Entre os
+    termos encontrados vence a categoria de maior prioridade (ordem de
+    `REGRAS_CATEGORIA`); termos sobrepostos resolvem pelo mais específico.
+
+    Args:
+        emitente_nome (str): Nome do estabelecimento ou emitente da nota.
+
+    Returns:
+        str | None: Nome da categoria sugerida ou None sem correspondência.
+    """
+    if not emitente_nome:
+        return None
+    categorias = {_CATEGORIA_POR_CHAVE[m.group(1)] for m in _PADRAO.finditer(normalizar_nome(emitente_nome))}
+    if not categorias:
+        return None
+    return min(categorias, key=_PRIORIDADE.__getitem__)
@@ -0,0 +1,103 @@
+import re
+from urllib.parse import unquote
+
+_RE_CHAVE = re.compile(r"(?<!\d)(\d{44})(?!\d)")
+# Chave impressa no DANFE: 11 grupos de 4 dígitos separados por espaço ou ponto.
+_RE_CHAVE_FORMATADA = re.compile(r"(?<!\d)\d{4}(?:[ .]?\d{4}){10}(?!\d)")
+_PESOS_DV = [2, 3, 4, 5, 6, 7, 8, 9] * 6
+
+
+def extrair_chave_acesso(texto: str) -> str | None:
+    """
+    Extrai a chave de acesso (44 dígitos) de uma URL de QR Code de NFC-e ou de um texto.
+
+    Cobre o parâmetro `p=<chave>|...` do QR Code versão 2 e o `chNFe=<chave>` da versão 1.
+
+    Args:
+        texto (str): URL ou texto contendo a chave.
+
+    Returns:
+        str | None: A chave com 44 dígitos ou None se não encontrada.
+    """
+    if not texto:
+        return None
+    m = _RE_CHAVE.search(unquote(texto))
+    return m.group(1) if m else None
+
+
+def validar_chave_acesso(chave: str | None) -> bool:
+    """
+    Confere o dígito verificador (módulo 11) da chave de acesso.
+
+    Args:
+        chave (str | None): Chave com 44 dígitos.
+
+    Returns:
+        bool: True se a chave tem 44 dígitos e o último confere com os 43 anteriores.
+    """
+    if not chave or len(chave) != 44 or not chave.isdigit():
+        return False
+    soma = sum(int(d) * peso for d, peso in zip(reversed(chave[:43]), _PESOS_DV))
+    dv = 11 - soma % 11
+    return int(chave[43]) == (0 if dv >= 10 else dv)
+
+
+def chave_acesso_valida(texto: str | None) -> str | None:
+    """Extrai a chave de uma URL ou texto e a retorna apenas se o dígito verificador confere."""
+    chave = extrair_chave_acesso(texto)
+    return chave if validar_chave_acesso(chave) else None
+
+
+def localizar_chave_acesso(texto: str | None) -> str | None:
+    """
+    Procura a chave de acesso impressa no texto de um DANFE (agrupada de 4 em 4 dígitos).
+
+    Args:
+        texto (str | None): Texto extraído da página.
+
+    Returns:
+        str | None: A primeira sequência de 44 dígitos com dígito verificador válido.
+    """
+    for m in _RE_CHAVE_FORMATADA.finditer(texto or ""):
+        chave = re.sub(r"\D", "", m.group(0))
+        if validar_chave_acesso(chave):
+            return chave
+    return None
+
+
+# Código IBGE da UF (cUF, dois primeiros dígitos da chave).
+UF_POR_CODIGO = {
+    "11": "RO", "12": "AC", "13": "AM", "14": "RR", "15": "PA", "16": "AP", "17": "TO",
+    "21": "MA", "22": "PI", "23": "CE", "24": "RN", "25": "PB", "26": "PE", "27": "AL", "28": "SE", "29": "BA",
+    "31": "MG", "32": "ES", "33": "RJ", "35": "SP",
+    "41": "PR", "42": "SC", "43": "RS",
+    "50": "MS", "51": "MT", "52": "GO", "53": "DF",
+}
+
+
+def decodificar_chave_acesso(chave: str | None) -> dict | None:
+    """
+    Decompõe a chave de acesso nos campos do leiaute (cUF, AAMM, CNPJ, modelo, série, número).
+
+    Args:
+        chave (str | None): Chave com 44 dígitos.
+
+    Returns:
+        dict | None: `uf`, `ano`, `mes`, `cnpj` (14 dígitos), `modelo`, `serie`, `numero`
+        e `tipo_emissao`; None se a chave é inválida ou o mês não existe.
+    """
+    if not validar_chave_acesso(chave):
+        return None
+    mes = int(chave[4:6])
+    if not 1 <= mes <= 12:
+        return None
+    return {
+        "uf": UF_POR_CODIGO.get(chave[:2], chave[:2]),
+        "ano": 2000 + int(chave[2:4]),
+        "mes": mes,
+        "cnpj": chave[6:20],
+        "modelo": chave[20:22],
+        "serie": int(chave[22:25]),
+        "numero": int(chave[25:34]),
+        "tipo_emissao": chave[34],
+    }
@@ -0,0 +1,177 @@
+import logging
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.cache.backends.redis import RedisCache
+
+logger = logging.getLogger(__name__)
+
+FECHADO = "fechado"
+ABERTO = "aberto"
+MEIO_ABERTO = "meio_aberto"
+
+# A janela é dividida em baldes de contadores com expiração própria (janela deslizante).
+BALDES_POR_JANELA = 6
+
+
+# Sem Redis, o estado fica no próprio processo: no cache de banco, `add` + `incr` não é
+# atômico e perderia falhas sob concorrência (o circuito deixaria de abrir).
+_LOCAL = LocMemCache("nfe-circuito", {"MAX_ENTRIES": 10000})
+
+
+def _armazenamento():
+    """Cache do circuito: o padrão quando é o Redis (incr atômico, compartilhado entre workers); senão, o do processo."""
+    padrao = caches["default"]
+    return padrao if isinstance(padrao, RedisCache) else _LOCAL
+
+
+def _chave(host: str, sufixo: str) -> str:
+    return f"nfe:circuito:{host}:{sufixo}"
+
+
+def _tamanho_balde() -> float:
+    return max(1.0, settings.NFE_CIRCUITO_JANELA / BALDES_POR_JANELA)
+
+
+def _chaves_janela(host: str, agora: float) -> list[tuple[str, str]]:
+    atual = int(agora // _tamanho_balde())
+    return [
+        (_chave(host, f"{balde}:total"), _chave(host, f"{balde}:falhas"))
+        for balde in range(atual - BALDES_POR_JANELA + 1, atual + 1)
+    ]
+
+
+def _contar(chave: str, ttl: int):
+    cache = _armazenamento()
+    cache.add(chave, 0, ttl)
+    try:
+        cache.incr(chave)
+    except ValueError:
+        cache.set(chave, 1, ttl)
+
+
+def contadores(host: str) -> tuple[int, int]:
+    """Soma (requisições, falhas) do host na janela deslizante."""
+    pares = _chaves_janela(host, time.time())
+    valores = _armazenamento().get_many([chave for par in pares for chave in par])
+    total = sum(valores.get(t, 0) for t, _ in pares)
+    falhas = sum(valores.get(f, 0) for _, f in pares)
+    return total, falhas
+
+
+def estado(host: str) -> str:
+    """Estado atual do circuito do host: fechado, aberto ou meio_aberto."""
+    try:
+        valores = _armazenamento().get_many([_chave(host, ABERTO), _chave(host, MEIO_ABERTO)])
+    except Exception as e:
+        logger.warning(f"Cache do circuito SEFAZ indisponível: {e}")
+        return FECHADO
+    if valores.get(_chave(host, ABERTO)):
+        return ABERTO
+    if valores.get(_chave(host, MEIO_ABERTO)):
+        return MEIO_ABERTO
+    return FECHADO
+
+
+def permitir(host: str) -> bool:
+    """
+    Indica se uma consulta ao host pode ser feita agora.
+
+    Com o circuito aberto, recusa de imediato. Depois da espera (meio aberto), libera
+    uma única requisição de teste por vez entre todos os workers (por processo, sem
+    Redis); as demais continuam recusadas até o resultado do teste. Sem cache
+    disponível, libera.
+
+    Args:
+        host (str): Hostname do portal da SEFAZ.
+
+    Returns:
+        bool: True se a requisição pode seguir.
+    """
+    situacao = estado(host)
+    if situacao == ABERTO:
+        return False
+    if situacao == MEIO_ABERTO:
+        try:
+            # A sonda vale pelo pior caso da consulta (fila, novas tentativas e backoff),
+            # para não expirar com ela ainda em andamento e liberar uma segunda sonda.
+            return _armazenamento().add(_chave(host, "sonda"), 1, int(settings.NFE_HTTP_PRAZO_TOTAL) + 5)
+        except Exception:
+            return True
+    return True
+
+
+def _abrir(host: str, motivo: str):
+    cache = _armazenamento()
+    espera = settings.NFE_CIRCUITO_ESPERA
+    cache.set(_chave(host, ABERTO), 1, espera)
+    # O meio aberto expira se nenhuma sonda o resolver: sem tráfego, o circuito volta a fechar.
+    cache.set(_chave(host, MEIO_ABERTO), 1, espera + settings.NFE_CIRCUITO_JANELA + int(settings.NFE_HTTP_PRAZO_TOTAL))
+    cache.delete(_chave(host, "sonda"))
+    logger.warning(f"Circuito SEFAZ ABERTO para {host} por {espera}s ({motivo}).")
+
+
+def _fechar(host: str):
+    pares = _chaves_janela(host, time.time())
+    _armazenamento().delete_many([_chave(host, MEIO_ABERTO), _chave(host, "sonda")] + [c for par in pares for c in par])
+    logger.info(f"Circuito SEFAZ FECHADO para {host}: requisição de teste bem-sucedida.")
+
+
+def registrar(host: str, sucesso: bool, duracao: float):
+    """
+    Registra o desfecho de uma consulta ao host e abre ou fecha o circuito.
+
+    Respostas mais lentas que `NFE_CIRCUITO_LATENCIA_MAXIMA` contam como falha (orçamento
+    de latência). O circuito abre quando, na janela `NFE_CIRCUITO_JANELA`, há pelo menos
+    `NFE_CIRCUITO_MIN_REQUISICOES` consultas e a taxa de falhas atinge
+    `NFE_CIRCUITO_TAXA_FALHAS`. No estado meio aberto, o teste decide: sucesso fecha,
+    falha reabre.
+
+    Args:
+        host (str): Hostname do portal da SEFAZ.
+        sucesso (bool): Se a consulta terminou sem erro de rede ou 5xx.
+        duracao (float): Duração da consulta em segundos.
+    """
+    falha = not sucesso or duracao > settings.NFE_CIRCUITO_LATENCIA_MAXIMA
+    try:
+        if estado(host) == MEIO_ABERTO:
+            if falha:
+                _abrir(host, f"teste falhou em {duracao:.1f}s")
+            else:
+                _fechar(host)
+            return
+
+        total_chave, falhas_chave = _chaves_janela(host, time.time())[-1]
+        ttl = int(settings.NFE_CIRCUITO_JANELA + _tamanho_balde()) + 1
+        _contar(total_chave, ttl)
+        if falha:
+            _contar(falhas_chave, ttl)
+            total, falhas = contadores(host)
+            if total >= settings.NFE_CIRCUITO_MIN_REQUISICOES and falhas / total >= settings.NFE_CIRCUITO_TAXA_FALHAS:
+                _abrir(host, f"{falhas}/{total} falhas ou respostas lentas em {settings.NFE_CIRCUITO_JANELA}s")
+    except Exception as e:
+        logger.warning(f"Falha ao registrar o circuito SEFAZ de {host}: {e}")
+
+
+def metricas(hosts) -> dict:
+    """
+    Estado e contadores da janela para os hosts informados.
+
+    Args:
+        hosts (Iterable[str]): Hostnames a consultar (ex.: os de `parsers_sefaz.metricas()`).
+
+    Returns:
+        dict: Para cada host, estado, requisições e falhas na janela e a taxa de falhas.
+    """
+    resultado = {}
+    for host in hosts:
+        total, falhas = contadores(host)
+        resultado[host] = {
+            "estado": estado(host),
+            "requisicoes": total,
+            "falhas": falhas,
+            "taxa_falhas": round(falhas / total, 2) if total else 0.0,
+        }
+    return resultado
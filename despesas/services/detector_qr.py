@@ -0,0 +1,240 @@
+import logging
+import threading
+
+from django.conf import settings
+
+from despesas.services.qr_cascata import MARGEM_RECORTE, _zbar_ou_opencv
+
+logger = logging.getLogger(__name__)
+
+BACKENDS = ("torch", "onnxruntime", "opencv")
+LIMIAR_NMS = 0.45
+COR_PREENCHIMENTO = 114
+
+
+class LeitorQRONNX:
+    """
+    Detector de QR Code do QReader (YOLOv8 nano do `qrdet`) exportado para ONNX, sem torch.
+
+    Expõe o mesmo `detect_and_decode(image=...)` do QReader: localiza os QR Codes com o
+    modelo e decodifica cada recorte com zbar/OpenCV (com nova tentativa limiarizada),
+    como o QReader faz com o pyzbar. O modelo é gerado por `manage.py exportar_detector_qr`.
+
+    Args:
+        caminho (str): Arquivo `.onnx` do detector.
+        backend (str): `onnxruntime` ou `opencv` (`cv2.dnn`). O modelo quantizado em int8
+            exige o onnxruntime.
+        tamanho (int): Lado da entrada do modelo (640 no export padrão).
+        confianca (float): Confiança mínima de uma detecção.
+        tamanho_lote (int): Máximo de imagens por inferência em `detectar_lote`.
+    """
+
+    def __init__(self, caminho: str, backend: str = "onnxruntime", tamanho: int = 640, confianca: float = 0.5, tamanho_lote: int = 8):
+        if backend not in ("onnxruntime", "opencv"):
+            raise ValueError(f"Backend ONNX desconhecido: {backend}")
+        self.caminho = caminho
+        self.backend = backend
+        self.tamanho = tamanho
+        self.confianca = confianca
+        self.tamanho_lote = max(1, tamanho_lote)
+        self._aceita_lote = True
+        # A rede do cv2.dnn guarda a entrada (setInput) no próprio objeto: uma inferência por vez.
+        self._lock_rede = threading.Lock()
+        self._carregar()
+
+    def _carregar(self):
+        if self.backend == "onnxruntime":
+            import onnxruntime
+            opcoes = onnxruntime.SessionOptions()
+            opcoes.intra_op_num_threads = 1
+            self._sessao = onnxruntime.InferenceSession(self.caminho, opcoes, providers=["CPUExecutionProvider"])
+            entrada = self._sessao.get_inputs()[0]
+            self._entrada = entrada.name
+            # Export com `dynamic=True` deixa o lote simbólico; um inteiro indica lote fixo.
+            self._aceita_lote = not isinstance(entrada.shape[0], int) or entrada.shape[0] != 1
+        else:
+            import cv2
+            self._rede = cv2.dnn.readNetFromONNX(self.caminho)
+            self._saidas = self._rede.getUnconnectedOutLayersNames()
+
+    def _inferir(self, blob):
+        """Executa o modelo e retorna a saída de caixas `(1, 4 + classes [+ máscaras], N)`."""
+        if self.backend == "onnxruntime":
+            saidas = self._sessao.run(None, {self._entrada: blob})
+        else:
+            with self._lock_rede:
+                self._rede.setInput(blob)
+                saidas = self._rede.forward(self._saidas)
+        # O modelo de segmentação do qrdet também devolve os protótipos de máscara (4 dimensões).
+        return next(saida for saida in saidas if saida.ndim == 3)
+
+    def _preparar(self, imagem):
+        """Letterbox da imagem no quadro do modelo; retorna o quadro e a geometria para desfazê-lo."""
+        import cv2
+        import numpy as np
+
+        if imagem.ndim == 2:
+            imagem = cv2.cvtColor(imagem, cv2.COLOR_GRAY2BGR)
+        altura, largura = imagem.shape[:2]
+        proporcao = min(self.tamanho / altura, self.tamanho / largura)
+        nova_largura, nova_altura = round(largura * proporcao), round(altura * proporcao)
+        desloc_x, desloc_y = (self.tamanho - nova_largura) // 2, (self.tamanho - nova_altura) // 2
+        quadro = np.full((self.tamanho, self.tamanho, 3), COR_PREENCHIMENTO, dtype=np.uint8)
+        quadro[desloc_y:desloc_y + nova_altura, desloc_x:desloc_x + nova_largura] = cv2.resize(
+            imagem, (nova_largura, nova_altura), interpolation=cv2.INTER_LINEAR
+        )
+        return quadro, (proporcao, desloc_x, desloc_y, largura, altura)
+
+    def _caixas(self, predicoes, geometria) -> list[tuple[float, float, float, float, float]]:
+        """Filtra, suprime sobreposições (NMS) e leva as caixas de uma imagem às coordenadas originais."""
+        import cv2
+        import numpy as np
+
+        proporcao, desloc_x, desloc_y, largura, altura = geometria
+        predicoes = predicoes.T
+        # Modelo de classe única: colunas 0-3 são a caixa (centro, largura, altura) e a 4 a confiança.
+        confiancas = predicoes[:, 4]
+        selecionadas = confiancas >= self.confianca
+        if not selecionadas.any():
+            return []
+        caixas, confiancas = predicoes[selecionadas, :4], confiancas[selecionadas]
+        retangulos = [[float(cx - w / 2), float(cy - h / 2), float(w), float(h)] for cx, cy, w, h in caixas]
+        indices = cv2.dnn.NMSBoxes(retangulos, confiancas.astype(float).tolist(), self.confianca, LIMIAR_NMS)
+
+        deteccoes = []
+        for i in np.array(indices).flatten():
+            x, y, w, h = retangulos[i]
+            x0 = max(0.0, (x - desloc_x) / proporcao)
+            y0 = max(0.0, (y - desloc_y) / proporcao)
+            x1 = min(float(largura), (x + w - desloc_x) / proporcao)
+            y1 = min(float(altura), (y + h - desloc_y) / proporcao)
+            deteccoes.append((x0, y0, x1, y1, float(confiancas[i])))
+        return sorted(deteccoes, key=lambda d: d[4], reverse=True)
+
+    def detectar_lote(self, imagens: list) -> list[list[tuple[float, float, float, float, float]]]:
+        """
+        Localiza os QR Codes de várias imagens com inferências em lotes empilhados.
+
+        As imagens são agrupadas em blocos de até `tamanho_lote` e cada bloco passa pelo
+        modelo em uma única chamada (entrada N x 3 x lado x lado). Modelos exportados com
+        lote fixo (1) são executados imagem a imagem.
+
+        Args:
+            imagens (list[np.ndarray]): Imagens BGR ou em tons de cinza.
+
+        Returns:
+            list[list[tuple]]: Para cada imagem, na ordem recebida, as caixas de `detectar`.
+        """
+        import cv2
+
+        preparadas = [self._preparar(imagem) for imagem in imagens]
+        passo = self.tamanho_lote if self._aceita_lote else 1
+        deteccoes = []
+        for inicio in range(0, len(preparadas), passo):
+            bloco = preparadas[inicio:inicio + passo]
+            blob = cv2.dnn.blobFromImages([quadro for quadro, _ in bloco], 1 / 255.0, (self.tamanho, self.tamanho), swapRB=True)
+            try:
+                saida = self._inferir(blob)
+            except Exception as e:
+                if len(bloco) == 1:
+                    raise
+                logger.warning(f"Detector de QR sem suporte a lote ({e}); inferindo imagem a imagem.")
+                self._aceita_lote = False
+                return self.detectar_lote(imagens)
+            deteccoes.extend(self._caixas(saida[k], geometria) for k, (_, geometria) in enumerate(bloco))
+        return deteccoes
+
+    def detectar(self, imagem) -> list[tuple[float, float, float, float, float]]:
+        """
+        Localiza os QR Codes na imagem.
+
+        Args:
+            imagem (np.ndarray): Imagem BGR ou em tons de cinza.
+
+        Returns:
+            list[tuple]: Caixas `(x0, y0, x1, y1, confiança)` nas coordenadas da imagem,
+            da mais confiável para a menos.
+        """
+        import cv2
+
+        quadro, geometria = self._preparar(imagem)
+        blob = cv2.dnn.blobFromImage(quadro, 1 / 255.0, (self.tamanho, self.tamanho), swapRB=True)
+        return self._caixas(self._inferir(blob)[0], geometria)
+
+    def _decodificar_caixas(self, image, caixas) -> tuple[str | None, ...]:
+        import cv2
+
+        cinza = image if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        altura, largura = cinza.shape[:2]
+        resultados = []
+        for x0, y0, x1, y1, _ in caixas:
+            margem = MARGEM_RECORTE * max(x1 - x0, y1 - y0)
+            recorte = cinza[
+                max(0, int(y0 - margem)):min(altura, int(y1 + margem)),
+                max(0, int(x0 - margem)):min(largura, int(x1 + margem)),
+            ]
+            if recorte.size == 0:
+                resultados.append(None)
+                continue
+            conteudo = _zbar_ou_opencv(recorte)
+            if not conteudo:
+                limiarizado = cv2.adaptiveThreshold(recorte, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 21, 11)
+                conteudo = _zbar_ou_opencv(limiarizado)
+            resultados.append(conteudo)
+        return tuple(resultados)
+
+    def detect_and_decode(self, image) -> tuple[str | None, ...]:
+        """
+        Detecta e decodifica os QR Codes da imagem (mesmo contrato do QReader).
+
+        Args:
+            image (np.ndarray): Imagem BGR ou em tons de cinza.
+
+        Returns:
+            tuple[str | None, ...]: Conteúdo de cada QR detectado (None se não decodificou).
+        """
+        return self._decodificar_caixas(image, self.detectar(image))
+
+    def detect_and_decode_lote(self, images: list) -> list[tuple[str | None, ...]]:
+        """
+        Versão em lote de `detect_and_decode`: uma inferência por bloco de imagens.
+
+        Args:
+            images (list[np.ndarray]): Imagens BGR ou em tons de cinza.
+
+        Returns:
+            list[tuple[str | None, ...]]: Resultado de cada imagem, na ordem recebida.
+        """
+        return [self._decodificar_caixas(image, caixas) for image, caixas in zip(images, self.detectar_lote(images))]
+
+
+def criar_leitor(backend: str | None = None, caminho: str | None = None):
+    """
+    Cria o leitor neural de QR Code do backend configurado em `QR_DETECTOR_BACKEND`.
+
+    Args:
+        backend (str, optional): `torch` (QReader original), `onnxruntime` ou `opencv`.
+        caminho (str, optional): Modelo ONNX (padrão: `QR_DETECTOR_MODELO`).
+
+    Returns:
+        QReader | LeitorQRONNX: Objeto com `detect_and_decode(image=...)`.
+
+    Raises:
+        ImportError: Se a biblioteca do backend não está instalada.
+        ValueError: Se o backend é desconhecido.
+    """
+    backend = backend or getattr(settings, "QR_DETECTOR_BACKEND", "torch")
+    if backend not in BACKENDS:
+        raise ValueError(f"Backend do detector de QR desconhecido: {backend}")
+    if backend == "torch":
+        from qreader import QReader
+        return QReader(model_size="n")
+    caminho = caminho or settings.QR_DETECTOR_MODELO
+    logger.info(f"Carregando detector de QR ONNX ({backend}): {caminho}")
+    return LeitorQRONNX(
+        caminho,
+        backend=backend,
+        tamanho=settings.QR_DETECTOR_TAMANHO,
+        confianca=settings.QR_DETECTOR_CONFIANCA,
+        tamanho_lote=settings.QR_LOTE_TAMANHO,
+    )
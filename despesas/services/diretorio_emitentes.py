@@ -0,0 +1,90 @@
+import logging
+import re
+from urllib.parse import urlparse
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from despesas.models import EmitenteCNPJ
+from despesas.services.categorizacao import normalizar_nome, sugerir_categoria
+
+logger = logging.getLogger(__name__)
+
+NOME_GENERICO = "Consumidor"
+
+
+def digitos_cnpj(cnpj: str | None) -> str | None:
+    """Retorna os 14 dígitos do CNPJ (com ou sem máscara) ou None se incompleto."""
+    digitos = re.sub(r"\D", "", cnpj or "")
+    return digitos if len(digitos) == 14 else None
+
+
+def consultar(cnpj: str | None) -> EmitenteCNPJ | None:
+    """
+    Busca o emitente no diretório pela chave única do CNPJ.
+
+    Args:
+        cnpj (str | None): CNPJ com ou sem máscara.
+
+    Returns:
+        EmitenteCNPJ | None: Registro do diretório ou None se o CNPJ ainda não foi visto.
+    """
+    digitos = digitos_cnpj(cnpj)
+    if not digitos:
+        return None
+    return EmitenteCNPJ.objects.filter(cnpj=digitos).first()
+
+
+def categoria_padrao(cnpj: str | None) -> str | None:
+    """Nome da categoria padrão do emitente no diretório, sem carregar o registro inteiro."""
+    digitos = digitos_cnpj(cnpj)
+    if not digitos:
+        return None
+    return EmitenteCNPJ.objects.filter(cnpj=digitos).values_list("categoria_padrao", flat=True).first() or None
+
+
+def registrar(dados: dict, url: str | None = None):
+    """
+    Registra no diretório o emitente de uma nota consultada na SEFAZ.
+
+    Só deve receber dados da página da SEFAZ: o diretório é global, e arquivos enviados
+    pelos usuários (PDF, XML) não são verificados.
+
+    Atualiza nome, host da SEFAZ e o contador de notas com um único UPDATE; na primeira
+    vez que o CNPJ aparece, cria o registro com a categoria padrão sugerida pelas
+    palavras-chave do nome.
+
+    Args:
+        dados (dict): Dados extraídos da nota (`emitente`, `cnpj`).
+        url (str | None): URL da consulta na SEFAZ, de onde vem o host.
+    """
+    digitos = digitos_cnpj(dados.get("cnpj"))
+    if not digitos:
+        return
+    nome = " ".join((dados.get("emitente") or "").split())[:200]
+    if nome == NOME_GENERICO:
+        nome = ""
+    host = (urlparse(url).hostname or "") if url else ""
+
+    campos = {"notas_importadas": F("notas_importadas") + 1, "atualizado_em": timezone.now()}
+    if nome:
+        campos.update(nome=nome, nome_normalizado=normalizar_nome(nome)[:200])
+    if host:
+        campos["host_sefaz"] = host[:255]
+    if EmitenteCNPJ.objects.filter(cnpj=digitos).update(**campos):
+        return
+
+    try:
+        with transaction.atomic():
+            EmitenteCNPJ.objects.create(
+                cnpj=digitos,
+                nome=nome,
+                nome_normalizado=normalizar_nome(nome)[:200],
+                categoria_padrao=sugerir_categoria(nome) or "",
+                host_sefaz=host[:255],
+                notas_importadas=1,
+            )
+        logger.info(f"Emitente {digitos} adicionado ao diretório.")
+    except IntegrityError:
+        EmitenteCNPJ.objects.filter(cnpj=digitos).update(**campos)
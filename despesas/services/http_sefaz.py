@@ -0,0 +1,227 @@
+import logging
+import random
+import threading
+import time
+from collections import defaultdict
+from urllib.parse import urlparse
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger(__name__)
+
+HEADERS_PADRAO = {"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) Chrome/120.0"}
+STATUS_REPETIVEIS = frozenset({500, 502, 503, 504})
+# Um resumo das métricas do host vai para o log a cada tantas requisições.
+RESUMO_A_CADA = 100
+
+class _AdapterContado(HTTPAdapter):
+    """
+    Adapter que conta os sockets abertos por host.
+
+    Usa os pontos de extensão documentados do urllib3 (`pool_classes_by_scheme` e
+    `ConnectionCls`) em vez de ler o estado interno dos pools.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self.conexoes_abertas: dict[str, int] = defaultdict(int)
+        self._lock_conexoes = threading.Lock()
+        super().__init__(*args, **kwargs)
+
+    def _contar(self, host: str):
+        with self._lock_conexoes:
+            self.conexoes_abertas[host] += 1
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        contar = self._contar
+
+        class ConexaoHTTP(HTTPConnection):
+            def connect(self):
+                super().connect()
+                contar(self.host)
+
+        class ConexaoHTTPS(HTTPSConnection):
+            def connect(self):
+                super().connect()
+                contar(self.host)
+
+        class PoolHTTP(HTTPConnectionPool):
+            ConnectionCls = ConexaoHTTP
+
+        class PoolHTTPS(HTTPSConnectionPool):
+            ConnectionCls = ConexaoHTTPS
+
+        self.poolmanager.pool_classes_by_scheme = {"http": PoolHTTP, "https": PoolHTTPS}
+
+
+class ClienteHTTPSefaz:
+    """
+    Cliente HTTP compartilhado para as consultas aos portais da SEFAZ.
+
+    Mantém conexões keep-alive por host (evitando novo DNS/TCP/TLS a cada importação),
+    limita requisições simultâneas por host e separa os timeouts de conexão e de leitura.
+    Repete, com backoff e jitter, apenas falhas de conexão e respostas 5xx, e nunca além
+    do prazo total `prazo_total`: um timeout de leitura não é repetido, de modo que uma
+    consulta lenta não prende a thread do gunicorn por várias vezes o timeout.
+    """
+
+    def __init__(
+        self,
+        conexoes_por_host: int = 4,
+        simultaneas_por_host: int = 4,
+        tentativas: int = 2,
+        timeout_conexao: float = 5,
+        timeout_leitura: float = 15,
+        backoff: float = 0.5,
+        prazo_total: float = 20,
+    ):
+        self.timeout = (timeout_conexao, timeout_leitura)
+        self.simultaneas_por_host = simultaneas_por_host
+        self.tentativas = tentativas
+        self.backoff = backoff
+        self.prazo_total = prazo_total
+        self.sessao = requests.Session()
+        self.sessao.headers.update(HEADERS_PADRAO)
+        # As novas tentativas são feitas em `get`, sob o prazo total; o urllib3 não repete nada.
+        self._adapter = adapter = _AdapterContado(pool_connections=16, pool_maxsize=conexoes_por_host, max_retries=Retry(0, read=False))
+        self.sessao.mount("http://", adapter)
+        self.sessao.mount("https://", adapter)
+        self._lock = threading.Lock()
+        self._semaforos: dict[str, threading.BoundedSemaphore] = {}
+        self._metricas = defaultdict(lambda: {"requisicoes": 0, "tentativas": 0, "erros": 0, "tempo_total": 0.0})
+
+    def _semaforo(self, host: str) -> threading.BoundedSemaphore:
+        with self._lock:
+            if host not in self._semaforos:
+                self._semaforos[host] = threading.BoundedSemaphore(self.simultaneas_por_host)
+            return self._semaforos[host]
+
+    def _espera(self, tentativa: int) -> float:
+        return self.backoff * (2 ** tentativa) + random.uniform(0, self.backoff)
+
+    def _com_tentativas(self, url: str, prazo: float, **kwargs) -> tuple[requests.Response, int]:
+        """Executa o GET repetindo falhas de conexão e 5xx enquanto houver tentativas e prazo."""
+        conexao, leitura = kwargs.pop("timeout", None) or self.timeout
+        tentativa = 0
+        while True:
+            restante = prazo - time.monotonic()
+            if restante <= 0:
+                raise requests.Timeout(f"Prazo total de {self.prazo_total:.0f}s esgotado para {url}")
+            espera = self._espera(tentativa)
+            try:
+                resposta = self.sessao.get(url, timeout=(min(conexao, restante), min(leitura, restante)), **kwargs)
+            except requests.ConnectionError:
+                # Inclui ConnectTimeout e conexões keep-alive encerradas pelo servidor; ReadTimeout não é repetido.
+                if tentativa >= self.tentativas or prazo - time.monotonic() <= espera:
+                    raise
+            else:
+                if (
+                    resposta.status_code not in STATUS_REPETIVEIS
+                    or tentativa >= self.tentativas
+                    or prazo - time.monotonic() <= espera
+                ):
+                    return resposta, tentativa + 1
+                # Consome o corpo para a conexão voltar ao pool em vez de ser fechada.
+                resposta.content
+            time.sleep(espera)
+            tentativa += 1
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        """
+        Executa um GET respeitando o limite de concorrência do host e o prazo total.
+
+        Args:
+            url (str): URL a ser consultada.
+
+        Returns:
+            requests.Response: Resposta final (após as novas tentativas).
+
+        Raises:
+            requests.RequestException: Em falha de conexão, timeout, prazo total esgotado
+            ou fila do host esgotada.
+        """
+        host = urlparse(url).hostname or ""
+        prazo = time.monotonic() + self.prazo_total
+        semaforo = self._semaforo(host)
+        # A espera na fila do host conta no prazo total: ele é o pior caso de uma consulta.
+        if not semaforo.acquire(timeout=self.prazo_total):
+            raise requests.ConnectionError(f"Limite de requisições simultâneas para {host} atingido")
+        try:
+            inicio = time.perf_counter()
+            tentativas, erro = 1, False
+            try:
+                resposta, tentativas = self._com_tentativas(url, prazo, **kwargs)
+                return resposta
+            except requests.RequestException:
+                erro = True
+                raise
+            finally:
+                self._registrar(host, tentativas, erro, time.perf_counter() - inicio)
+        finally:
+            semaforo.release()
+
+    def _registrar(self, host: str, tentativas: int, erro: bool, duracao: float):
+        with self._lock:
+            metrica = self._metricas[host]
+            metrica["requisicoes"] += 1
+            metrica["tentativas"] += tentativas
+            metrica["erros"] += int(erro)
+            metrica["tempo_total"] += duracao
+            resumir = metrica["requisicoes"] % RESUMO_A_CADA == 0
+        if resumir:
+            m = self.metricas()[host]
+            logger.info(
+                f"Cliente SEFAZ {host}: {m['requisicoes']} requisições, {m['conexoes_novas']} conexões novas, "
+                f"{m['reuso']} reaproveitadas, {m['erros']} erros, {m['tempo_medio_ms']}ms em média",
+                extra={"http_sefaz": {"host": host, **m}},
+            )
+
+    def metricas(self) -> dict:
+        """
+        Retorna as métricas de uso por host (também resumidas no log a cada `RESUMO_A_CADA` requisições).
+
+        Returns:
+            dict: Para cada host, requisições, tentativas, conexões novas, reaproveitamentos
+            do pool, erros e tempo médio em milissegundos.
+        """
+        with self._adapter._lock_conexoes:
+            conexoes = dict(self._adapter.conexoes_abertas)
+        with self._lock:
+            resultado = {}
+            for host, m in self._metricas.items():
+                novas = conexoes.get(host, 0)
+                resultado[host] = {
+                    "requisicoes": m["requisicoes"],
+                    "tentativas": m["tentativas"],
+                    "conexoes_novas": novas,
+                    "reuso": max(0, m["tentativas"] - novas),
+                    "erros": m["erros"],
+                    "tempo_medio_ms": round(m["tempo_total"] * 1000 / m["requisicoes"], 1) if m["requisicoes"] else 0.0,
+                }
+            return resultado
+
+
+_CLIENTE = None
+_CLIENTE_LOCK = threading.Lock()
+
+
+def obter_cliente() -> ClienteHTTPSefaz:
+    """Retorna o cliente HTTP do processo, configurado pelas settings `NFE_HTTP_*`."""
+    global _CLIENTE
+    if _CLIENTE is None:
+        with _CLIENTE_LOCK:
+            if _CLIENTE is None:
+                _CLIENTE = ClienteHTTPSefaz(
+                    conexoes_por_host=settings.NFE_HTTP_CONEXOES_POR_HOST,
+                    simultaneas_por_host=settings.NFE_HTTP_SIMULTANEAS_POR_HOST,
+                    tentativas=settings.NFE_HTTP_TENTATIVAS,
+                    timeout_conexao=settings.NFE_HTTP_TIMEOUT_CONEXAO,
+                    timeout_leitura=settings.NFE_HTTP_TIMEOUT_LEITURA,
+                    prazo_total=settings.NFE_HTTP_PRAZO_TOTAL,
+                )
+    return _CLIENTE
@@ -0,0 +1,488 @@
+import logging
+import os
+import time
+from concurrent.futures import CancelledError, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.utils import timezone
+from dateutil import parser as dateparser
+
+from despesas.enums.status_importacao_enum import StatusImportacao
+from despesas.models import Despesa, ImportacaoNFe, LoteImportacaoNFe
+from despesas.services import cache_nfe, diretorio_emitentes, medicao
+from despesas.services.chave_acesso import chave_acesso_valida, decodificar_chave_acesso, validar_chave_acesso
+from despesas.services.nfe_service import NFeService
+from despesas.services.nfe_xml import eh_xml, ler_chave_acesso
+from despesas.uploads import caminho_em_disco, conteudo_mapeado
+
+logger = logging.getLogger(__name__)
+
+
+def eh_pdf(content_type: str, nome: str) -> bool:
+    return (content_type or "").lower() == "application/pdf" or (nome or "").lower().endswith(".pdf")
+
+
+def processar_arquivo(service: NFeService, arquivo, content_type: str, nome: str) -> tuple[dict, str | None]:
+    """
+    Extrai os dados de uma nota a partir do arquivo enviado.
+
+    Encaminha PDFs para o parser de DANFE, XMLs da NF-e para a leitura em streaming
+    e imagens para a leitura do QR Code seguida da consulta à página da SEFAZ. Imagens
+    em disco são lidas por mmap (`uploads.conteudo_mapeado`), sem cópia em memória.
+
+    Args:
+        service (NFeService): Instância do serviço de leitura.
+        arquivo (file): Arquivo aberto (upload ou arquivo armazenado).
+        content_type (str): Content-Type informado no upload.
+        nome (str): Nome original do arquivo.
+
+    Returns:
+        tuple[dict, str | None]: Dados extraídos e a URL do QR Code (quando houver).
+    """
+    if eh_pdf(content_type, nome):
+        return service.processar_danfe_pdf(arquivo), None
+    if eh_xml(content_type, nome):
+        return service.processar_nfe_xml(arquivo), None
+
+    with conteudo_mapeado(arquivo) as conteudo:
+        url = service.decodificar_qr_code(conteudo)
+    if not url:
+        return {}, None
+    return service.extrair_dados_url(url), url
+
+
+def serializar_dados(dados: dict) -> dict:
+    """Converte os dados extraídos para um formato compatível com JSONField."""
+    serializado = dict(dados)
+    if isinstance(serializado.get("data_emissao"), date):
+        serializado["data_emissao"] = serializado["data_emissao"].isoformat()
+    if serializado.get("forma_pagamento_key"):
+        serializado["forma_pagamento_key"] = str(serializado["forma_pagamento_key"])
+    return serializado
+
+
+def desserializar_dados(dados: dict | None) -> dict:
+    """Reconstrói os dados extraídos a partir do conteúdo salvo no job."""
+    dados = dict(dados or {})
+    if isinstance(dados.get("data_emissao"), str):
+        try:
+            dados["data_emissao"] = dateparser.parse(dados["data_emissao"]).date()
+        except (ValueError, OverflowError):
+            dados["data_emissao"] = None
+    return dados
+
+
+def hash_upload(arquivo) -> str:
+    """Calcula o SHA-256 do arquivo enviado em blocos e o devolve posicionado no início."""
+    hasher = cache_nfe.novo_hash()
+    for chunk in arquivo.chunks():
+        hasher.update(chunk)
+    arquivo.seek(0)
+    return hasher.hexdigest()
+
+
+def despesa_lancada(user_id: int, chave_acesso: str | None) -> Despesa | None:
+    """
+    Busca a despesa do usuário já lançada com a chave de acesso (índice único por usuário).
+
+    Args:
+        user_id (int): Dono das despesas.
+        chave_acesso (str | None): Chave de 44 dígitos.
+
+    Returns:
+        Despesa | None: A despesa existente ou None se a chave é inválida ou ainda não foi usada.
+    """
+    if not validar_chave_acesso(chave_acesso):
+        return None
+    return Despesa.objects.filter(user_id=user_id, chave_acesso=chave_acesso).first()
+
+
+def localizar_despesa_lancada(user, arquivo, hash_arquivo: str) -> Despesa | None:
+    """
+    Verifica, antes de qualquer processamento pesado, se a nota enviada já foi lançada.
+
+    A chave sai do atributo Id no início do XML ou do resultado em cache da leitura
+    do QR Code da mesma imagem; PDFs e imagens ainda não decodificadas seguem para o job.
+
+    Args:
+        user (User): Dono da importação.
+        arquivo (UploadedFile): Arquivo enviado.
+        hash_arquivo (str): SHA-256 do arquivo (`hash_upload`).
+
+    Returns:
+        Despesa | None: A despesa existente ou None.
+    """
+    if eh_pdf(arquivo.content_type, arquivo.name):
+        return None
+    if eh_xml(arquivo.content_type, arquivo.name):
+        return despesa_lancada(user.pk, ler_chave_acesso(arquivo))
+    encontrado, url = cache_nfe.obter_qr(hash_arquivo)
+    return despesa_lancada(user.pk, chave_acesso_valida(url)) if encontrado else None
+
+
+def marcar_nota_lancada(user_id: int, dados: dict) -> dict:
+    """Acrescenta `despesa_existente` aos dados extraídos quando a chave da nota já foi lançada."""
+    if dados and "despesa_existente" not in dados:
+        existente = despesa_lancada(user_id, dados.get("chave_acesso"))
+        if existente:
+            dados["despesa_existente"] = existente.pk
+    return dados
+
+
+def expirar_importacoes_paradas(importacoes=None) -> int:
+    """
+    Marca com erro os jobs em processamento parados há mais de `NFE_IMPORTACAO_PRAZO`.
+
+    Um job fica em PROCESSANDO para sempre se a thread ou o worker que o executava morreu;
+    sem isso, a deduplicação devolveria o job morto a cada reenvio do mesmo arquivo.
+
+    Args:
+        importacoes (QuerySet, optional): Jobs a verificar (padrão: todos).
+
+    Returns:
+        int: Quantidade de jobs expirados.
+    """
+    agora = timezone.now()
+    limite = agora - timedelta(seconds=settings.NFE_IMPORTACAO_PRAZO)
+    importacoes = ImportacaoNFe.objects.all() if importacoes is None else importacoes
+    paradas = list(importacoes.filter(status=StatusImportacao.PROCESSANDO, atualizado_em__lt=limite))
+    expiradas = 0
+    for importacao in paradas:
+        if ImportacaoNFe.objects.filter(
+            pk=importacao.pk, status=StatusImportacao.PROCESSANDO, atualizado_em__lt=limite
+        ).update(status=StatusImportacao.ERRO, erro="Processamento interrompido.", concluido_em=agora, atualizado_em=agora):
+            expiradas += 1
+            _descartar_arquivo(importacao)
+            logger.warning(f"Importação {importacao.pk} parada desde {importacao.atualizado_em:%H:%M:%S}; marcada com erro.")
+    return expiradas
+
+
+def criar_importacao(user, arquivo, lote: LoteImportacaoNFe | None = None, hash_arquivo: str | None = None) -> tuple[ImportacaoNFe, bool]:
+    """
+    Registra um job de importação, reaproveitando um job equivalente recente.
+
+    Reenvios do mesmo arquivo pelo mesmo usuário dentro de `NFE_IMPORTACAO_JANELA_DEDUP`
+    retornam o job existente (pendente, em processamento ou concluído) em vez de criar outro;
+    um job parado há mais de `NFE_IMPORTACAO_PRAZO` é antes marcado com erro e não conta.
+    Dentro de um lote, a deduplicação considera apenas os arquivos do próprio lote.
+
+    Args:
+        user (User): Dono da importação.
+        arquivo (UploadedFile): Arquivo enviado.
+        lote (LoteImportacaoNFe, optional): Lote ao qual o job pertence.
+        hash_arquivo (str, optional): Hash já calculado com `hash_upload`.
+
+    Returns:
+        tuple[ImportacaoNFe, bool]: O job e se ele foi criado agora.
+    """
+    hash_arquivo = hash_arquivo or hash_upload(arquivo)
+
+    candidatos = ImportacaoNFe.objects.filter(user=user, hash_arquivo=hash_arquivo)
+    expirar_importacoes_paradas(candidatos)
+    if lote is not None:
+        candidatos = candidatos.filter(lote=lote)
+    else:
+        limite = timezone.now() - timedelta(seconds=settings.NFE_IMPORTACAO_JANELA_DEDUP)
+        candidatos = candidatos.filter(
+            lote__isnull=True,
+            criado_em__gte=limite,
+            status__in=[StatusImportacao.PENDENTE, StatusImportacao.PROCESSANDO, StatusImportacao.CONCLUIDA],
+        )
+    existente = candidatos.first()
+    if existente:
+        logger.info(f"Importação {existente.pk} reaproveitada para arquivo repetido.")
+        return existente, False
+
+    importacao = ImportacaoNFe(
+        user=user,
+        lote=lote,
+        nome_arquivo=(arquivo.name or "")[:255],
+        content_type=(arquivo.content_type or "")[:100],
+        hash_arquivo=hash_arquivo,
+    )
+    importacao.arquivo.save(arquivo.name or "nota", arquivo, save=False)
+    importacao.save()
+    return importacao, True
+
+
+def _descartar_arquivo(importacao: ImportacaoNFe):
+    """Remove o arquivo enviado quando o job não precisa mais dele."""
+    if importacao.arquivo:
+        importacao.arquivo.delete(save=False)
+        ImportacaoNFe.objects.filter(pk=importacao.pk).update(arquivo="")
+
+
+def _em_processamento(importacao_id: int) -> bool:
+    return ImportacaoNFe.objects.filter(pk=importacao_id, status=StatusImportacao.PROCESSANDO).exists()
+
+
+def _finalizar(importacao: ImportacaoNFe, **campos) -> bool:
+    """Grava o desfecho apenas se o job não foi cancelado durante o processamento."""
+    campos.setdefault("concluido_em", timezone.now())
+    atualizados = ImportacaoNFe.objects.filter(pk=importacao.pk, status=StatusImportacao.PROCESSANDO).update(
+        atualizado_em=timezone.now(), **campos
+    )
+    return bool(atualizados)
+
+
+def rascunho_da_chave(service: NFeService, chave_acesso: str | None) -> dict | None:
+    """
+    Monta um rascunho parcial da nota só com o que a chave de acesso codifica.
+
+    Preenche CNPJ e mês de emissão a partir da chave e o emitente pelo diretório de
+    CNPJs (quando já conhecido), sem acessar a SEFAZ. Itens e totais ficam vazios
+    até a extração completa.
+
+    Args:
+        service (NFeService): Serviço usado na validação do CNPJ.
+        chave_acesso (str | None): Chave de 44 dígitos lida do QR Code.
+
+    Returns:
+        dict | None: Dados no formato de `extrair_dados_url` com `parcial=True`, ou None
+        se a chave é inválida.
+    """
+    campos = decodificar_chave_acesso(chave_acesso)
+    if not campos:
+        return None
+    cnpj = campos["cnpj"]
+    emitente = diretorio_emitentes.consultar(cnpj)
+    hoje = timezone.localdate()
+    if (campos["ano"], campos["mes"]) == (hoje.year, hoje.month):
+        data_emissao = hoje
+    else:
+        data_emissao = date(campos["ano"], campos["mes"], 1)
+    return {
+        "emitente": emitente.nome if emitente and emitente.nome else "",
+        "cnpj": f"{cnpj[:2]}.{cnpj[2:5]}.{cnpj[5:8]}/{cnpj[8:12]}-{cnpj[12:]}" if service.validar_cnpj(cnpj) else None,
+        "data_emissao": data_emissao,
+        "valor_total": 0.0,
+        "desconto": 0.0,
+        "forma_pagamento_key": "",
+        "parcelas": 1,
+        "itens": [],
+        "chave_acesso": chave_acesso,
+        "parcial": True,
+    }
+
+
+def _nota_lancada(user_id: int, chave_acesso: str | None) -> dict | None:
+    """Resultado curto do job quando a chave já foi lançada, dispensando SEFAZ e parsing."""
+    existente = despesa_lancada(user_id, chave_acesso)
+    if not existente:
+        return None
+    logger.info(f"Nota {chave_acesso} já lançada na despesa {existente.pk}; processamento dispensado.")
+    return {"chave_acesso": chave_acesso, "despesa_existente": existente.pk}
+
+
+def executar_importacao(importacao_id: int):
+    """
+    Processa um job de importação, respeitando cancelamentos entre as etapas.
+
+    Se a chave de acesso (Id do XML ou URL do QR Code) já foi lançada pelo usuário,
+    o job termina apontando para a despesa existente, sem parsing nem consulta à SEFAZ.
+    Para QR Codes, o rascunho parcial da chave (`rascunho_da_chave`) é gravado assim que
+    a imagem é lida, antes da consulta à SEFAZ, e serve de resultado se a consulta falhar.
+
+    Args:
+        importacao_id (int): ID do job a ser processado.
+    """
+    iniciados = ImportacaoNFe.objects.filter(pk=importacao_id, status=StatusImportacao.PENDENTE).update(
+        status=StatusImportacao.PROCESSANDO, atualizado_em=timezone.now()
+    )
+    if not iniciados:
+        logger.info(f"Importação {importacao_id} ignorada (já iniciada ou cancelada).")
+        cancelada = ImportacaoNFe.objects.filter(pk=importacao_id, status=StatusImportacao.CANCELADA).first()
+        if cancelada:
+            _descartar_arquivo(cancelada)
+        return
+
+    importacao = ImportacaoNFe.objects.get(pk=importacao_id)
+    service = NFeService()
+    with medicao.medir() as medicao_job:
+        try:
+            with importacao.arquivo.open("rb") as arquivo:
+                if eh_pdf(importacao.content_type, importacao.nome_arquivo):
+                    dados, url = service.processar_danfe_pdf(arquivo), None
+                elif eh_xml(importacao.content_type, importacao.nome_arquivo):
+                    url = None
+                    dados = _nota_lancada(importacao.user_id, ler_chave_acesso(arquivo)) or service.processar_nfe_xml(arquivo)
+                else:
+                    with conteudo_mapeado(arquivo) as conteudo:
+                        url = service.decodificar_qr_code(conteudo)
+                    dados = {}
+                    if url and _em_processamento(importacao_id):
+                        chave = chave_acesso_valida(url)
+                        dados = _nota_lancada(importacao.user_id, chave)
+                        if not dados:
+                            parcial = rascunho_da_chave(service, chave)
+                            ImportacaoNFe.objects.filter(pk=importacao_id).update(
+                                url=url, resultado=serializar_dados(parcial) if parcial else None, atualizado_em=timezone.now()
+                            )
+                            dados = service.extrair_dados_url(url) or parcial or {}
+        except Exception as e:
+            logger.error(f"Erro na importação {importacao_id}: {e}")
+            _finalizar(importacao, status=StatusImportacao.ERRO, erro=str(e))
+        else:
+            dados = marcar_nota_lancada(importacao.user_id, dados)
+            if dados:
+                medicao_job.marcar(itens=len(dados.get("itens") or []))
+                dados["medicao"] = medicao_job.como_dict()
+            if not _finalizar(importacao, status=StatusImportacao.CONCLUIDA, url=url or "", resultado=serializar_dados(dados)):
+                logger.info(f"Importação {importacao_id} cancelada durante o processamento.")
+        finally:
+            _descartar_arquivo(importacao)
+            medicao_job.registrar_log(f"Importação {importacao_id} medida")
+
+
+def cancelar_importacao(importacao: ImportacaoNFe) -> bool:
+    """
+    Cancela um job ainda não finalizado.
+
+    Returns:
+        bool: True se o job foi cancelado.
+    """
+    cancelados = ImportacaoNFe.objects.filter(
+        pk=importacao.pk, status__in=[StatusImportacao.PENDENTE, StatusImportacao.PROCESSANDO]
+    ).update(status=StatusImportacao.CANCELADA, concluido_em=timezone.now(), atualizado_em=timezone.now())
+    return bool(cancelados)
+
+
+def criar_lote(user, arquivos: list) -> LoteImportacaoNFe:
+    """
+    Cria um lote de importação com um job por arquivo enviado.
+
+    Args:
+        user (User): Dono do lote.
+        arquivos (list[UploadedFile]): Imagens, PDFs e XMLs já validados (ZIPs expandidos).
+
+    Returns:
+        LoteImportacaoNFe: O lote criado.
+    """
+    lote = LoteImportacaoNFe.objects.create(user=user)
+    for arquivo in arquivos:
+        criar_importacao(user, arquivo, lote=lote)
+    lote.total_arquivos = lote.importacoes.count()
+    lote.save(update_fields=["total_arquivos"])
+    return lote
+
+
+def cancelar_lote(lote: LoteImportacaoNFe) -> int:
+    """
+    Cancela os jobs ainda não finalizados do lote.
+
+    Arquivos já enviados ao pool terminam, mas o resultado é descartado (`_finalizar`
+    só grava jobs em processamento); os que ainda não começaram não são executados.
+
+    Returns:
+        int: Quantidade de jobs cancelados.
+    """
+    agora = timezone.now()
+    cancelados = lote.importacoes.filter(
+        status__in=[StatusImportacao.PENDENTE, StatusImportacao.PROCESSANDO]
+    ).update(status=StatusImportacao.CANCELADA, concluido_em=agora, atualizado_em=agora)
+    LoteImportacaoNFe.objects.filter(pk=lote.pk, concluido_em__isnull=True).update(concluido_em=agora)
+    return cancelados
+
+
+def atualizar_lote_parado(lote: LoteImportacaoNFe) -> bool:
+    """
+    Encerra um lote cujo processamento foi interrompido (pool ou worker morto).
+
+    Expira os jobs parados (`expirar_importacoes_paradas`) e, se não sobrou job por
+    terminar, registra o fim do lote, que deixa de aparecer como em andamento.
+
+    Returns:
+        bool: True se o lote foi encerrado agora.
+    """
+    expirar_importacoes_paradas(lote.importacoes.all())
+    if lote.concluido_em or lote.importacoes.filter(
+        status__in=[StatusImportacao.PENDENTE, StatusImportacao.PROCESSANDO]
+    ).exists():
+        return False
+    lote.concluido_em = timezone.now()
+    LoteImportacaoNFe.objects.filter(pk=lote.pk, concluido_em__isnull=True).update(concluido_em=lote.concluido_em)
+    return True
+
+
+def executar_lote(lote_id: int):
+    """
+    Processa os jobs de um lote em paralelo no pool de processos.
+
+    Cada arquivo percorre o mesmo caminho de `processar_arquivo` (QR + SEFAZ, DANFE ou XML)
+    em um processo filho, que o lê de um caminho local (`uploads.caminho_em_disco`: o
+    próprio arquivo no `FileSystemStorage`, ou uma cópia temporária em storages remotos).
+    Os resultados são gravados à medida que ficam prontos e cada conclusão renova
+    `atualizado_em` dos jobs ainda na fila, para que não sejam dados como parados.
+    Se o lote for cancelado, os arquivos que ainda não começaram não são executados.
+    Ao final, registra a duração e a vazão do lote.
+
+    Args:
+        lote_id (int): ID do lote a ser processado.
+    """
+    from contextlib import ExitStack
+    from django.db import connections
+    from despesas.processamento_paralelo import (
+        descartar_pool,
+        obter_pool,
+        processar_arquivo_em_processo,
+    )
+
+    lote = LoteImportacaoNFe.objects.get(pk=lote_id)
+    LoteImportacaoNFe.objects.filter(pk=lote_id).update(iniciado_em=timezone.now())
+    pendentes = list(lote.importacoes.filter(status=StatusImportacao.PENDENTE))
+    ImportacaoNFe.objects.filter(pk__in=[i.pk for i in pendentes]).update(
+        status=StatusImportacao.PROCESSANDO, atualizado_em=timezone.now()
+    )
+    em_processamento = ImportacaoNFe.objects.filter(lote_id=lote_id, status=StatusImportacao.PROCESSANDO)
+
+    inicio = time.perf_counter()
+    with ExitStack() as pilha:
+        caminhos = {}
+        for imp in pendentes:
+            try:
+                arquivo = pilha.enter_context(imp.arquivo.open("rb"))
+                sufixo = os.path.splitext(imp.nome_arquivo)[1]
+                caminhos[imp.pk] = pilha.enter_context(caminho_em_disco(arquivo, sufixo=sufixo))
+            except Exception as e:
+                logger.error(f"Arquivo da importação {imp.pk} do lote {lote_id} indisponível: {e}")
+                _finalizar(imp, status=StatusImportacao.ERRO, erro=str(e))
+                _descartar_arquivo(imp)
+        connections.close_all()
+
+        pool = obter_pool()
+        futuros = {
+            pool.submit(processar_arquivo_em_processo, caminhos[imp.pk], imp.content_type, imp.nome_arquivo): imp
+            for imp in pendentes
+            if imp.pk in caminhos
+        }
+        for futuro in as_completed(futuros):
+            importacao = futuros[futuro]
+            try:
+                dados, url = futuro.result()
+            except CancelledError:
+                continue
+            except BrokenProcessPool as e:
+                descartar_pool()
+                logger.error(f"Pool de processos interrompido no lote {lote_id}: {e}")
+                _finalizar(importacao, status=StatusImportacao.ERRO, erro=str(e))
+            except Exception as e:
+                logger.error(f"Erro na importação {importacao.pk} do lote {lote_id}: {e}")
+                _finalizar(importacao, status=StatusImportacao.ERRO, erro=str(e))
+            else:
+                dados = marcar_nota_lancada(importacao.user_id, dados)
+                _finalizar(importacao, status=StatusImportacao.CONCLUIDA, url=url or "", resultado=dados)
+            finally:
+                _descartar_arquivo(importacao)
+            if not em_processamento.update(atualizado_em=timezone.now()):
+                # Lote cancelado (ou concluído): o que ainda não começou no pool não roda.
+                for pendente in futuros:
+                    pendente.cancel()
+
+    duracao = time.perf_counter() - inicio
+    LoteImportacaoNFe.objects.filter(pk=lote_id, concluido_em__isnull=True).update(concluido_em=timezone.now())
+    logger.info(
+        f"Lote {lote_id}: {len(pendentes)} arquivos em {duracao:.1f}s "
+        f"({len(pendentes) / duracao if duracao else 0:.2f} arquivos/s, {settings.NFE_PROCESSOS} processos)"
+    )
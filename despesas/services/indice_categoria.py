@@ -0,0 +1,181 @@
+import logging
+import re
+from datetime import date
+
+from django.db import transaction
+
+from despesas.models import CategoriaEmitente
+from despesas.services.categorizacao import normalizar_nome
+
+logger = logging.getLogger(__name__)
+
+TAMANHO_CHAVE = CategoriaEmitente._meta.get_field("chave").max_length
+
+
+def chaves_emitente(emitente_nome: str | None, emitente_cnpj: str | None) -> list[str]:
+    """
+    Monta as chaves do índice de um emitente, na ordem de consulta.
+
+    Args:
+        emitente_nome (str | None): Nome do emitente como gravado na despesa.
+        emitente_cnpj (str | None): CNPJ com ou sem máscara.
+
+    Returns:
+        list[str]: "cnpj:<dígitos>" (quando há 14 dígitos) seguido de "nome:<nome normalizado>".
+    """
+    chaves = []
+    digitos = re.sub(r"\D", "", emitente_cnpj or "")
+    if len(digitos) == 14:
+        chaves.append(f"cnpj:{digitos}")
+    nome = normalizar_nome(emitente_nome or "")
+    if nome:
+        chaves.append(f"nome:{nome}"[:TAMANHO_CHAVE])
+    return chaves
+
+
+# Sufixo que `criar_despesa` acrescenta às observações de cada mês de uma despesa fixa.
+_RE_RECORRENCIA = re.compile(r"\(Recorrência (\d+)/\d+\)\s*$")
+
+
+def conta_como_compra(parcela_atual: int | None, observacoes: str | None) -> bool:
+    """
+    Indica se o registro representa a compra no índice (um voto por compra).
+
+    Uma compra parcelada gera uma despesa por parcela e uma despesa fixa, uma por mês;
+    só a primeira parcela e a primeira recorrência contam, para que 12 parcelas não
+    pesem como 12 compras.
+
+    Args:
+        parcela_atual (int | None): Número da parcela do registro.
+        observacoes (str | None): Observações, com o sufixo "(Recorrência n/m)" das despesas fixas.
+
+    Returns:
+        bool: True se o registro deve entrar nas contagens.
+    """
+    if (parcela_atual or 1) > 1:
+        return False
+    recorrencia = _RE_RECORRENCIA.search(observacoes or "")
+    return not (recorrencia and int(recorrencia.group(1)) > 1)
+
+
+def _como_data(valor) -> date | None:
+    if isinstance(valor, str):
+        try:
+            return date.fromisoformat(valor[:10])
+        except ValueError:
+            return None
+    return valor
+
+
+def _aplicar(user_id: int, chave: str, categoria_id: int, data, delta: int):
+    """Soma `delta` à contagem da categoria na linha do índice e recalcula última/mais frequente."""
+    with transaction.atomic():
+        if delta > 0:
+            linha, _ = CategoriaEmitente.objects.select_for_update().get_or_create(user_id=user_id, chave=chave)
+        else:
+            linha = CategoriaEmitente.objects.select_for_update().filter(user_id=user_id, chave=chave).first()
+            if linha is None:
+                return
+
+        contagens = linha.contagens or {}
+        id_chave = str(categoria_id)
+        quantidade = contagens.get(id_chave, 0) + delta
+        if quantidade > 0:
+            contagens[id_chave] = quantidade
+        else:
+            contagens.pop(id_chave, None)
+
+        if not contagens:
+            linha.delete()
+            return
+
+        data = _como_data(data)
+        if delta > 0 and (linha.ultima_data is None or (data and data >= linha.ultima_data)):
+            linha.ultima_categoria_id = categoria_id
+            linha.ultima_data = data
+        _recalcular(linha, contagens)
+        linha.save()
+
+
+def _recalcular(linha: CategoriaEmitente, contagens: dict):
+    """Define a categoria mais frequente (empate favorece a última usada) e descarta a última se zerada."""
+    ultima = str(linha.ultima_categoria_id)
+    if ultima not in contagens:
+        linha.ultima_categoria_id = None
+    frequente = max(contagens, key=lambda c: (contagens[c], c == ultima)) if contagens else None
+    linha.categoria_frequente_id = int(frequente) if frequente else None
+    linha.contagens = contagens
+
+
+def registrar_despesa(user_id: int, categoria_id: int | None, emitente_nome: str | None, emitente_cnpj: str | None, data):
+    """
+    Conta uma despesa no índice do usuário (uma linha por chave do emitente).
+
+    Args:
+        user_id (int): Dono da despesa.
+        categoria_id (int | None): Categoria da despesa; sem categoria não há o que indexar.
+        emitente_nome (str | None): Nome do emitente.
+        emitente_cnpj (str | None): CNPJ do emitente.
+        data (date): Data da despesa, usada para decidir a última categoria.
+    """
+    if not categoria_id:
+        return
+    for chave in chaves_emitente(emitente_nome, emitente_cnpj):
+        _aplicar(user_id, chave, categoria_id, data, 1)
+
+
+def remover_despesa(user_id: int, categoria_id: int | None, emitente_nome: str | None, emitente_cnpj: str | None, data):
+    """Desfaz `registrar_despesa` para os mesmos valores (edição ou exclusão da despesa)."""
+    if not categoria_id:
+        return
+    for chave in chaves_emitente(emitente_nome, emitente_cnpj):
+        _aplicar(user_id, chave, categoria_id, data, -1)
+
+
+def remover_categoria(user_id: int, categoria_id: int):
+    """
+    Retira uma categoria excluída das contagens do usuário.
+
+    A exclusão da categoria anula o FK das despesas por UPDATE, sem signals de
+    `Despesa`, então as contagens são corrigidas aqui.
+    """
+    id_chave = str(categoria_id)
+    with transaction.atomic():
+        linhas = CategoriaEmitente.objects.select_for_update().filter(user_id=user_id, contagens__has_key=id_chave)
+        for linha in linhas:
+            contagens = linha.contagens
+            contagens.pop(id_chave, None)
+            if not contagens:
+                linha.delete()
+                continue
+            _recalcular(linha, contagens)
+            linha.save()
+
+
+def consultar_categoria(user, emitente_nome: str | None, emitente_cnpj: str | None = None) -> int | None:
+    """
+    Consulta a categoria de um emitente no índice do usuário com uma única busca indexada.
+
+    O CNPJ tem precedência sobre o nome normalizado. Devolve a última categoria usada
+    com o emitente ou, se ela foi excluída, a mais frequente.
+
+    Args:
+        user (User): Dono das despesas.
+        emitente_nome (str | None): Nome do emitente.
+        emitente_cnpj (str | None): CNPJ do emitente, com ou sem máscara.
+
+    Returns:
+        int | None: ID da categoria ou None se o emitente não está no índice.
+    """
+    chaves = chaves_emitente(emitente_nome, emitente_cnpj)
+    if not chaves:
+        return None
+    linhas = {
+        chave: ultima or frequente
+        for chave, ultima, frequente in CategoriaEmitente.objects.filter(user=user, chave__in=chaves)
+        .values_list("chave", "ultima_categoria_id", "categoria_frequente_id")
+    }
+    for chave in chaves:
+        if linhas.get(chave):
+            return linhas[chave]
+    return None
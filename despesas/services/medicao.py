@@ -0,0 +1,131 @@
+import logging
+import re
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+logger = logging.getLogger(__name__)
+
+_MEDICAO_ATUAL: ContextVar["MedicaoEtapas | None"] = ContextVar("medicao_nfe", default=None)
+
+# Nomes de métrica do Server-Timing são tokens HTTP: sem espaços, vírgulas ou ponto e vírgula.
+_RE_TOKEN_INVALIDO = re.compile(r"[^A-Za-z0-9!#$%&'*+.^_`|~-]")
+
+
+class MedicaoEtapas:
+    """
+    Tempos das etapas de uma importação (spans) e as marcações que os acompanham.
+
+    As etapas com o mesmo nome são somadas (ex.: várias renderizações do formulário).
+    As marcações (`origem`, `host`, `itens`) vão junto nos logs estruturados.
+    """
+
+    def __init__(self, **marcacoes):
+        self.inicio = time.perf_counter()
+        self.etapas: dict[str, float] = {}
+        self.marcacoes = {chave: valor for chave, valor in marcacoes.items() if valor is not None}
+
+    def adicionar(self, nome: str, duracao_ms: float):
+        self.etapas[nome] = self.etapas.get(nome, 0.0) + duracao_ms
+
+    def marcar(self, **marcacoes):
+        self.marcacoes.update({chave: valor for chave, valor in marcacoes.items() if valor is not None})
+
+    def total_ms(self) -> float:
+        return (time.perf_counter() - self.inicio) * 1000
+
+    def como_dict(self) -> dict:
+        """Etapas arredondadas e marcações em formato serializável (JSON ou `extra` do log)."""
+        return {
+            **self.marcacoes,
+            "etapas_ms": {nome: round(duracao, 1) for nome, duracao in self.etapas.items()},
+            "total_ms": round(self.total_ms(), 1),
+        }
+
+    def server_timing(self) -> str:
+        """
+        Valor do cabeçalho `Server-Timing` com uma métrica por etapa e o total.
+
+        Returns:
+            str: Ex.: `qr;dur=41.2, sefaz;dur=380.0;desc="www.sefaz.rs.gov.br", total;dur=450.3`.
+        """
+        host = self.marcacoes.get("host")
+        metricas = []
+        for nome, duracao in self.etapas.items():
+            metrica = f"{_RE_TOKEN_INVALIDO.sub('_', nome)};dur={duracao:.1f}"
+            if nome == "sefaz" and host:
+                metrica += f';desc="{host}"'
+            metricas.append(metrica)
+        descricao = " ".join(f"{chave}={valor}" for chave, valor in self.marcacoes.items() if chave != "host")
+        total = f"total;dur={self.total_ms():.1f}"
+        if descricao:
+            total += f';desc="{descricao.replace(chr(34), "")}"'
+        metricas.append(total)
+        return ", ".join(metricas)
+
+    def registrar_log(self, evento: str):
+        """Escreve uma linha de log com as etapas em `chave=valor` e os mesmos dados em `extra`."""
+        dados = self.como_dict()
+        campos = [f"{chave}={valor}" for chave, valor in self.marcacoes.items()]
+        campos += [f"{nome}={duracao}ms" for nome, duracao in dados["etapas_ms"].items()]
+        campos.append(f"total={dados['total_ms']}ms")
+        logger.info(f"{evento}: {' '.join(campos)}", extra={"medicao": dados})
+
+
+def medicao_atual() -> MedicaoEtapas | None:
+    """Medição ativa no contexto atual (requisição ou job), se houver."""
+    return _MEDICAO_ATUAL.get()
+
+
+@contextmanager
+def medir(**marcacoes):
+    """
+    Ativa uma nova medição no contexto atual e restaura a anterior ao sair.
+
+    Args:
+        **marcacoes: Marcações iniciais (ex.: `origem="qr"`).
+
+    Yields:
+        MedicaoEtapas: A medição ativa.
+    """
+    medicao = MedicaoEtapas(**marcacoes)
+    token = _MEDICAO_ATUAL.set(medicao)
+    try:
+        yield medicao
+    finally:
+        _MEDICAO_ATUAL.reset(token)
+
+
+@contextmanager
+def etapa(nome: str):
+    """
+    Mede a duração do bloco como a etapa `nome` da medição ativa.
+
+    Sem medição ativa (ex.: benchmark, shell), apenas executa o bloco.
+
+    Args:
+        nome (str): Nome da etapa (`qr`, `sefaz`, `html`, `pdf`, `xml`, `categoria`, `formulario`).
+    """
+    medicao = _MEDICAO_ATUAL.get()
+    if medicao is None:
+        yield
+        return
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        medicao.adicionar(nome, (time.perf_counter() - inicio) * 1000)
+
+
+def marcar(**marcacoes):
+    """Acrescenta marcações (`origem`, `host`, `itens`) à medição ativa, se houver."""
+    medicao = _MEDICAO_ATUAL.get()
+    if medicao is not None:
+        medicao.marcar(**marcacoes)
+
+
+def adicionar(nome: str, duracao_ms: float):
+    """Soma uma duração já medida à etapa `nome` da medição ativa, se houver."""
+    medicao = _MEDICAO_ATUAL.get()
+    if medicao is not None:
+        medicao.adicionar(nome, duracao_ms)
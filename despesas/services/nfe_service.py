@@ -1,17 +1,25 @@
 import re
-import requests
 import logging
+import mmap
+import time
+from concurrent.futures import ThreadPoolExecutor
 from bs4 import BeautifulSoup
 from dateutil import parser as dateparser
 from django.utils import timezone
-from io import BytesIO
 from urllib.parse import urlparse
 import socket
 import ipaddress
+from django.conf import settings
 
 
-from despesas.models import Categoria, Despesa
+from despesas.models import Categoria
 from despesas.enums.forma_pagamento_enum import FormaPagamento
+from despesas.services import cache_nfe, circuito_sefaz, medicao
+from despesas.services.categorizacao import sugerir_categoria
+from despesas.services.chave_acesso import extrair_chave_acesso, localizar_chave_acesso, validar_chave_acesso
+from despesas.services.indice_categoria import consultar_categoria
+from despesas.services.http_sefaz import obter_cliente
+from despesas.services import diretorio_emitentes
 
 logger = logging.getLogger(__name__)
 
@@ -28,17 +36,19 @@ class NFeService:
 
         Inicializa o modelo QReader na primeira chamada para otimizar o uso de recursos.
         Utiliza o modelo 'nano' para compatibilidade com ambientes de memória limitada.
+        Com `QR_DETECTOR_BACKEND` em `onnxruntime` ou `opencv`, usa o mesmo modelo
+        exportado para ONNX (`detector_qr.LeitorQRONNX`), sem importar o torch.
 
         Returns:
-             QReader: Instância do objeto QReader inicializada ou None em caso de erro.
+             QReader | LeitorQRONNX: Instância do leitor inicializada ou None em caso de erro.
         """
         global _INSTANCIA_QREADER
         if _INSTANCIA_QREADER is None:
             try:
-                from qreader import QReader
-                _INSTANCIA_QREADER = QReader(model_size='n') 
-            except ImportError:
-                 logger.error("Biblioteca QReader não instalada.")
+                from despesas.services.detector_qr import criar_leitor
+                _INSTANCIA_QREADER = criar_leitor()
+            except ImportError as e:
+                 logger.error(f"Backend do detector de QR ({settings.QR_DETECTOR_BACKEND}) não instalado: {e}")
                  return None
             except Exception as e:
                 logger.critical(f"Falha crítica ao carregar QReader: {e}")
@@ -82,47 +92,131 @@ class NFeService:
             logger.error(f"URL Validation error: {e}")
             return False
 
-    def decodificar_qr_code(self, img_bytes: bytes) -> str | None:
+    def decodificar_qr_code(self, img_bytes: bytes | mmap.mmap) -> str | None:
         """
         Decodifica o conteúdo de um QR Code presente em uma imagem.
 
-        Processa os bytes da imagem utilizando OpenCV para pré-processamento e
-        QReader para detecção e decodificação. Realiza redimensionamento e
-        tratamento de limiar para melhorar a taxa de sucesso.
+        Consulta primeiro o cache endereçado pelo hash do arquivo, de modo que reenvios
+        da mesma foto retornam sem nova decodificação. Quando `QR_WORKER_ENDERECO` está
+        configurado, delega a inferência ao processo dedicado (ver
+        `despesas.services.qr_worker`), evitando carregar o torch no worker web.
+        Se o worker estiver indisponível, processa localmente. Se ele não responder a
+        tempo, tenta só as camadas baratas (sem o QReader), pois o worker segue com a
+        mesma imagem e a cascata completa aqui duplicaria o trabalho e carregaria o torch.
 
         Args:
-            img_bytes (bytes): Conteúdo binário da imagem a ser processada.
+            img_bytes (bytes | mmap.mmap): Conteúdo binário da imagem (ou o arquivo
+                mapeado, ver `uploads.conteudo_mapeado`).
 
         Returns:
             str | None: String contendo o dado decodificado ou None se falhar.
         """
+        medicao.marcar(origem="qr")
+        with medicao.etapa("qr"):
+            hash_arquivo = cache_nfe.hash_conteudo(img_bytes)
+            encontrado, resultado = cache_nfe.obter_qr(hash_arquivo)
+            if encontrado:
+                logger.info(f"QR obtido do cache ({hash_arquivo[:12]})")
+                medicao.marcar(qr_cache=True)
+                return resultado
+
+            if getattr(settings, "QR_WORKER_ENDERECO", ""):
+                from despesas.services.qr_worker import TempoEsgotadoQRWorker, decodificar_remoto
+                try:
+                    atendido, resultado = decodificar_remoto(img_bytes)
+                except TempoEsgotadoQRWorker:
+                    if not getattr(settings, "QR_WORKER_FALLBACK_LOCAL", True):
+                        return None
+                    logger.warning("QR worker sem resposta. Tentando apenas as camadas baratas no processo web.")
+                    resultado = self.decodificar_qr_code_local(img_bytes, pular=("qreader",))
+                    # Sem resultado não há o que cachear: um novo envio pode ser atendido pelo worker.
+                    if resultado:
+                        cache_nfe.salvar_qr(hash_arquivo, resultado)
+                    return resultado
+                if not atendido:
+                    if not getattr(settings, "QR_WORKER_FALLBACK_LOCAL", True):
+                        return None
+                    logger.warning("QR worker indisponível. Decodificando no processo web.")
+                    resultado = self.decodificar_qr_code_local(img_bytes)
+            else:
+                resultado = self.decodificar_qr_code_local(img_bytes)
+
+            cache_nfe.salvar_qr(hash_arquivo, resultado)
+            return resultado
+
+    def decodificar_qr_codes(self, imagens: list[bytes]) -> list[str | None]:
+        """
+        Decodifica os QR Codes de várias imagens, retornando na ordem de entrada.
+
+        O cache é consultado em uma única ida (`get_many`) e imagens repetidas são
+        decodificadas uma vez. Localmente, o pré-processamento e as camadas baratas
+        rodam em paralelo (`QR_LOTE_THREADS`) e apenas as imagens que sobraram chegam
+        ao detector neural, em lotes (ver `CascataDecodificadores.decodificar_lote`).
+        Com `QR_WORKER_ENDERECO`, cada imagem é enviada ao worker de forma concorrente.
+
+        Args:
+            imagens (list[bytes]): Conteúdo binário de cada imagem.
+
+        Returns:
+            list[str | None]: Dado decodificado de cada imagem (None se falhar).
+        """
+        medicao.marcar(origem="qr", qr_lote=len(imagens))
+        with medicao.etapa("qr"):
+            hashes = [cache_nfe.hash_conteudo(img_bytes) for img_bytes in imagens]
+            conhecidos = cache_nfe.obter_qrs(hashes)
+            pendentes = {}
+            for img_bytes, hash_arquivo in zip(imagens, hashes):
+                if hash_arquivo not in conhecidos:
+                    pendentes.setdefault(hash_arquivo, img_bytes)
+            logger.info(f"Lote de QR: {len(imagens)} imagens, {len(imagens) - len(pendentes)} do cache ou repetidas")
+
+            if pendentes:
+                conteudos = list(pendentes.values())
+                threads = getattr(settings, "QR_LOTE_THREADS", 4)
+                if getattr(settings, "QR_WORKER_ENDERECO", ""):
+                    with ThreadPoolExecutor(max_workers=max(1, min(threads, len(conteudos)))) as pool:
+                        decodificados = list(pool.map(self.decodificar_qr_code, conteudos))
+                else:
+                    decodificados = self._decodificar_lote_local(conteudos, threads)
+                for hash_arquivo, resultado in zip(pendentes, decodificados):
+                    conhecidos[hash_arquivo] = resultado
+                    cache_nfe.salvar_qr(hash_arquivo, resultado)
+
+            return [conhecidos.get(hash_arquivo) for hash_arquivo in hashes]
+
+    def _decodificar_lote_local(self, conteudos: list[bytes], threads: int) -> list[str | None]:
         try:
-            if self.qreader is None:
-                logger.warning("QReader indisponível. Abortando decodificação.")
-                return None
+            from despesas.services.qr_cascata import carregar_imagem, obter_cascata
+            return obter_cascata().decodificar_lote(
+                conteudos,
+                carregar=lambda img_bytes: carregar_imagem(img_bytes, obter_qreader=lambda: self.qreader),
+                threads=threads,
+            )
+        except Exception as e:
+            logger.error(f"Error decoding QR batch: {e}")
+            return [None] * len(conteudos)
 
-            import numpy as np
-            import cv2
-            nparr = np.frombuffer(img_bytes, np.uint8)
-            imagem = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-            if imagem is None: return None
+    def decodificar_qr_code_local(self, img_bytes: bytes, pular: tuple[str, ...] = ()) -> str | None:
+        """
+        Decodifica o QR Code no próprio processo.
 
-            altura, largura = imagem.shape[:2]
-            largura_maxima = 1500
-            if largura > largura_maxima:
-                escala = largura_maxima / largura
-                nova_largura = int(largura * escala)
-                nova_altura = int(altura * escala)
-                imagem = cv2.resize(imagem, (nova_largura, nova_altura), interpolation=cv2.INTER_AREA)
+        Decodifica a imagem já em resolução reduzida (ver `qr_cascata.carregar_imagem`)
+        e a submete à cascata de decodificadores configurada em `QR_DECODIFICADORES`
+        (zbar, detector do OpenCV, variantes pré-processadas do recorte do QR tentadas em
+        paralelo e, por último, o QReader).
 
-            decodificado = self.qreader.detect_and_decode(image=imagem)
-            if decodificado and decodificado[0]: return decodificado[0]    
-            
-            cinza = cv2.cvtColor(imagem, cv2.COLOR_BGR2GRAY)
-            separacao = cv2.adaptiveThreshold(cinza, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 21, 11)
-            decodificado = self.qreader.detect_and_decode(image=separacao)
-            if decodificado and decodificado[0]: return decodificado[0]    
-            return None
+        Args:
+            img_bytes (bytes): Conteúdo binário da imagem a ser processada.
+            pular (tuple[str, ...]): Camadas da cascata a não executar (ex.: `("qreader",)`).
+
+        Returns:
+            str | None: String contendo o dado decodificado ou None se falhar.
+        """
+        try:
+            from despesas.services.qr_cascata import carregar_imagem, obter_cascata
+            imagem = carregar_imagem(img_bytes, obter_qreader=lambda: self.qreader)
+            if imagem is None: return None
+            return obter_cascata().decodificar(imagem, pular=pular)
         except Exception as e:
             logger.error(f"Error decoding QR: {e}")
             return None
@@ -210,59 +304,35 @@ class NFeService:
             return False
         return True
 
-    def identificar_categoria(self, user, emitente_nome: str) -> int | None:
+    def identificar_categoria(self, user, emitente_nome: str, emitente_cnpj: str | None = None) -> int | None:
         """
         Identifica a categoria provável da despesa baseada no nome do emitente.
 
-        Analisa o nome do estabelecimento comparando com uma lista de palavras-chave
-        pré-definidas para sugerir uma categoria existente no perfil do usuário.
+        Usa a categoria padrão do CNPJ no diretório global de emitentes ou, se o CNPJ
+        não está lá, o matcher de palavras-chave de `despesas.services.categorizacao`
+        para sugerir uma categoria existente no perfil do usuário; sem correspondência,
+        consulta o índice emitente -> categoria do usuário (`CategoriaEmitente`, por
+        CNPJ ou nome normalizado).
 
         Args:
             user (Usuario): O usuário para o qual a categoria será buscada.
             emitente_nome (str): Nome do estabelecimento ou emitente da nota.
+            emitente_cnpj (str | None): CNPJ do emitente, quando extraído da nota.
 
         Returns:
             int | None: ID da categoria identificada ou None se não houver correspondência.
         """
-        if not emitente_nome: return None
-        txt = emitente_nome.lower()
-        regras = {
-            "Mercado": ["supermercado", "mercado", "zaffari", "carrefour", "big", "nacional", "atacado", "bistek", "center shop", "dia%", "stock center", "comercial zaffari", "maxxi", "kan", "macromix", "assai", "makro", "atacadao", "extra", "pao de acucar", "mambo", "condor", "angeloni", "fort atacadista", "savegnago", "bahamas", "guanabara", "zona sul", "mundial", "sonda", "festval", "gimba", "tenda", "todo dia"],
-            "Farmácia": ["farmacia", "drogaria", "panvel", "são joão", "pague menos", "raia", "drogasil", "bifarma", "ultrafarma", "extrafarma", "farmacia popular", "pacheco", "drogasmil", "nissei", "farmasil", "paguemenos", "droga raia", "poupa tempo", "venancio"],
-            "Transporte": ["posto", "combustivel", "ipiranga", "shell", "petrobras", "uber", "99pop", "abastecimento", "ale", "br distribuidora", "esso", "texaco", "raizen", "99", "cabify", "estacionamento", "pedagio", "sem parar", "veloe", "conectcar", "pneu", "borracharia", "mecanica"],
-            "Alimentação": ["restaurante", "lancheria", "burger", "mcdonalds", "subway", "ifood", "bar", "padaria", "confeitaria", "pizzaria", "bobs", "burger king", "habib's", "giraffa", "spoleto", "pizza hut", "dominos", "outback", "china in box", "ragazzo", "vivenda", "madero", "giraffas", "rappi", "ze delivery", "lanchonete", "delivery", "sorveteria", "açai", "acai"],
-            "Vestuário": ["lojas renner", "riachuelo", "c&a", "zara", "cea", "marisa", "pompéia", "shein", "hering", "farm", "shoulder", "forum", "polo wear", "nike", "adidas", "centauro", "decathlon", "pernambucanas", "leader", "magazine luiza roupa", "netshoes", "mercado livre moda", "track&field", "reserva"],
-            "Casa": ["ferragem", "construção", "leroy", "cassol", "telhanorte", "eletrica", "comercial dalacorte", "leroy merlin", "dicico", "c&c", "obramax", "constrular", "sodimac", "tok stok", "etna", "camicado", "utilplast", "loja de moveis", "movida"],
-            "Eletrônicos": ["kabum", "pichau", "terabyte", "kalunga", "dell", "samsung", "apple", "magazine luiza", "casas bahia", "ponto frio", "fast shop", "americanas", "extra eletrônicos", "ricardo eletro", "carrefour eletrônicos", "mercado livre", "amazon", "submarino", "shoptime", "multilaser", "positivo", "lenovo", "lg", "motorola", "xiaomi"],
-            "Saúde": ["hospital", "clinica", "laboratorio", "consulta", "medico", "dentista", "odonto", "unimed", "hapvida", "amil", "sulamerica", "bradesco saude", "notredame", "intermedica", "lavoisier", "fleury", "delboni", "hermes pardini", "einstein", "sirio libanes"],
-            "Educação": ["escola", "faculdade", "curso", "universidade", "kumon", "wizard", "ccaa", "fisk", "cultura inglesa", "cel lep", "cursinho", "etec", "senac", "senai", "sesi", "udemy", "hotmart", "eduzz"],
-            "Lazer": ["cinema", "cinemark", "cinepolis", "uci", "kinoplex", "teatro", "show", "ingresso.com", "eventim", "sympla", "parque", "clube", "boliche", "brinquedoteca", "netflix", "spotify", "amazon prime", "disney+", "hbo", "globoplay"],
-            "Pet Shop": ["pet shop", "petz", "cobasi", "petlove", "petco", "agropecuaria", "veterinaria", "clinica veterinaria", "banho e tosa", "petiscos", "racao"],
-            "Serviços": ["salao", "barbearia", "estetica", "academia", "smartfit", "bluefit", "bio ritmo", "bodytech", "lavanderia", "lavagem", "costureira", "assistencia tecnica", "conserto", "reforma"],
-            "Seguros": ["seguro", "porto seguro", "liberty", "azul seguros", "allianz", "itau seguros", "bradesco seguros", "mapfre", "tokio marine", "hdi seguros"]
-        }
-        sugestao = None
-        for categoria_chave, keywords in regras.items():
-            for kw in keywords:
-                if kw in txt:
-                    sugestao = categoria_chave
-                    break
-            if sugestao: break
+        if not emitente_nome and not emitente_cnpj: return None
+        sugestao = diretorio_emitentes.categoria_padrao(emitente_cnpj) or sugerir_categoria(emitente_nome)
         if sugestao:
             cat = Categoria.objects.filter(user=user, nome__icontains=sugestao).first()
             if cat: return cat.pk
-            
+
         try:
-            ultima_despesa = Despesa.objects.filter(
-                user=user, 
-                emitente_nome__iexact=emitente_nome
-            ).order_by('-data').first()
-            
-            if ultima_despesa and ultima_despesa.categoria:
-                return ultima_despesa.categoria.pk
+            return consultar_categoria(user, emitente_nome, emitente_cnpj)
         except Exception as e:
             logger.warning(f"Erro ao buscar categoria no histórico: {e}")
-            
+
         return None
 
     def identificar_forma_pagamento(self, text: str) -> str | None:
@@ -289,178 +359,233 @@ class NFeService:
         """
         Extrai a lista de itens e produtos de um arquivo PDF (DANFE).
 
-        Utiliza a biblioteca pdfplumber para ler tabelas e textos do PDF,
-        identificando colunas relevantes como descrição, quantidade, valor unitário
-        e valor total.
-
         Args:
             pdf_file (file): Objeto de arquivo PDF aberto para leitura.
 
         Returns:
             list[dict]: Lista de dicionários representando os itens extraídos.
-        """        
-        pdf_bytes = pdf_file.read()
+        """
+        return self.processar_danfe_pdf(pdf_file)["itens"]
+
+    def _itens_de_tabelas(self, tables: list) -> list[dict]:
+        """
+        Extrai os itens das tabelas de uma página do DANFE.
+
+        Identifica a linha de cabeçalho pelas colunas de descrição e quantidade/valor
+        unitário e mapeia as colunas de descrição, quantidade, valor unitário e total.
+
+        Args:
+            tables (list): Tabelas retornadas por `page.extract_tables()`.
+
+        Returns:
+            list[dict]: Itens encontrados nas tabelas.
+        """
         itens: list[dict] = []
+        for table in tables:
+            header_idx = -1
+            col_map: dict[str, int] = {}
+            for i, row in enumerate(table):
+                row_str = [str(c).upper() for c in row if c]
+                has_qtd_or_unit = any("UNIT" in c or "QTD" in c for c in row_str)
+                has_desc = any("DESC" in c or "DESCR" in c for c in row_str)
+                if has_qtd_or_unit and has_desc:
+                    header_idx = i
+                    for idx, val in enumerate(row):
+                        v_up = str(val).upper() if val else ""
+                        if "DESC" in v_up or "DESCR" in v_up: col_map['desc'] = idx
+                        elif "QTD" in v_up: col_map['qtd'] = idx
+                        elif "UNIT" in v_up: col_map['unit'] = idx
+                        elif "TOTAL" in v_up: col_map['total'] = idx
+                    break
 
-        try:
-            import pdfplumber
-            with pdfplumber.open(BytesIO(pdf_bytes)) as pdf:
-                for page in pdf.pages:
-                    tables = page.extract_tables()
-                    for table in tables:
-                        header_idx = -1
-                        col_map: dict[str, int] = {}
-                        for i, row in enumerate(table):
-                            row_str = [str(c).upper() for c in row if c]
-                            has_qtd_or_unit = any("UNIT" in c or "QTD" in c for c in row_str)
-                            has_desc = any("DESC" in c or "DESCR" in c for c in row_str)
-                            if has_qtd_or_unit and has_desc:
-                                header_idx = i
-                                for idx, val in enumerate(row):
-                                    v_up = str(val).upper() if val else ""
-                                    if "DESC" in v_up or "DESCR" in v_up: col_map['desc'] = idx
-                                    elif "QTD" in v_up: col_map['qtd'] = idx
-                                    elif "UNIT" in v_up: col_map['unit'] = idx
-                                    elif "TOTAL" in v_up: col_map['total'] = idx
-                                break
-
-                        if header_idx != -1 and 'total' in col_map:
-                            for row in table[header_idx + 1:]:
-                                try:
-                                    if not row[col_map.get('total', 0)]: continue
-                                    desc_raw = row[col_map['desc']] if 'desc' in col_map else "Item"
-                                    
-                                    if len(str(desc_raw)) > 200: continue
-                                    
-                                    desc = self.limpar_descricao(str(desc_raw).replace('\n', ' '))
-                                    total = self.normalizar_float(row[col_map['total']])
-                                    if total <= 0: continue
-                                    qtd = self.normalizar_float(row[col_map['qtd']]) if 'qtd' in col_map else 1.0
-                                    unit = self.normalizar_float(row[col_map['unit']]) if 'unit' in col_map else total
-                                    if qtd == 0: qtd = 1.0
-                                    if unit == 0: unit = total / qtd
-                                    itens.append({"nome": desc, "qtd": qtd, "vl_unit": unit, "vl_total": total, "unidade": "UN"})
-                                except Exception: pass
-            
-            if not itens:
-                full_text = ""
-                import pdfplumber
-                with pdfplumber.open(BytesIO(pdf_bytes)) as pdf:
-                    for page in pdf.pages: full_text += "\n" + (page.extract_text() or "")
-                
-                m_start = re.search(r"DADOS DO[S]? PRODUTO[S]?", full_text, re.I)
-                if not m_start:
-                    return itens
-                search_area = full_text[m_start.end():]
-                m_end = re.search(
-                    r"(CÁLCULO DO ISSQN|DADOS ADICIONAIS|TRANSPORTADOR)",
-                    search_area,
-                    re.I
-                )
-
-                start = m_start.start()
-                end = m_start.end() + m_end.start() if m_end else len(full_text)
-
-                lines = [
-                    l.strip()
-                    for l in full_text[start:end].splitlines()
-                    if l.strip()
-                ]
-
-                buffer_desc: list[str] = []
-                pending_item: dict = {}
-                waiting_values = False
-
-                for line in lines:
-                    if re.search(r"DADOS DO\S* PRODUTO", line, re.I):
-                        continue
-                    if re.match(r"^(CÓDIGO|PRODUTO|NCM/SH|NCM|SH|CST|CFOP|UNID|QTD|VLR|VALOR|BC|ICMS|IPI|ALIQ)", line, re.I,):
-                        continue
-                    ncm_match = re.search(r"\b\d{8}\b", line.replace(".", ""))
-                    if ncm_match:
-                        prefix = line[:ncm_match.start()].strip()
-                        desc_parts = []
-                        if buffer_desc:
-                            desc_parts.append(" ".join(buffer_desc))
-                        if prefix:
-                            desc_parts.append(prefix)
-                        pending_item = {}
-                        if desc_parts:
-                            final_desc = self.limpar_descricao(" ".join(desc_parts))
-                            if len(final_desc) < 250:
-                                pending_item["nome"] = final_desc
-                        buffer_desc = []
-                        tail = line[ncm_match.end():]
-                        tokens = tail.split()
-                        numeric_tokens = []
-                        for t in tokens:
-                            if re.fullmatch(r"(UN|UNID\.?|PC|PÇ|PÇS|KG|G|UNIDADE)", t.upper()):
-                                numeric_tokens.append(("UNIT_MARK", t))
-                                continue
-                            v = self.normalizar_float(t)
-                            if v > 0:
-                                numeric_tokens.append(("NUM", v))
-
-                        qtd = unit = total = None
-                        try:
-                            idx_unit = next(
-                                i for i, (kind, _) in enumerate(numeric_tokens)
-                                if kind == "UNIT_MARK"
-                            )
-                            nums_after = [
-                                v for kind, v in numeric_tokens[idx_unit + 1:]
-                                if kind == "NUM"
-                            ]
-                            if nums_after:
-                                qtd = nums_after[0]
-                                if len(nums_after) >= 2:
-                                    unit = nums_after[1]
-                                if len(nums_after) >= 3:
-                                    total = nums_after[2]
-                        except StopIteration:
-                            nums_all = [v for kind, v in numeric_tokens if kind == "NUM"]
-                            if nums_all:
-                                total = nums_all[-1]
-                                if len(nums_all) >= 2:
-                                    unit = nums_all[-2]
-                                if len(nums_all) >= 3:
-                                    qtd = nums_all[-3]
-                        if total is None and unit is not None and qtd is not None:
-                            total = unit * qtd
-                        if total is not None and qtd is not None and unit is None and qtd:
-                            unit = total / qtd
-                        if qtd is None and total is not None and unit is not None and unit:
-                            qtd = total / unit
-                        if pending_item.get("nome") and total is not None:
-                            itens.append({
-                                "nome": pending_item["nome"],
-                                "qtd": float(qtd or 1.0),
-                                "vl_unit": float(unit or 0.0),
-                                "vl_total": float(total),
-                                "unidade": "UN"
-                            })
-                            pending_item = {}
-                            waiting_values = False
-                        else:
-                            waiting_values = True
-                    else:
-                        if waiting_values:
-                            continue
-                        if not re.match(r"^[\d\.,/\s-]+$", line):
-                            if len(line) < 150:
-                                buffer_desc.append(line)
+            if header_idx != -1 and 'total' in col_map:
+                for row in table[header_idx + 1:]:
+                    try:
+                        if not row[col_map.get('total', 0)]: continue
+                        desc_raw = row[col_map['desc']] if 'desc' in col_map else "Item"
+
+                        if len(str(desc_raw)) > 200: continue
+
+                        desc = self.limpar_descricao(str(desc_raw).replace('\n', ' '))
+                        total = self.normalizar_float(row[col_map['total']])
+                        if total <= 0: continue
+                        qtd = self.normalizar_float(row[col_map['qtd']]) if 'qtd' in col_map else 1.0
+                        unit = self.normalizar_float(row[col_map['unit']]) if 'unit' in col_map else total
+                        if qtd == 0: qtd = 1.0
+                        if unit == 0: unit = total / qtd
+                        itens.append({"nome": desc, "qtd": qtd, "vl_unit": unit, "vl_total": total, "unidade": "UN"})
+                    except Exception: pass
+        return itens
 
-        except Exception as e:
-            logger.error(f"PDF Parse Error: {e}")
+    def _itens_de_texto(self, full_text: str) -> list[dict]:
+        """
+        Extrai os itens do texto livre do DANFE quando o PDF não possui tabelas legíveis.
+
+        Localiza o bloco "DADOS DOS PRODUTOS" e usa o NCM (8 dígitos) de cada linha
+        como âncora para separar descrição, quantidade, valor unitário e total.
+
+        Args:
+            full_text (str): Texto completo do documento.
+
+        Returns:
+            list[dict]: Itens encontrados no texto.
+        """
+        itens: list[dict] = []
+        m_start = re.search(r"DADOS DO[S]? PRODUTO[S]?", full_text, re.I)
+        if not m_start:
+            return itens
+        search_area = full_text[m_start.end():]
+        m_end = re.search(
+            r"(CÁLCULO DO ISSQN|DADOS ADICIONAIS|TRANSPORTADOR)",
+            search_area,
+            re.I
+        )
+
+        start = m_start.start()
+        end = m_start.end() + m_end.start() if m_end else len(full_text)
+
+        lines = [
+            l.strip()
+            for l in full_text[start:end].splitlines()
+            if l.strip()
+        ]
+
+        buffer_desc: list[str] = []
+        pending_item: dict = {}
+        waiting_values = False
+
+        for line in lines:
+            if re.search(r"DADOS DO\S* PRODUTO", line, re.I):
+                continue
+            if re.match(r"^(CÓDIGO|PRODUTO|NCM/SH|NCM|SH|CST|CFOP|UNID|QTD|VLR|VALOR|BC|ICMS|IPI|ALIQ)", line, re.I,):
+                continue
+            ncm_match = re.search(r"\b\d{8}\b", line.replace(".", ""))
+            if ncm_match:
+                prefix = line[:ncm_match.start()].strip()
+                desc_parts = []
+                if buffer_desc:
+                    desc_parts.append(" ".join(buffer_desc))
+                if prefix:
+                    desc_parts.append(prefix)
+                pending_item = {}
+                if desc_parts:
+                    final_desc = self.limpar_descricao(" ".join(desc_parts))
+                    if len(final_desc) < 250:
+                        pending_item["nome"] = final_desc
+                buffer_desc = []
+                tail = line[ncm_match.end():]
+                tokens = tail.split()
+                numeric_tokens = []
+                for t in tokens:
+                    if re.fullmatch(r"(UN|UNID\.?|PC|PÇ|PÇS|KG|G|UNIDADE)", t.upper()):
+                        numeric_tokens.append(("UNIT_MARK", t))
+                        continue
+                    v = self.normalizar_float(t)
+                    if v > 0:
+                        numeric_tokens.append(("NUM", v))
+
+                qtd = unit = total = None
+                try:
+                    idx_unit = next(
+                        i for i, (kind, _) in enumerate(numeric_tokens)
+                        if kind == "UNIT_MARK"
+                    )
+                    nums_after = [
+                        v for kind, v in numeric_tokens[idx_unit + 1:]
+                        if kind == "NUM"
+                    ]
+                    if nums_after:
+                        qtd = nums_after[0]
+                        if len(nums_after) >= 2:
+                            unit = nums_after[1]
+                        if len(nums_after) >= 3:
+                            total = nums_after[2]
+                except StopIteration:
+                    nums_all = [v for kind, v in numeric_tokens if kind == "NUM"]
+                    if nums_all:
+                        total = nums_all[-1]
+                        if len(nums_all) >= 2:
+                            unit = nums_all[-2]
+                        if len(nums_all) >= 3:
+                            qtd = nums_all[-3]
+                if total is None and unit is not None and qtd is not None:
+                    total = unit * qtd
+                if total is not None and qtd is not None and unit is None and qtd:
+                    unit = total / qtd
+                if qtd is None and total is not None and unit is not None and unit:
+                    qtd = total / unit
+                if pending_item.get("nome") and total is not None:
+                    itens.append({
+                        "nome": pending_item["nome"],
+                        "qtd": float(qtd or 1.0),
+                        "vl_unit": float(unit or 0.0),
+                        "vl_total": float(total),
+                        "unidade": "UN"
+                    })
+                    pending_item = {}
+                    waiting_values = False
+                else:
+                    waiting_values = True
+            else:
+                if waiting_values:
+                    continue
+                if not re.match(r"^[\d\.,/\s-]+$", line):
+                    if len(line) < 150:
+                        buffer_desc.append(line)
 
         return itens
 
+    def _buscar_cabecalho_danfe(self, cabecalho: dict, texto: str):
+        """
+        Procura no texto de uma página os campos do cabeçalho ainda não encontrados.
+
+        Args:
+            cabecalho (dict): Campos já encontrados (None enquanto ausentes); atualizado no lugar.
+            texto (str): Texto da página.
+        """
+        if cabecalho["emitente"] is None:
+            m_emit = re.search(r"RECEBEMOS\s+DE\s+(.*?)\s+(OS\s+PRODUTOS|AS\s+MERCADORIAS|CONSTANTES)", texto, re.S | re.I)
+            if m_emit:
+                candidate = m_emit.group(1).strip().replace("\n", " ")
+                if len(candidate) < 100:
+                    cabecalho["emitente"] = candidate
+
+        if cabecalho["cnpj"] is None:
+            digits = re.sub(r'\D', '', texto)
+            for key in re.findall(r'(\d{44})', digits):
+                sub = key[6:20]
+                if self.validar_cnpj(sub):
+                    cabecalho["cnpj"] = f"{sub[:2]}.{sub[2:5]}.{sub[5:8]}/{sub[8:12]}-{sub[12:]}"
+                    break
+
+        if cabecalho["chave_acesso"] is None:
+            cabecalho["chave_acesso"] = localizar_chave_acesso(texto)
+
+        if cabecalho["data_emissao"] is None:
+            m_data = re.search(r"EMISS[ÃA]O.*?\s+(\d{2}/\d{2}/\d{4})", texto, re.I | re.S)
+            if m_data:
+                try: cabecalho["data_emissao"] = dateparser.parse(m_data.group(1), dayfirst=True).date()
+                except (ValueError, OverflowError): pass
+
+        if cabecalho["valor_total"] is None:
+            m_val = re.search(r"VALOR\s+TOTAL\s+DA\s+NOTA(.*)", texto, re.I | re.S)
+            if m_val:
+                for linha in m_val.group(1).splitlines():
+                    nums = re.findall(r"([\d\.]+,\d{2})", linha)
+                    if nums:
+                        cabecalho["valor_total"] = self.normalizar_float(nums[-1])
+                        break
+
     def processar_danfe_pdf(self, uploaded_file) -> dict:
         """
         Processa um arquivo PDF de DANFE para extrair informações da nota fiscal.
 
-        Coordena a extração de itens e metadados (emitente, CNPJ, data, totais)
-        analisando tanto a estrutura tabular quanto o texto livre do documento.
+        Abre o documento uma única vez e, para cada página, extrai tabelas e texto
+        juntos: as tabelas alimentam os itens e o texto alimenta a busca do cabeçalho
+        (emitente, CNPJ, data, total), que deixa de ser feita assim que todos os campos
+        são encontrados. O texto acumulado só é usado nos fallbacks (itens sem tabela,
+        emitente e CNPJ fora do padrão). Documentos a partir de `NFE_PDF_PAGINAS_PARALELO`
+        páginas têm as páginas divididas entre o pool de processos e juntadas em ordem.
 
         Args:
             uploaded_file (file): Arquivo PDF da nota fiscal enviado pelo usuário.
@@ -468,26 +593,102 @@ class NFeService:
         Returns:
             dict: Dicionário contendo os dados estruturados da nota fiscal.
         """
-        pdf_bytes = uploaded_file.read()    
-        uploaded_file.seek(0)
-        itens_estruturados = self.extrair_itens_pdf(uploaded_file)    
-        uploaded_file.seek(0)
-        full_text = ""
+        medicao.marcar(origem="pdf")
+        with medicao.etapa("pdf"):
+            return self.aplicar_diretorio_emitentes(self._extrair_danfe_pdf(uploaded_file))
+
+    def _ler_pagina_danfe(self, page) -> tuple[list[dict], str]:
+        """Itens das tabelas e texto de uma página do DANFE (liberando o cache da página)."""
+        itens = self._itens_de_tabelas(page.extract_tables())
+        texto = page.extract_text() or ""
+        page.close()
+        return itens, texto
+
+    def _paginas_em_paralelo(self, total_paginas: int) -> bool:
+        """
+        Indica se as páginas do DANFE devem ser divididas entre o pool de processos.
+
+        Só compensa acima de `NFE_PDF_PAGINAS_PARALELO` páginas (0 desliga) e com mais de
+        um processo; dentro de um processo do pool (importação em lote) a leitura segue
+        sequencial, já que o paralelismo está nos arquivos.
+        """
+        import multiprocessing
+        limite = getattr(settings, "NFE_PDF_PAGINAS_PARALELO", 0)
+        return (
+            bool(limite) and total_paginas >= limite
+            and settings.NFE_PROCESSOS > 1
+            and multiprocessing.parent_process() is None
+        )
+
+    def _ler_paginas_em_paralelo(self, caminho: str, total_paginas: int) -> list[tuple[list[dict], str]] | None:
+        """
+        Lê as páginas do DANFE em faixas contíguas, uma por processo do pool.
+
+        Cada processo reabre o PDF só com a sua faixa de páginas; os resultados voltam
+        na ordem das páginas. Falhas no pool devolvem None para a leitura sequencial.
+
+        Args:
+            caminho (str): Caminho do PDF em disco.
+            total_paginas (int): Número de páginas do documento.
+
+        Returns:
+            list[tuple[list[dict], str]] | None: Itens e texto de cada página, em ordem.
+        """
+        from concurrent.futures.process import BrokenProcessPool
+        from despesas.processamento_paralelo import descartar_pool, extrair_paginas_pdf_em_processo, obter_pool
+
+        tamanho = -(-total_paginas // settings.NFE_PROCESSOS)
+        faixas = [(inicio, min(inicio + tamanho, total_paginas)) for inicio in range(0, total_paginas, tamanho)]
+        try:
+            pool = obter_pool()
+            futuros = [pool.submit(extrair_paginas_pdf_em_processo, caminho, inicio, fim) for inicio, fim in faixas]
+            paginas = [pagina for futuro in futuros for pagina in futuro.result()]
+        except BrokenProcessPool as e:
+            descartar_pool()
+            logger.warning(f"Pool de processos interrompido na leitura do PDF; lendo em sequência: {e}")
+            return None
+        except Exception as e:
+            logger.warning(f"Falha na leitura paralela do PDF; lendo em sequência: {e}")
+            return None
+        medicao.marcar(pdf_processos=len(faixas))
+        logger.info(f"DANFE de {total_paginas} páginas lido em {len(faixas)} processos")
+        return paginas
+
+    def _extrair_danfe_pdf(self, uploaded_file) -> dict:
+        itens_estruturados: list[dict] = []
+        textos_paginas: list[str] = []
+        cabecalho = {"emitente": None, "cnpj": None, "chave_acesso": None, "data_emissao": None, "valor_total": None}
         try:
             import pdfplumber
-            with pdfplumber.open(BytesIO(pdf_bytes)) as pdf:
-                for page in pdf.pages: full_text += "\n" + (page.extract_text() or "")
-        except: pass    
-        
-        emitente = "Consumidor"
-        m_emit = re.search(r"RECEBEMOS\s+DE\s+(.*?)\s+(OS\s+PRODUTOS|AS\s+MERCADORIAS|CONSTANTES)", full_text, re.S | re.I)
-        if m_emit: 
-            candidate = m_emit.group(1).strip().replace("\n", " ")
-            if len(candidate) > 100:
-                candidate = candidate.split('\n')[0]            
-            if len(candidate) < 100:
-                emitente = candidate
-        
+            from despesas.uploads import caminho_em_disco, caminho_local
+            uploaded_file.seek(0)
+            # Em disco (upload temporário ou arquivo do job), o pdfminer lê direto do arquivo.
+            with pdfplumber.open(caminho_local(uploaded_file) or uploaded_file) as pdf:
+                total_paginas = len(pdf.pages)
+                medicao.marcar(pdf_paginas=total_paginas)
+                paginas = None
+                if self._paginas_em_paralelo(total_paginas):
+                    with caminho_em_disco(uploaded_file, ".pdf") as caminho:
+                        paginas = self._ler_paginas_em_paralelo(caminho, total_paginas)
+                if paginas is None:
+                    paginas = (self._ler_pagina_danfe(page) for page in pdf.pages)
+                # Páginas em ordem: o cabeçalho vem da primeira página que o contém (a 1ª).
+                for itens_pagina, texto_pagina in paginas:
+                    itens_estruturados.extend(itens_pagina)
+                    textos_paginas.append(texto_pagina)
+                    if any(valor is None for valor in cabecalho.values()):
+                        self._buscar_cabecalho_danfe(cabecalho, texto_pagina)
+        except Exception as e:
+            logger.error(f"PDF Parse Error: {e}")
+
+        full_text = "\n" + "\n".join(textos_paginas)
+        if not itens_estruturados:
+            try:
+                itens_estruturados = self._itens_de_texto(full_text)
+            except Exception as e:
+                logger.error(f"PDF Parse Error: {e}")
+
+        emitente = cabecalho["emitente"] or "Consumidor"
         if emitente == "Consumidor":
              for l in full_text.split('\n')[:25]:
                 if len(l) > 3 and len(l) < 100 and any(x in l.upper() for x in ["LTDA", "S.A.", "COMERCIO", "KABUM", "WEBSHOP", "EIRELI", "ME", "EPP"]):
@@ -495,48 +696,52 @@ class NFeService:
                     if clean_l:
                         emitente = clean_l
                         break
-        cnpj = None
-        digits = re.sub(r'\D', '', full_text)
-        keys = re.findall(r'(\d{44})', digits)
-        for key in keys:
-            sub = key[6:20]
-            if self.validar_cnpj(sub):
-                cnpj = f"{sub[:2]}.{sub[2:5]}.{sub[5:8]}/{sub[8:12]}-{sub[12:]}"; break
+        cnpj = cabecalho["cnpj"]
         if not cnpj:
             ms = re.findall(r"(\d{2}\.\d{3}\.\d{3}/\d{4}-\d{2})", full_text[:3000])
             for m in ms:
                 if self.validar_cnpj(m): cnpj = m; break
-        
-        data_emissao = timezone.localdate()
-        m_data = re.search(r"EMISS[ÃA]O.*?\s+(\d{2}/\d{2}/\d{4})", full_text, re.I | re.S)
-        if m_data:
-            try: data_emissao = dateparser.parse(m_data.group(1), dayfirst=True).date()
-            except: pass
 
-        valor_total_nota = 0.0
-        m_val = re.search(r"VALOR\s+TOTAL\s+DA\s+NOTA(.*)", full_text, re.I | re.S)
-        if m_val:
-            nums = re.findall(r"([\d\.]+,\d{2})", m_val.group(1))
-            if nums: valor_total_nota = self.normalizar_float(nums[-1])
-        elif itens_estruturados:
-            valor_total_nota = sum(i['vl_total'] for i in itens_estruturados)
+        valor_total_nota = cabecalho["valor_total"]
+        if valor_total_nota is None:
+            valor_total_nota = sum(i['vl_total'] for i in itens_estruturados) if itens_estruturados else 0.0
         return {
             "emitente": emitente,
             "cnpj": cnpj,
-            "data_emissao": data_emissao,
+            "data_emissao": cabecalho["data_emissao"] or timezone.localdate(),
             "valor_total": valor_total_nota,
             "desconto": 0.0,
             "forma_pagamento_key": '',
             "parcelas": 1,
             "itens": itens_estruturados,
+            "chave_acesso": cabecalho["chave_acesso"],
         }
 
+    def processar_nfe_xml(self, arquivo) -> dict:
+        """
+        Processa o XML autorizado da NF-e (procNFe), com itens, totais e pagamentos exatos.
+
+        Args:
+            arquivo (file): Arquivo XML aberto em modo binário.
+
+        Returns:
+            dict: Dicionário no mesmo formato de `processar_danfe_pdf`.
+        """
+        from despesas.services import nfe_xml
+        medicao.marcar(origem="xml")
+        with medicao.etapa("xml"):
+            return self.aplicar_diretorio_emitentes(nfe_xml.extrair_dados(arquivo, self))
+
     def extrair_dados_url(self, url: str) -> dict:
         """
         Extrai dados de uma Nota Fiscal a partir da URL (Web Scraping).
 
         Realiza uma requisição HTTP segura para a URL fornecida e processa o HTML
-        retornado para capturar dados da nota, emitente e itens.
+        retornado para capturar dados da nota, emitente e itens. O resultado é
+        armazenado em cache pela chave de acesso contida na URL, de modo que
+        reimportações da mesma nota não acessam a SEFAZ novamente. Com o circuito
+        do host aberto (`circuito_sefaz`), retorna vazio sem fazer a requisição e a
+        importação segue com o rascunho para preenchimento manual.
 
         Args:
             url (str): URL pública da nota fiscal (QRCode).
@@ -548,17 +753,102 @@ class NFeService:
              logger.warning(f"Invalid URL rejected: {url}")
              return {}
 
-        headers = {"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) Chrome/120.0"}
+        chave_acesso = extrair_chave_acesso(url)
+        chave_valida = chave_acesso if validar_chave_acesso(chave_acesso) else None
+        if chave_acesso:
+            dados_cache = cache_nfe.obter_nota(chave_acesso)
+            if dados_cache:
+                logger.info(f"Nota {chave_acesso} obtida do cache.")
+                medicao.marcar(sefaz_cache=True)
+                dados_cache.setdefault("chave_acesso", chave_valida)
+                return dados_cache
+
+        host = urlparse(url).hostname or ""
+        medicao.marcar(host=host)
+        if not circuito_sefaz.permitir(host):
+            logger.warning(f"Circuito aberto para {host}; consulta à SEFAZ dispensada.")
+            return {}
+
+        inicio = time.perf_counter()
         try:
             logger.info(f"Fetching URL: {url}")
-            resp = requests.get(url, headers=headers, timeout=20)
+            with medicao.etapa("sefaz"):
+                resp = obter_cliente().get(url)
             logger.info(f"Response Status: {resp.status_code}")
             resp.raise_for_status()
         except Exception as e:
             logger.error(f"Request failed: {e}")
+            resposta = getattr(e, "response", None)
+            circuito_sefaz.registrar(host, resposta is not None and resposta.status_code < 500, time.perf_counter() - inicio)
             return {}
-            
-        soup = BeautifulSoup(resp.text, "html.parser")
+        circuito_sefaz.registrar(host, True, time.perf_counter() - inicio)
+
+        with medicao.etapa("html"):
+            dados = self.extrair_dados_html(resp.text, host)
+        dados = self.aplicar_diretorio_emitentes(dados, url)
+        dados["chave_acesso"] = chave_valida
+        if chave_acesso and (dados["itens"] or dados["valor_total"]):
+            cache_nfe.salvar_nota(chave_acesso, dados)
+        return dados
+
+    def aplicar_diretorio_emitentes(self, dados: dict, url: str | None = None) -> dict:
+        """
+        Cruza os dados extraídos com o diretório global de emitentes por CNPJ.
+
+        Quando o parser não encontrou o nome do emitente, usa o nome já conhecido do
+        CNPJ. Só dados obtidos da própria SEFAZ (com `url`) atualizam o diretório (nome,
+        host, contagem): o diretório é compartilhado por todos os usuários, e PDFs e XMLs
+        enviados não são verificados, então apenas o consultam. Falhas no diretório não
+        interrompem a importação.
+
+        Args:
+            dados (dict): Dados extraídos da nota.
+            url (str | None): URL da consulta na SEFAZ; None para arquivos enviados.
+
+        Returns:
+            dict: Os mesmos dados, com o emitente completado pelo diretório.
+        """
+        if not dados or not dados.get("cnpj"):
+            return dados
+        try:
+            if dados.get("emitente") in (None, "", diretorio_emitentes.NOME_GENERICO):
+                emitente = diretorio_emitentes.consultar(dados["cnpj"])
+                if emitente and emitente.nome:
+                    dados["emitente"] = emitente.nome
+            if url:
+                diretorio_emitentes.registrar(dados, url)
+        except Exception as e:
+            logger.warning(f"Diretório de emitentes indisponível: {e}")
+        return dados
+
+    def extrair_dados_html(self, html: str, host: str | None = None) -> dict:
+        """
+        Processa o HTML da página de consulta da NFC-e.
+
+        Usa o extrator baseado em lxml (`sefaz_html`) e recorre ao BeautifulSoup quando
+        ele falha ou não encontra a nota (ver `parsers_sefaz`).
+
+        Args:
+            html (str): Conteúdo da página retornada pela SEFAZ.
+            host (str | None): Hostname da consulta, usado nas métricas por host.
+
+        Returns:
+            dict: Dicionário com emitente, CNPJ, data, totais, pagamento e itens.
+        """
+        from despesas.services import parsers_sefaz
+        return parsers_sefaz.extrair(html, self, host)
+
+    def extrair_dados_html_bs4(self, html: str) -> dict:
+        """
+        Processa o HTML da página de consulta da NFC-e com o BeautifulSoup (`html.parser`).
+
+        Args:
+            html (str): Conteúdo da página retornada pela SEFAZ.
+
+        Returns:
+            dict: Dicionário com emitente, CNPJ, data, totais, pagamento e itens.
+        """
+        soup = BeautifulSoup(html, "html.parser")
         logger.info("BS4 parsing successful. Extracting fields...")
         
         emitente = "Consumidor"
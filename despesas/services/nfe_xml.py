@@ -0,0 +1,179 @@
+import logging
+import re
+import xml.etree.ElementTree as ET
+from datetime import date
+
+from django.utils import timezone
+
+from despesas.enums.forma_pagamento_enum import FormaPagamento
+from despesas.services.chave_acesso import validar_chave_acesso
+
+logger = logging.getLogger(__name__)
+
+TIPOS_XML = {"application/xml", "text/xml"}
+
+# Códigos do campo tPag (grupo detPag) do leiaute da NF-e.
+FORMAS_PAGAMENTO_TPAG = {
+    "01": FormaPagamento.DINHEIRO,
+    "03": FormaPagamento.CREDITO,
+    "04": FormaPagamento.DEBITO,
+    "10": FormaPagamento.VALE_ALIMENTACAO,
+    "11": FormaPagamento.VALE_REFEICAO,
+    "15": FormaPagamento.BOLETO,
+    "17": FormaPagamento.PIX,
+    "20": FormaPagamento.PIX,
+}
+SEM_PAGAMENTO = "90"
+
+# Grupos processados e descartados assim que o parser fecha a tag, mantendo a memória constante.
+GRUPOS = {"ide", "emit", "det", "ICMSTot", "detPag", "dup", "Signature", "protNFe"}
+
+# O atributo Id do infNFe vem no início do documento, antes dos itens.
+_RE_ID_NFE = re.compile(rb'Id\s*=\s*["\']NFe(\d{44})["\']')
+TAMANHO_CABECALHO = 64 * 1024
+
+
+def eh_xml(content_type: str, nome: str) -> bool:
+    return (content_type or "").lower() in TIPOS_XML or (nome or "").lower().endswith(".xml")
+
+
+def ler_chave_acesso(arquivo) -> str | None:
+    """
+    Lê a chave de acesso do atributo Id do infNFe sem fazer o parsing do XML.
+
+    Examina apenas o início do arquivo e o devolve posicionado no começo.
+
+    Args:
+        arquivo (file): Arquivo XML aberto em modo binário.
+
+    Returns:
+        str | None: Chave com dígito verificador válido ou None.
+    """
+    arquivo.seek(0)
+    inicio = arquivo.read(TAMANHO_CABECALHO)
+    arquivo.seek(0)
+    m = _RE_ID_NFE.search(inicio if isinstance(inicio, bytes) else inicio.encode())
+    chave = m.group(1).decode() if m else None
+    return chave if validar_chave_acesso(chave) else None
+
+
+def _local(tag: str) -> str:
+    return tag.rsplit("}", 1)[-1]
+
+
+def _texto(elemento, caminho: str) -> str | None:
+    """Lê o texto de um descendente informado sem namespace (ex.: "prod/xProd")."""
+    ns = elemento.tag[: elemento.tag.index("}") + 1] if elemento.tag.startswith("{") else ""
+    return elemento.findtext("/".join(f"{ns}{parte}" for parte in caminho.split("/")))
+
+
+def _float(valor: str | None) -> float:
+    try:
+        return float(valor) if valor else 0.0
+    except ValueError:
+        return 0.0
+
+
+def extrair_dados(arquivo, service) -> dict:
+    """
+    Extrai os dados de uma NF-e autorizada (procNFe ou NFe) a partir do XML.
+
+    Lê o documento em streaming com `iterparse`: cada grupo de interesse (ide, emit,
+    det, ICMSTot, detPag, dup) é processado ao fechar a tag e removido da árvore,
+    de modo que notas com milhares de itens usam memória constante.
+
+    Args:
+        arquivo (file): Arquivo XML aberto em modo binário.
+        service (NFeService): Serviço usado na validação do CNPJ.
+
+    Returns:
+        dict: Mesmo formato de `NFeService.processar_danfe_pdf`, acrescido de
+        `valor_tributos` (vTotTrib).
+
+    Raises:
+        ValueError: Se o XML não contém uma NF-e.
+        xml.etree.ElementTree.ParseError: Se o XML é inválido.
+    """
+    dados = {
+        "emitente": "Consumidor",
+        "cnpj": None,
+        "data_emissao": None,
+        "valor_total": 0.0,
+        "desconto": 0.0,
+        "forma_pagamento_key": "",
+        "parcelas": 1,
+        "itens": [],
+        "valor_tributos": 0.0,
+        "chave_acesso": None,
+    }
+    pagamentos: list[str] = []
+    duplicatas = 0
+    encontrou_nfe = False
+    pilha = []
+
+    if hasattr(arquivo, "seek"):
+        arquivo.seek(0)
+    for evento, elemento in ET.iterparse(arquivo, events=("start", "end")):
+        if evento == "start":
+            if _local(elemento.tag) == "infNFe":
+                encontrou_nfe = True
+                chave = (elemento.get("Id") or "")[3:]
+                if validar_chave_acesso(chave):
+                    dados["chave_acesso"] = chave
+            pilha.append(elemento)
+            continue
+
+        pilha.pop()
+        nome = _local(elemento.tag)
+        if nome not in GRUPOS:
+            continue
+
+        if nome == "ide":
+            emissao = _texto(elemento, "dhEmi") or _texto(elemento, "dEmi")
+            if emissao:
+                try:
+                    dados["data_emissao"] = date.fromisoformat(emissao[:10])
+                except ValueError:
+                    pass
+        elif nome == "emit" and pilha and _local(pilha[-1].tag) == "infNFe":
+            dados["emitente"] = (_texto(elemento, "xNome") or dados["emitente"]).strip()
+            cnpj = _texto(elemento, "CNPJ") or ""
+            if len(cnpj) == 14 and service.validar_cnpj(cnpj):
+                dados["cnpj"] = f"{cnpj[:2]}.{cnpj[2:5]}.{cnpj[5:8]}/{cnpj[8:12]}-{cnpj[12:]}"
+        elif nome == "det":
+            qtd = _float(_texto(elemento, "prod/qCom")) or 1.0
+            vl_total = _float(_texto(elemento, "prod/vProd"))
+            dados["itens"].append({
+                "nome": (_texto(elemento, "prod/xProd") or "Item").strip(),
+                "qtd": qtd,
+                "unidade": (_texto(elemento, "prod/uCom") or "UN").strip().upper(),
+                "vl_unit": _float(_texto(elemento, "prod/vUnCom")) or vl_total / qtd,
+                "vl_total": vl_total,
+            })
+        elif nome == "ICMSTot":
+            dados["valor_total"] = _float(_texto(elemento, "vNF"))
+            dados["desconto"] = _float(_texto(elemento, "vDesc"))
+            dados["valor_tributos"] = _float(_texto(elemento, "vTotTrib"))
+        elif nome == "detPag":
+            tpag = (_texto(elemento, "tPag") or "").strip()
+            if tpag and tpag != SEM_PAGAMENTO:
+                pagamentos.append(tpag)
+        elif nome == "dup":
+            duplicatas += 1
+
+        elemento.clear()
+        if pilha:
+            pilha[-1].remove(elemento)
+
+    if not encontrou_nfe:
+        raise ValueError("O XML enviado não é uma NF-e.")
+
+    if pagamentos:
+        dados["forma_pagamento_key"] = FORMAS_PAGAMENTO_TPAG.get(pagamentos[0], FormaPagamento.OUTROS)
+    dados["parcelas"] = duplicatas or len(pagamentos) or 1
+    dados["data_emissao"] = dados["data_emissao"] or timezone.localdate()
+    if not dados["valor_total"] and dados["itens"]:
+        dados["valor_total"] = sum(i["vl_total"] for i in dados["itens"])
+
+    logger.info(f"NF-e XML extraída: {dados['emitente']}, {len(dados['itens'])} itens.")
+    return dados
@@ -0,0 +1,183 @@
+import atexit
+import logging
+import threading
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Callable
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Os portais estaduais conhecidos servem o mesmo layout da consulta da NFC-e, então não há
+# despacho por host: a página passa pelo extrator lxml (`sefaz_html`) e, se ele falhar, pelo
+# genérico. As métricas por (host, parser) mostram quais hosts caem no genérico.
+
+
+@dataclass(frozen=True)
+class ParserSefaz:
+    """
+    Extrator de página de consulta da NFC-e.
+
+    Attributes:
+        nome (str): Identificador usado nos logs e nas métricas.
+        extrair (Callable): Função `(html, service) -> dict` no formato de `NFeService.extrair_dados_html`.
+    """
+    nome: str
+    extrair: Callable
+
+
+def _extrair_portal_nfce(html: str, service) -> dict:
+    from despesas.services import sefaz_html
+    return sefaz_html.extrair_dados(html, service)
+
+
+def _extrair_generico(html: str, service) -> dict:
+    return service.extrair_dados_html_bs4(html)
+
+
+# Layout do portal da NFC-e (div.txtTopo, #tabResult, #totalNota) com XPaths pré-compilados.
+PORTAL_NFCE = ParserSefaz(nome="portal_nfce", extrair=_extrair_portal_nfce)
+
+# Último recurso: BeautifulSoup com busca textual na página inteira.
+GENERICO = ParserSefaz(nome="generico", extrair=_extrair_generico)
+
+CANDIDATOS = (PORTAL_NFCE, GENERICO)
+
+# Contadores do processo ainda não gravados: (host, parser) -> [chamadas, sucessos, tempo_us].
+_LOCK = threading.Lock()
+_PENDENTES: dict[tuple[str, str], list[int]] = defaultdict(lambda: [0, 0, 0])
+_ultima_descarga = time.monotonic()
+
+
+def _registrar_metrica(host: str, parser: str, sucesso: bool, duracao: float):
+    """Soma a tentativa aos contadores do processo e os descarrega no banco a cada intervalo."""
+    global _ultima_descarga
+    logger.debug(f"Parser SEFAZ host={host} parser={parser} sucesso={sucesso} duracao={duracao * 1000:.1f}ms")
+    with _LOCK:
+        contadores = _PENDENTES[(host, parser)]
+        contadores[0] += 1
+        contadores[1] += int(sucesso)
+        contadores[2] += int(duracao * 1_000_000)
+        descarregar = time.monotonic() - _ultima_descarga >= settings.NFE_PARSER_METRICAS_INTERVALO
+    if descarregar:
+        descarregar_metricas()
+
+
+def descarregar_metricas(ao_sair: bool = False):
+    """
+    Grava no banco os contadores acumulados pelo processo.
+
+    Cada par (host, parser) vira um único UPDATE com `F()`, atômico entre os workers;
+    a linha é criada na primeira vez. Em caso de erro, os contadores voltam para a fila.
+
+    Args:
+        ao_sair (bool): Descarga final do processo (`atexit`); uma falha apenas descarta os contadores.
+    """
+    global _ultima_descarga
+    from django.db import IntegrityError, transaction
+    from django.db.models import F
+    from despesas.models import MetricaParserSefaz
+
+    with _LOCK:
+        pendentes = dict(_PENDENTES)
+        _PENDENTES.clear()
+        _ultima_descarga = time.monotonic()
+    if not pendentes:
+        return
+
+    try:
+        for (host, parser), (chamadas, sucessos, tempo_us) in pendentes.items():
+            campos = {
+                "chamadas": F("chamadas") + chamadas,
+                "sucessos": F("sucessos") + sucessos,
+                "tempo_us": F("tempo_us") + tempo_us,
+            }
+            if MetricaParserSefaz.objects.filter(host=host, parser=parser).update(**campos):
+                continue
+            try:
+                with transaction.atomic():
+                    MetricaParserSefaz.objects.create(
+                        host=host, parser=parser, chamadas=chamadas, sucessos=sucessos, tempo_us=tempo_us
+                    )
+            except IntegrityError:
+                MetricaParserSefaz.objects.filter(host=host, parser=parser).update(**campos)
+    except Exception as e:
+        if ao_sair:
+            logger.debug(f"Métricas dos parsers SEFAZ descartadas ao encerrar: {e}")
+            return
+        logger.warning(f"Falha ao gravar métricas dos parsers SEFAZ: {e}")
+        with _LOCK:
+            for chave, valores in pendentes.items():
+                contadores = _PENDENTES[chave]
+                for i, valor in enumerate(valores):
+                    contadores[i] += valor
+
+
+atexit.register(descarregar_metricas, ao_sair=True)
+
+
+def extrair(html: str, service, host: str | None = None) -> dict:
+    """
+    Extrai os dados da página com o extrator lxml e recorre ao genérico se ele falhar.
+
+    Uma exceção ou um resultado sem itens e sem valor total contam como falha do parser
+    e passam para o próximo candidato; o resultado do genérico é retornado de qualquer forma.
+
+    Args:
+        html (str): Conteúdo da página retornada pela SEFAZ.
+        service (NFeService): Serviço que fornece normalização e validações.
+        host (str | None): Hostname da consulta, usado nas métricas.
+
+    Returns:
+        dict: Mesmo formato de `NFeService.extrair_dados_html`.
+    """
+    host_metrica = (host or "desconhecido").lower()
+    for parser in CANDIDATOS:
+        inicio = time.perf_counter()
+        try:
+            dados = parser.extrair(html, service)
+        except ImportError as e:
+            logger.warning(f"Parser SEFAZ {parser.nome} indisponível ({e}).")
+            dados, erro = None, True
+        except Exception as e:
+            if parser is GENERICO:
+                raise
+            logger.warning(f"Falha no parser SEFAZ {parser.nome} para {host or 'host desconhecido'}: {e}")
+            dados, erro = None, True
+        else:
+            erro = False
+        sucesso = not erro and bool(dados.get("itens") or dados.get("valor_total"))
+        _registrar_metrica(host_metrica, parser.nome, sucesso, time.perf_counter() - inicio)
+        if sucesso or parser is GENERICO:
+            return dados
+        if not erro:
+            logger.warning(f"Parser SEFAZ {parser.nome} não encontrou itens nem total em {host or 'host desconhecido'}.")
+    return {}
+
+
+def metricas() -> dict:
+    """
+    Taxa de sucesso e tempo médio de cada parser em cada host, somando todos os workers.
+
+    Descarrega antes os contadores do próprio processo; os dos demais entram na próxima
+    descarga deles (a cada `NFE_PARSER_METRICAS_INTERVALO` segundos).
+
+    Returns:
+        dict: `{host: {parser: {...}}}` com chamadas, sucessos, falhas, taxa de sucesso
+        e tempo médio em milissegundos.
+    """
+    from despesas.models import MetricaParserSefaz
+
+    descarregar_metricas()
+    resultado: dict[str, dict] = {}
+    for m in MetricaParserSefaz.objects.all():
+        resultado.setdefault(m.host, {})[m.parser] = {
+            "chamadas": m.chamadas,
+            "sucessos": m.sucessos,
+            "falhas": m.chamadas - m.sucessos,
+            "taxa_sucesso": round(m.sucessos / m.chamadas, 2) if m.chamadas else 0.0,
+            "tempo_medio_ms": round(m.tempo_us / 1000 / m.chamadas, 1) if m.chamadas else 0.0,
+        }
+    return resultado
@@ -0,0 +1,612 @@
+import logging
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from django.conf import settings
+
+from despesas.services import medicao
+
+logger = logging.getLogger(__name__)
+
+CAMADAS_PADRAO = ["zbar", "opencv", "limiar", "qreader"]
+VARIANTES_PADRAO = ["limiar", "clahe", "nitidez", "ampliacao", "inversao", "rotacao"]
+LARGURA_MAXIMA = 1000
+MARGEM_RECORTE = 0.15
+
+
+class ImagemQR:
+    """
+    Imagem em processamento pela cascata, com derivações calculadas sob demanda.
+
+    Evita que cada camada refaça a conversão para tons de cinza ou o recorte.
+    Guarda a região do QR Code informada pelo detector para que as novas tentativas
+    (variantes pré-processadas, QReader) trabalhem apenas no recorte. Quando a imagem de trabalho
+    foi reduzida, o recorte é lido do original em resolução plena.
+
+    Args:
+        imagem (np.ndarray): Imagem de trabalho (BGR ou tons de cinza).
+        obter_qreader (callable, optional): Retorna a instância do QReader.
+        escala (float): Pixels do original por pixel da imagem de trabalho.
+        carregar_original (callable, optional): Decodifica o original em tons de cinza.
+    """
+
+    def __init__(self, imagem, obter_qreader=None, escala: float = 1.0, carregar_original=None):
+        self.imagem = imagem
+        self.obter_qreader = obter_qreader
+        self.escala = escala
+        self.carregar_original = carregar_original
+        self.regiao = None
+        self._localizada = False
+        self._cinza = None
+        self._recorte = None
+
+    @property
+    def cinza(self):
+        if self._cinza is None:
+            import cv2
+            if self.imagem.ndim == 2:
+                self._cinza = self.imagem
+            else:
+                self._cinza = cv2.cvtColor(self.imagem, cv2.COLOR_BGR2GRAY)
+        return self._cinza
+
+    def registrar_regiao(self, pontos):
+        """Registra os vértices devolvidos pelo detector (None se o QR não foi localizado)."""
+        import numpy as np
+        self._localizada = True
+        if pontos is None:
+            return
+        pontos = np.asarray(pontos).reshape(-1, 2)
+        x0, y0 = pontos.min(axis=0)
+        x1, y1 = pontos.max(axis=0)
+        if x1 - x0 >= 8 and y1 - y0 >= 8:
+            self.regiao = (float(x0), float(y0), float(x1), float(y1))
+
+    def localizar(self):
+        """Retorna a região do QR, executando o detector do OpenCV se nenhuma camada o fez."""
+        if not self._localizada:
+            import cv2
+            encontrado, pontos = cv2.QRCodeDetector().detect(self.cinza)
+            self.registrar_regiao(pontos if encontrado else None)
+        return self.regiao
+
+    @property
+    def recorte(self):
+        """Região do QR com margem, em tons de cinza; a imagem inteira se o QR não foi localizado."""
+        if self._recorte is None:
+            regiao = self.localizar()
+            if regiao is None:
+                self._recorte = self.cinza
+            else:
+                fonte, escala = self.cinza, 1.0
+                if self.carregar_original is not None and self.escala > 1:
+                    original = self.carregar_original()
+                    if original is not None:
+                        fonte, escala = original, self.escala
+                x0, y0, x1, y1 = regiao
+                margem = MARGEM_RECORTE * max(x1 - x0, y1 - y0)
+                altura, largura = fonte.shape[:2]
+                self._recorte = fonte[
+                    max(0, int((y0 - margem) * escala)):min(altura, int((y1 + margem) * escala)),
+                    max(0, int((x0 - margem) * escala)):min(largura, int((x1 + margem) * escala)),
+                ]
+        return self._recorte
+
+
+def _fator_reducao(img_bytes, largura_maxima: int) -> int:
+    """Maior fator (2, 4 ou 8) que mantém o maior lado da imagem acima de `largura_maxima`."""
+    from io import BytesIO
+    from PIL import Image
+    # Um mmap já é um arquivo posicionável: o Pillow lê só o cabeçalho, sem copiar o conteúdo.
+    fonte = img_bytes if hasattr(img_bytes, "seek") else BytesIO(img_bytes)
+    try:
+        with Image.open(fonte) as imagem:
+            lado = max(imagem.size)
+    except Exception:
+        return 1
+    finally:
+        if fonte is img_bytes:
+            img_bytes.seek(0)
+    for fator in (8, 4, 2):
+        if lado / fator >= largura_maxima:
+            return fator
+    return 1
+
+
+def carregar_imagem(img_bytes, obter_qreader=None, largura_maxima: int | None = None, reduzir: bool = True):
+    """
+    Decodifica a imagem enviada já na resolução de trabalho da cascata.
+
+    Lê as dimensões pelo cabeçalho (Pillow) e usa `IMREAD_REDUCED_COLOR_*`, que no
+    JPEG reduz durante a própria decodificação (escala na DCT) em vez de decodificar
+    os 12 MP e redimensionar depois. O original só é decodificado, em tons de cinza,
+    se uma nova tentativa precisar do recorte do QR em resolução plena.
+
+    Args:
+        img_bytes (bytes | mmap.mmap): Conteúdo binário da imagem ou o arquivo mapeado.
+        obter_qreader (callable, optional): Retorna a instância do QReader.
+        largura_maxima (int, optional): Largura máxima da imagem de trabalho
+            (padrão: `QR_LARGURA_MAXIMA`).
+        reduzir (bool): Se False, decodifica em resolução plena antes de redimensionar.
+
+    Returns:
+        ImagemQR | None: Imagem pronta para a cascata, ou None se os bytes não são uma imagem.
+    """
+    import cv2
+    import numpy as np
+
+    largura_maxima = largura_maxima or getattr(settings, "QR_LARGURA_MAXIMA", LARGURA_MAXIMA)
+    nparr = np.frombuffer(img_bytes, np.uint8)
+    fator = _fator_reducao(img_bytes, largura_maxima) if reduzir else 1
+    flags = {
+        1: cv2.IMREAD_COLOR,
+        2: cv2.IMREAD_REDUCED_COLOR_2,
+        4: cv2.IMREAD_REDUCED_COLOR_4,
+        8: cv2.IMREAD_REDUCED_COLOR_8,
+    }
+    imagem = cv2.imdecode(nparr, flags[fator])
+    if imagem is None:
+        return None
+
+    escala = float(fator)
+    altura, largura = imagem.shape[:2]
+    if largura > largura_maxima:
+        proporcao = largura_maxima / largura
+        imagem = cv2.resize(imagem, (int(largura * proporcao), int(altura * proporcao)), interpolation=cv2.INTER_AREA)
+        escala /= proporcao
+
+    carregar_original = (lambda: cv2.imdecode(nparr, cv2.IMREAD_GRAYSCALE)) if escala > 1 else None
+    return ImagemQR(imagem, obter_qreader=obter_qreader, escala=escala, carregar_original=carregar_original)
+
+
+def _zbar(imagem) -> str | None:
+    from pyzbar.pyzbar import ZBarSymbol, decode
+    for simbolo in decode(imagem, symbols=[ZBarSymbol.QRCODE]):
+        if simbolo.data:
+            return simbolo.data.decode("utf-8", errors="ignore")
+    return None
+
+
+def _opencv(imagem) -> str | None:
+    import cv2
+    conteudo, _, _ = cv2.QRCodeDetector().detectAndDecode(imagem)
+    return conteudo or None
+
+
+# O leitor neural (QReader/torch ou a rede do cv2.dnn) é compartilhado pelo processo e não é
+# thread-safe: toda inferência passa por este lock, venha da cascata, do lote ou das variantes.
+_LOCK_QREADER = threading.Lock()
+
+
+def _qreader(qreader, imagem) -> str | None:
+    with _LOCK_QREADER:
+        decodificado = qreader.detect_and_decode(image=imagem)
+    if decodificado and decodificado[0]:
+        return decodificado[0]
+    return None
+
+
+def decodificar_zbar(img: ImagemQR) -> str | None:
+    return _zbar(img.cinza)
+
+
+def decodificar_opencv(img: ImagemQR) -> str | None:
+    import cv2
+    conteudo, pontos, _ = cv2.QRCodeDetector().detectAndDecode(img.cinza)
+    img.registrar_regiao(pontos)
+    return conteudo or None
+
+
+def _zbar_ou_opencv(imagem) -> str | None:
+    try:
+        resultado = _zbar(imagem)
+    except ImportError:
+        resultado = None
+    return resultado or _opencv(imagem)
+
+
+def _variante_limiar(recorte):
+    import cv2
+    return cv2.adaptiveThreshold(recorte, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 21, 11)
+
+
+def _variante_clahe(recorte):
+    """Equalização adaptativa de contraste: sombras e reflexos sobre o cupom."""
+    import cv2
+    return cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8)).apply(recorte)
+
+
+def _variante_nitidez(recorte):
+    """Máscara de nitidez (unsharp) para fotos levemente desfocadas."""
+    import cv2
+    return cv2.addWeighted(recorte, 1.5, cv2.GaussianBlur(recorte, (0, 0), 3), -0.5, 0)
+
+
+def _variante_ampliacao(recorte):
+    """Dobra a resolução de QR Codes pequenos, em que cada módulo tem poucos pixels."""
+    import cv2
+    return cv2.resize(recorte, None, fx=2, fy=2, interpolation=cv2.INTER_CUBIC)
+
+
+def _variante_inversao(recorte):
+    """QR claro sobre fundo escuro (telas, cupons impressos em negativo)."""
+    import cv2
+    return cv2.bitwise_not(recorte)
+
+
+def _variante_rotacao(recorte):
+    """Gira 90° com borda branca, mudando a orientação das linhas de varredura."""
+    import cv2
+    girada = cv2.rotate(recorte, cv2.ROTATE_90_CLOCKWISE)
+    return cv2.copyMakeBorder(girada, 16, 16, 16, 16, cv2.BORDER_CONSTANT, value=255)
+
+
+VARIANTES = {
+    "limiar": _variante_limiar,
+    "clahe": _variante_clahe,
+    "nitidez": _variante_nitidez,
+    "ampliacao": _variante_ampliacao,
+    "inversao": _variante_inversao,
+    "rotacao": _variante_rotacao,
+}
+
+
+class CorridaVariantes:
+    """
+    Tenta decodificar variantes pré-processadas de uma imagem em paralelo.
+
+    Cada variante de `variantes` é gerada e decodificada em um pool de threads pequeno
+    (o OpenCV e o zbar liberam o GIL). A primeira que decodifica vence: as tentativas
+    ainda na fila são canceladas e as que já rodam descartam o trabalho antes de
+    decodificar. As vitórias por variante são contadas para ajustar a ordem padrão
+    (`QR_VARIANTES`), que também é a ordem de execução sem paralelismo.
+
+    Args:
+        variantes (list[str]): Nomes em `VARIANTES`, do mais para o menos provável.
+        threads (int): Tamanho do pool; 1 executa em sequência.
+    """
+
+    def __init__(self, variantes: list[str], threads: int = 3):
+        desconhecidas = [v for v in variantes if v not in VARIANTES]
+        if desconhecidas:
+            raise ValueError(f"Variantes de pré-processamento desconhecidas: {desconhecidas}")
+        self.variantes = list(variantes)
+        self.threads = max(1, threads)
+        self._pool = None
+        self._lock = threading.Lock()
+        self._estatisticas = {v: {"tentativas": 0, "vitorias": 0, "canceladas": 0, "tempo_total": 0.0} for v in self.variantes}
+
+    def _obter_pool(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix="qr-variante")
+            return self._pool
+
+    def _registrar(self, variante: str, vitoria: bool = False, cancelada: bool = False, duracao: float = 0.0):
+        with self._lock:
+            est = self._estatisticas[variante]
+            if cancelada:
+                est["canceladas"] += 1
+                return
+            est["tentativas"] += 1
+            est["vitorias"] += int(vitoria)
+            est["tempo_total"] += duracao
+
+    def decodificar(self, base, decodificador, paralelo: bool = True) -> str | None:
+        """
+        Decodifica a primeira variante de `base` que o `decodificador` conseguir ler.
+
+        Args:
+            base (np.ndarray): Imagem em tons de cinza (normalmente o recorte do QR).
+            decodificador (callable): Recebe a variante e retorna o conteúdo ou None.
+            paralelo (bool): Se False, tenta as variantes em sequência, na ordem
+                configurada (decodificadores que não podem rodar em várias threads).
+
+        Returns:
+            str | None: Conteúdo da variante vencedora, ou None se nenhuma decodificou.
+        """
+        if base is None or base.size == 0:
+            return None
+        vencedora = threading.Event()
+
+        def tentar(variante: str):
+            if vencedora.is_set():
+                return variante, None, None
+            inicio = time.perf_counter()
+            imagem = VARIANTES[variante](base)
+            if vencedora.is_set():
+                return variante, None, None
+            return variante, decodificador(imagem), time.perf_counter() - inicio
+
+        def concluir(variante: str, resultado, duracao, pendentes: int) -> str | None:
+            if duracao is None:
+                self._registrar(variante, cancelada=True)
+                return None
+            self._registrar(variante, vitoria=bool(resultado), duracao=duracao)
+            if resultado:
+                medicao.marcar(qr_variante=variante)
+                logger.info(f"QR decodificado pela variante '{variante}' em {duracao * 1000:.1f}ms ({pendentes} descartadas)")
+            return resultado
+
+        if not paralelo or self.threads == 1 or len(self.variantes) == 1:
+            for posicao, variante in enumerate(self.variantes):
+                resultado = concluir(*tentar(variante), len(self.variantes) - posicao - 1)
+                if resultado:
+                    return resultado
+            return None
+
+        pool = self._obter_pool()
+        futuros = {pool.submit(tentar, variante): variante for variante in self.variantes}
+        pendentes = set(futuros)
+        while pendentes:
+            concluidos, pendentes = wait(pendentes, return_when=FIRST_COMPLETED)
+            for futuro in concluidos:
+                try:
+                    variante, resultado, duracao = futuro.result()
+                except Exception as e:
+                    logger.warning(f"Variante de pré-processamento falhou: {e}")
+                    continue
+                if resultado and not vencedora.is_set():
+                    vencedora.set()
+                    for outro in pendentes:
+                        if outro.cancel():
+                            self._registrar(futuros[outro], cancelada=True)
+                    return concluir(variante, resultado, duracao, len(pendentes))
+                concluir(variante, None if vencedora.is_set() else resultado, duracao, len(pendentes))
+        return None
+
+    def estatisticas(self) -> dict:
+        """
+        Retorna os contadores por variante.
+
+        Returns:
+            dict: Para cada variante, tentativas concluídas, vitórias, tentativas descartadas
+            após outra vencer, taxa de vitória e tempo médio em milissegundos.
+        """
+        with self._lock:
+            return {
+                variante: {
+                    "tentativas": est["tentativas"],
+                    "vitorias": est["vitorias"],
+                    "canceladas": est["canceladas"],
+                    "taxa_vitoria": round(est["vitorias"] / est["tentativas"], 3) if est["tentativas"] else 0.0,
+                    "tempo_medio_ms": round(est["tempo_total"] * 1000 / est["tentativas"], 2) if est["tentativas"] else 0.0,
+                }
+                for variante, est in self._estatisticas.items()
+            }
+
+
+_CORRIDA = None
+_CORRIDA_LOCK = threading.Lock()
+
+
+def obter_corrida() -> CorridaVariantes:
+    """Retorna a corrida de variantes do processo, montada a partir de `QR_VARIANTES`."""
+    global _CORRIDA
+    if _CORRIDA is None:
+        with _CORRIDA_LOCK:
+            if _CORRIDA is None:
+                variantes = getattr(settings, "QR_VARIANTES", None) or VARIANTES_PADRAO
+                _CORRIDA = CorridaVariantes(
+                    [v.strip() for v in variantes if v.strip()],
+                    threads=getattr(settings, "QR_VARIANTES_THREADS", 3),
+                )
+    return _CORRIDA
+
+
+def estatisticas_variantes() -> dict:
+    return obter_corrida().estatisticas()
+
+
+def decodificar_limiar(img: ImagemQR) -> str | None:
+    if img.localizar() is not None:
+        resultado = _zbar_ou_opencv(img.recorte)
+        if resultado:
+            return resultado
+    return obter_corrida().decodificar(img.recorte, _zbar_ou_opencv)
+
+
+def decodificar_qreader(img: ImagemQR) -> str | None:
+    qreader = img.obter_qreader() if img.obter_qreader else None
+    if qreader is None:
+        return None
+    # Só as variantes baratas (zbar/OpenCV) correm em paralelo; o leitor neural as tenta em sequência.
+    return _qreader(qreader, img.imagem) or obter_corrida().decodificar(
+        img.recorte, lambda variante: _qreader(qreader, variante), paralelo=False
+    )
+
+
+def decodificar_qreader_lote(imagens: list[ImagemQR]) -> list[str | None]:
+    """
+    Camada neural para várias imagens de uma vez.
+
+    Com um leitor que expõe `detect_and_decode_lote` (detector ONNX), cada tentativa é
+    uma inferência por bloco de imagens; as que falham são refeitas, também em lote,
+    com cada variante de `QR_VARIANTES` em ordem (a corrida em paralelo não se aplica:
+    o paralelismo já está no lote). Com o QReader (torch) cai no laço imagem a imagem.
+
+    Args:
+        imagens (list[ImagemQR]): Imagens que as camadas baratas não decodificaram.
+
+    Returns:
+        list[str | None]: Conteúdo de cada imagem, na ordem recebida.
+    """
+    if not imagens:
+        return []
+    qreader = imagens[0].obter_qreader() if imagens[0].obter_qreader else None
+    if qreader is None:
+        return [None] * len(imagens)
+    if not hasattr(qreader, "detect_and_decode_lote"):
+        return [decodificar_qreader(img) for img in imagens]
+
+    def primeiro(decodificados):
+        return next((conteudo for conteudo in decodificados if conteudo), None)
+
+    with _LOCK_QREADER:
+        resultados = [primeiro(d) for d in qreader.detect_and_decode_lote([img.imagem for img in imagens])]
+    for variante in obter_corrida().variantes:
+        pendentes = [i for i, resultado in enumerate(resultados) if not resultado]
+        if not pendentes:
+            break
+        quadros = [VARIANTES[variante](imagens[i].recorte) for i in pendentes]
+        with _LOCK_QREADER:
+            novos = qreader.detect_and_decode_lote(quadros)
+        for i, decodificados in zip(pendentes, novos):
+            resultados[i] = primeiro(decodificados)
+    return resultados
+
+
+DECODIFICADORES = {
+    "zbar": decodificar_zbar,
+    "opencv": decodificar_opencv,
+    "limiar": decodificar_limiar,
+    "qreader": decodificar_qreader,
+}
+
+
+class CascataDecodificadores:
+    """
+    Executa os decodificadores do mais barato ao mais caro, parando no primeiro acerto.
+
+    Mantém por camada o número de tentativas, acertos, erros e o tempo acumulado,
+    permitindo medir com que frequência o caminho neural (QReader) é necessário.
+    """
+
+    def __init__(self, camadas: list[str]):
+        desconhecidas = [c for c in camadas if c not in DECODIFICADORES]
+        if desconhecidas:
+            raise ValueError(f"Decodificadores de QR desconhecidos: {desconhecidas}")
+        self.camadas = list(camadas)
+        self._indisponiveis: set[str] = set()
+        self._lock = threading.Lock()
+        self._estatisticas = {c: {"tentativas": 0, "acertos": 0, "erros": 0, "tempo_total": 0.0} for c in self.camadas}
+
+    def _registrar(self, camada: str, acerto: bool, erro: bool, duracao: float):
+        with self._lock:
+            est = self._estatisticas[camada]
+            est["tentativas"] += 1
+            est["acertos"] += int(acerto)
+            est["erros"] += int(erro)
+            est["tempo_total"] += duracao
+
+    def decodificar(self, img: ImagemQR, pular: tuple[str, ...] = ()) -> str | None:
+        for camada in self.camadas:
+            if camada in self._indisponiveis or camada in pular:
+                continue
+            inicio = time.perf_counter()
+            resultado, erro = None, False
+            try:
+                resultado = DECODIFICADORES[camada](img)
+            except ImportError as e:
+                logger.warning(f"Decodificador '{camada}' indisponível: {e}")
+                self._indisponiveis.add(camada)
+                continue
+            except Exception as e:
+                logger.warning(f"Decodificador '{camada}' falhou: {e}")
+                erro = True
+            duracao = time.perf_counter() - inicio
+            self._registrar(camada, bool(resultado), erro, duracao)
+            medicao.adicionar(f"qr_{camada}", duracao * 1000)
+            if resultado:
+                medicao.marcar(qr_camada=camada)
+                logger.info(f"QR decodificado pela camada '{camada}' em {duracao * 1000:.1f}ms")
+                return resultado
+        return None
+
+    def decodificar_lote(self, conteudos: list[bytes], carregar, threads: int = 4) -> list[str | None]:
+        """
+        Decodifica várias imagens, preservando a ordem de entrada.
+
+        A decodificação dos bytes e as camadas baratas rodam por imagem em um pool de
+        threads (o OpenCV e o zbar liberam o GIL). Só as imagens que sobraram passam pela
+        camada neural, agrupadas em uma chamada de `decodificar_qreader_lote`.
+
+        Args:
+            conteudos (list[bytes]): Conteúdo binário de cada imagem.
+            carregar (callable): Converte bytes em `ImagemQR` (ou None se não é imagem).
+            threads (int): Tamanho do pool de pré-processamento.
+
+        Returns:
+            list[str | None]: Conteúdo do QR de cada imagem (None se não decodificou).
+        """
+        def individual(conteudo: bytes):
+            img = carregar(conteudo)
+            if img is None:
+                return None, None
+            return img, self.decodificar(img, pular=("qreader",))
+
+        if len(conteudos) <= 1 or threads <= 1:
+            pares = [individual(conteudo) for conteudo in conteudos]
+        else:
+            with ThreadPoolExecutor(max_workers=min(threads, len(conteudos)), thread_name_prefix="qr-lote") as pool:
+                pares = list(pool.map(individual, conteudos))
+        resultados = [resultado for _, resultado in pares]
+
+        restantes = [i for i, (img, resultado) in enumerate(pares) if img is not None and not resultado]
+        if not restantes or "qreader" not in self.camadas or "qreader" in self._indisponiveis:
+            return resultados
+
+        inicio = time.perf_counter()
+        lidos, erro = [None] * len(restantes), False
+        try:
+            lidos = decodificar_qreader_lote([pares[i][0] for i in restantes])
+        except ImportError as e:
+            logger.warning(f"Decodificador 'qreader' indisponível: {e}")
+            self._indisponiveis.add("qreader")
+            return resultados
+        except Exception as e:
+            logger.warning(f"Decodificador 'qreader' falhou no lote: {e}")
+            erro = True
+        duracao = time.perf_counter() - inicio
+        medicao.adicionar("qr_qreader", duracao * 1000)
+        for i, resultado in zip(restantes, lidos):
+            self._registrar("qreader", bool(resultado), erro, duracao / len(restantes))
+            resultados[i] = resultado
+        logger.info(
+            f"Lote de QR: {len(conteudos)} imagens, {len(restantes)} na camada neural "
+            f"({sum(1 for r in lidos if r)} lidas) em {duracao * 1000:.1f}ms"
+        )
+        return resultados
+
+    def estatisticas(self) -> dict:
+        """
+        Retorna os contadores por camada.
+
+        Returns:
+            dict: Para cada camada, tentativas, acertos, falhas, erros, taxa de acerto
+            e tempo médio em milissegundos.
+        """
+        with self._lock:
+            resultado = {}
+            for camada, est in self._estatisticas.items():
+                tentativas = est["tentativas"]
+                resultado[camada] = {
+                    "tentativas": tentativas,
+                    "acertos": est["acertos"],
+                    "falhas": tentativas - est["acertos"],
+                    "erros": est["erros"],
+                    "taxa_acerto": round(est["acertos"] / tentativas, 3) if tentativas else 0.0,
+                    "tempo_medio_ms": round(est["tempo_total"] * 1000 / tentativas, 2) if tentativas else 0.0,
+                    "disponivel": camada not in self._indisponiveis,
+                }
+            return resultado
+
+
+_CASCATA = None
+_CASCATA_LOCK = threading.Lock()
+
+
+def obter_cascata() -> CascataDecodificadores:
+    """Retorna a cascata do processo, montada a partir de `QR_DECODIFICADORES`."""
+    global _CASCATA
+    if _CASCATA is None:
+        with _CASCATA_LOCK:
+            if _CASCATA is None:
+                camadas = getattr(settings, "QR_DECODIFICADORES", None) or CAMADAS_PADRAO
+                _CASCATA = CascataDecodificadores([c.strip() for c in camadas if c.strip()])
+    return _CASCATA
+
+
+def estatisticas_decodificacao() -> dict:
+    return obter_cascata().estatisticas()
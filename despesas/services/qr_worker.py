@@ -0,0 +1,207 @@
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from multiprocessing.connection import Client, Listener
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+def _chave_autenticacao() -> bytes:
+    return settings.SECRET_KEY.encode("utf-8")
+
+
+class ServidorQRWorker:
+    """
+    Processo de inferência de QR Code mantido aquecido fora dos workers web.
+
+    Carrega o QReader (torch + YOLO) uma única vez e atende requisições recebidas
+    por socket Unix. As imagens entram em uma fila limitada consumida por uma única
+    thread de inferência, já que o modelo não é thread-safe.
+    """
+
+    def __init__(self, endereco: str, capacidade_fila: int = 8, decodificador=None):
+        self.endereco = endereco
+        self.capacidade_fila = capacidade_fila
+        self.fila: queue.Queue = queue.Queue(maxsize=capacidade_fila)
+        self.aquecido = threading.Event()
+        self.processados = 0
+        self.rejeitados = 0
+        self.iniciado_em = time.time()
+        self._decodificador = decodificador
+        self._listener = None
+        self._ativo = threading.Event()
+
+    def _obter_decodificador(self):
+        if self._decodificador is None:
+            from despesas.services.nfe_service import NFeService
+            self._decodificador = NFeService().decodificar_qr_code_local
+        return self._decodificador
+
+    def aquecer(self):
+        """Carrega o modelo antes da primeira requisição real."""
+        inicio = time.perf_counter()
+        try:
+            from despesas.services.nfe_service import NFeService
+            if self._decodificador is None:
+                NFeService().qreader
+            self._obter_decodificador()
+            logger.info(f"QR worker aquecido em {time.perf_counter() - inicio:.2f}s")
+        except Exception as e:
+            logger.error(f"Falha ao aquecer QR worker: {e}")
+        finally:
+            self.aquecido.set()
+
+    def status(self) -> dict:
+        from despesas.services.qr_cascata import estatisticas_decodificacao, estatisticas_variantes
+        return {
+            "aquecido": self.aquecido.is_set(),
+            "fila": self.fila.qsize(),
+            "capacidade": self.capacidade_fila,
+            "processados": self.processados,
+            "rejeitados": self.rejeitados,
+            "pid": os.getpid(),
+            "uptime": round(time.time() - self.iniciado_em, 1),
+            "decodificadores": estatisticas_decodificacao(),
+            "variantes": estatisticas_variantes(),
+        }
+
+    def _consumir_fila(self):
+        self.aquecido.wait()
+        decodificar = self._obter_decodificador()
+        while self._ativo.is_set():
+            try:
+                img_bytes, futuro = self.fila.get(timeout=1)
+            except queue.Empty:
+                continue
+            resultado = None
+            try:
+                resultado = decodificar(img_bytes)
+            except Exception as e:
+                logger.error(f"Erro na inferência do QR worker: {e}")
+            finally:
+                self.processados += 1
+                self.fila.task_done()
+                futuro.set_result(resultado)
+
+    def _atender(self, conn):
+        try:
+            while True:
+                try:
+                    mensagem = conn.recv()
+                except EOFError:
+                    break
+                operacao = mensagem.get("op")
+                if operacao == "status":
+                    conn.send(self.status())
+                elif operacao == "decodificar":
+                    futuro = Future()
+                    try:
+                        self.fila.put_nowait((mensagem["imagem"], futuro))
+                    except queue.Full:
+                        self.rejeitados += 1
+                        conn.send({"ok": False, "erro": "fila_cheia"})
+                        continue
+                    conn.send({"ok": True, "resultado": futuro.result()})
+                else:
+                    conn.send({"ok": False, "erro": "operacao_invalida"})
+        except Exception as e:
+            logger.warning(f"Conexão com QR worker encerrada: {e}")
+        finally:
+            conn.close()
+
+    def iniciar(self):
+        """Abre o socket e sobe as threads de aquecimento e inferência."""
+        if os.path.exists(self.endereco):
+            os.unlink(self.endereco)
+        self._listener = Listener(self.endereco, family="AF_UNIX", authkey=_chave_autenticacao())
+        self._ativo.set()
+        threading.Thread(target=self.aquecer, daemon=True).start()
+        threading.Thread(target=self._consumir_fila, daemon=True).start()
+        logger.info(f"QR worker ouvindo em {self.endereco} (fila={self.capacidade_fila})")
+
+    def servir(self):
+        """Aceita conexões até o servidor ser encerrado."""
+        while self._ativo.is_set():
+            try:
+                conn = self._listener.accept()
+            except Exception as e:
+                if self._ativo.is_set():
+                    logger.warning(f"Falha ao aceitar conexão no QR worker: {e}")
+                continue
+            threading.Thread(target=self._atender, args=(conn,), daemon=True).start()
+
+    def encerrar(self):
+        self._ativo.clear()
+        if self._listener is not None:
+            self._listener.close()
+        if os.path.exists(self.endereco):
+            os.unlink(self.endereco)
+
+
+def _conectar():
+    endereco = getattr(settings, "QR_WORKER_ENDERECO", "")
+    if not endereco or not os.path.exists(endereco):
+        return None
+    return Client(endereco, family="AF_UNIX", authkey=_chave_autenticacao())
+
+
+class TempoEsgotadoQRWorker(Exception):
+    """O QR worker aceitou a imagem mas não respondeu dentro de `QR_WORKER_TIMEOUT`."""
+
+
+def decodificar_remoto(img_bytes: bytes) -> tuple[bool, str | None]:
+    """
+    Envia a imagem ao QR worker e aguarda o conteúdo decodificado.
+
+    Args:
+        img_bytes (bytes): Conteúdo binário da imagem.
+
+    Returns:
+        tuple[bool, str | None]: (atendido, resultado). `atendido` é False quando o worker
+        não está configurado, está fora do ar ou com a fila cheia.
+
+    Raises:
+        TempoEsgotadoQRWorker: Se o worker recebeu a imagem e não respondeu a tempo
+        (ele continua decodificando; repetir a cascata inteira aqui duplicaria o trabalho).
+    """
+    timeout = getattr(settings, "QR_WORKER_TIMEOUT", 30)
+    try:
+        conn = _conectar()
+        if conn is None:
+            return False, None
+        with conn:
+            conn.send({"op": "decodificar", "imagem": bytes(img_bytes)})
+            respondeu = conn.poll(timeout)
+            resposta = conn.recv() if respondeu else None
+    except Exception as e:
+        logger.warning(f"QR worker indisponível: {e}")
+        return False, None
+
+    if not respondeu:
+        logger.warning("QR worker não respondeu dentro do tempo limite.")
+        raise TempoEsgotadoQRWorker()
+    if not resposta.get("ok"):
+        logger.warning(f"QR worker recusou a requisição: {resposta.get('erro')}")
+        return False, None
+    return True, resposta.get("resultado")
+
+
+def status_worker() -> dict | None:
+    """Consulta o estado do QR worker (aquecimento e profundidade da fila)."""
+    try:
+        conn = _conectar()
+        if conn is None:
+            return None
+        with conn:
+            conn.send({"op": "status"})
+            if not conn.poll(5):
+                return None
+            return conn.recv()
+    except Exception as e:
+        logger.warning(f"QR worker indisponível: {e}")
+        return None
@@ -0,0 +1,191 @@
+import logging
+import re
+
+import lxml.html
+from dateutil import parser as dateparser
+from django.utils import timezone
+from lxml import etree
+
+from despesas.enums.forma_pagamento_enum import FormaPagamento
+
+logger = logging.getLogger(__name__)
+
+_PARSER = lxml.html.HTMLParser(encoding="utf-8")
+
+
+def _classe(nome: str) -> str:
+    """Predicado XPath equivalente ao `class_=` do BeautifulSoup (casa um token do atributo)."""
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {nome} ')"
+
+
+XP_EMITENTE = etree.XPath(f"(//div[{_classe('txtTopo')}])[1]")
+XP_TOTAL_NOTA = etree.XPath("(//div[@id='totalNota'])[1]")
+XP_LINHAS_TOTAL = etree.XPath(".//div[@id='linhaTotal']")
+XP_LABEL = etree.XPath("(.//label)[1]")
+XP_TOTAL_NUMB = etree.XPath(f"(.//span[{_classe('totalNumb')}])[1]")
+XP_LINHA_FORMA = etree.XPath("(.//div[@id='linhaForma'])[1]")
+XP_PAGAMENTOS = etree.XPath("following-sibling::div[@id='linhaTotal']")
+XP_LABEL_TX = etree.XPath(f"(.//label[{_classe('tx')}])[1]")
+XP_TABELA_ITENS = etree.XPath("(//table[@id='tabResult'])[1]")
+XP_LINHAS_ITEM = etree.XPath(".//tr[starts-with(@id, 'Item')]")
+XP_DESCRICAO = etree.XPath(f"(.//span[{_classe('txtTit')}])[1]")
+XP_QTD = etree.XPath(f"(.//span[{_classe('Rqtd')}])[1]")
+XP_UNIDADE = etree.XPath(f"(.//span[{_classe('RUN')}])[1]")
+XP_VL_UNIT = etree.XPath(f"(.//span[{_classe('RvlUnit')}])[1]")
+XP_VALOR = etree.XPath(f"(.//span[{_classe('valor')}])[1]")
+XP_SEM_TEXTO = etree.XPath("//script | //style | //template")
+
+RE_CNPJ = re.compile(r"CNPJ[:\s]*(\d{2}\.\d{3}\.\d{3}/\d{4}-\d{2})")
+RE_EMISSAO = re.compile(r"Emiss[ãa]o\s*:?\s*(\d{2}/\d{2}/\d{4})", re.I)
+RE_TROCO = re.compile(r"troco", re.I)
+RE_CREDITO = re.compile(r"Cartão de Crédito", re.I)
+RE_VL_TOTAL = re.compile(r"Vl\.?\s*Total[:\s]*R?\$?\s*([\d.,]+)", re.I)
+
+
+def _primeiro(xpath, elemento):
+    encontrados = xpath(elemento)
+    return encontrados[0] if encontrados else None
+
+
+def _texto(elemento) -> str:
+    """Texto do nó com cada trecho aparado e concatenado (`get_text(strip=True)`)."""
+    return "".join(trecho.strip() for trecho in elemento.itertext())
+
+
+def _texto_separado(elemento) -> str:
+    """Texto do nó com os trechos separados por espaço (`get_text(" ", strip=True)`)."""
+    return " ".join(trecho.strip() for trecho in elemento.itertext() if trecho.strip())
+
+
+def _extrair_itens(tabela, service) -> list[dict]:
+    itens = []
+    for row in XP_LINHAS_ITEM(tabela):
+        span_desc = _primeiro(XP_DESCRICAO, row)
+        nome = _texto(span_desc) if span_desc is not None else "Item"
+
+        qtd = 1.0
+        span_qtd = _primeiro(XP_QTD, row)
+        if span_qtd is not None:
+            qtd = service.normalizar_float(_texto(span_qtd).replace("Qtde.:", "").strip())
+
+        unidade = "UN"
+        span_un = _primeiro(XP_UNIDADE, row)
+        if span_un is not None:
+            txt_un = _texto(span_un).upper().replace("UN:", "").strip()
+            if txt_un:
+                unidade = txt_un
+
+        vl_unit = 0.0
+        span_vunit = _primeiro(XP_VL_UNIT, row)
+        if span_vunit is not None:
+            vl_unit = service.normalizar_float(_texto(span_vunit).replace("Vl. Unit.:", "").strip())
+
+        span_val = _primeiro(XP_VALOR, row)
+        if span_val is not None:
+            vl_total_item = service.normalizar_float(_texto(span_val))
+        else:
+            m_vt = RE_VL_TOTAL.search(_texto_separado(row))
+            vl_total_item = service.normalizar_float(m_vt.group(1)) if m_vt else qtd * vl_unit
+
+        itens.append({"nome": nome, "qtd": qtd, "unidade": unidade, "vl_unit": vl_unit, "vl_total": vl_total_item})
+    return itens
+
+
+def extrair_dados(html: str, service) -> dict:
+    """
+    Extrai os dados da página de consulta da NFC-e com o parser C do lxml.
+
+    Percorre apenas os nós usados (cabeçalho, tabela de itens e totais) por XPaths
+    pré-compilados. A tabela de itens é removida antes da busca textual de CNPJ e
+    data de emissão, evitando concatenar o texto de centenas de linhas.
+
+    Args:
+        html (str): Conteúdo da página retornada pela SEFAZ.
+        service (NFeService): Serviço que fornece a normalização de valores e a validação de CNPJ.
+
+    Returns:
+        dict: Mesmo formato de `NFeService.extrair_dados_html`.
+    """
+    raiz = lxml.html.document_fromstring(html.encode("utf-8"), parser=_PARSER)
+
+    emitente = "Consumidor"
+    div_topo = _primeiro(XP_EMITENTE, raiz)
+    if div_topo is not None:
+        emitente = _texto(div_topo)
+
+    itens = []
+    tabela = _primeiro(XP_TABELA_ITENS, raiz)
+    if tabela is not None:
+        itens = _extrair_itens(tabela, service)
+
+    valor_total_nota = 0.0
+    desconto = 0.0
+    pagamentos_validos = []
+    div_total = _primeiro(XP_TOTAL_NOTA, raiz)
+    if div_total is not None:
+        for linha in XP_LINHAS_TOTAL(div_total):
+            label = _primeiro(XP_LABEL, linha)
+            valor_span = _primeiro(XP_TOTAL_NUMB, linha)
+            if label is None or valor_span is None:
+                continue
+            txt_lbl = _texto(label).lower()
+            val = service.normalizar_float(_texto(valor_span))
+            if "descontos" in txt_lbl:
+                desconto = val
+            elif "valor a pagar" in txt_lbl:
+                valor_total_nota = val
+            elif "valor total" in txt_lbl and valor_total_nota == 0:
+                valor_total_nota = val
+
+        linha_forma = _primeiro(XP_LINHA_FORMA, div_total)
+        if linha_forma is not None:
+            for sibling in XP_PAGAMENTOS(linha_forma):
+                lbl_tx = _primeiro(XP_LABEL_TX, sibling)
+                if lbl_tx is None:
+                    continue
+                pgto = _texto(lbl_tx)
+                if pgto.strip() and not RE_TROCO.search(pgto):
+                    pagamentos_validos.append(pgto)
+
+    for elemento in XP_SEM_TEXTO(raiz):
+        elemento.drop_tree()
+    if tabela is not None:
+        tabela.drop_tree()
+    texto = _texto_separado(raiz)
+
+    cnpj = None
+    m_cnpj = RE_CNPJ.search(texto)
+    if m_cnpj and service.validar_cnpj(m_cnpj.group(1)):
+        cnpj = m_cnpj.group(1)
+
+    data_emissao = timezone.localdate()
+    mensagem_data = RE_EMISSAO.search(texto)
+    if mensagem_data:
+        try:
+            data_emissao = dateparser.parse(mensagem_data.group(1), dayfirst=True).date()
+        except (ValueError, OverflowError):
+            pass
+
+    forma_pagamento_key = ""
+    parcelas = 1
+    if pagamentos_validos:
+        parcelas = len(pagamentos_validos)
+        forma_pagamento_key = service.identificar_forma_pagamento(pagamentos_validos[0])
+    else:
+        txt_total = _texto_separado(div_total) if div_total is not None else texto
+        count_credito = len(RE_CREDITO.findall(txt_total))
+        if count_credito > 0:
+            parcelas = count_credito
+            forma_pagamento_key = FormaPagamento.CREDITO
+
+    logger.info(f"Página SEFAZ extraída (lxml): {emitente}, {len(itens)} itens.")
+    return {
+        "emitente": emitente,
+        "cnpj": cnpj,
+        "data_emissao": data_emissao,
+        "valor_total": valor_total_nota,
+        "desconto": desconto,
+        "forma_pagamento_key": forma_pagamento_key,
+        "parcelas": parcelas,
+        "itens": itens,
+    }
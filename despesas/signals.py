@@ -1,8 +1,9 @@
 from django.db.models.signals import post_save, post_delete, pre_save
 from django.dispatch import receiver
 from django.db import transaction
-from despesas.models import Despesa, Usuario
+from despesas.models import Categoria, Despesa, Usuario
 from despesas.tasks import task_verificar_alertas_orcamento 
+from despesas.services import indice_categoria
 
 @receiver(pre_save, sender=Despesa)
 def capturar_data_antiga_antes_de_salvar(sender, instance: Despesa, **kwargs):
@@ -10,6 +11,7 @@ def capturar_data_antiga_antes_de_salvar(sender, instance: Despesa, **kwargs):
         try:
             despesa_banco = Despesa.objects.get(pk=instance.pk)
             instance._data_antiga = despesa_banco.data
+            instance._indice_antigo = _dados_indice(despesa_banco)
         except Despesa.DoesNotExist:
             pass
 
@@ -30,6 +32,44 @@ def disparar_alerta_orcamento_ao_excluir_despesa(sender, instance: Despesa, **kw
         return
     transaction.on_commit(lambda: _agendar_verificacao(instance.user, instance.data))
 
+@receiver(post_save, sender=Despesa)
+def atualizar_indice_categoria_ao_salvar_despesa(sender, instance: Despesa, raw=False, **kwargs):
+    if raw or not instance.user_id:
+        return
+    novo = _dados_indice(instance)
+    antigo = getattr(instance, '_indice_antigo', None)
+    if antigo == novo:
+        return
+    if antigo:
+        indice_categoria.remover_despesa(instance.user_id, *antigo)
+    if novo:
+        indice_categoria.registrar_despesa(instance.user_id, *novo)
+    instance._indice_antigo = novo
+
+@receiver(post_delete, sender=Despesa)
+def atualizar_indice_categoria_ao_excluir_despesa(sender, instance: Despesa, origin=None, **kwargs):
+    # Na exclusão do usuário as linhas do índice caem junto por cascata.
+    if not instance.user_id or not _exclusao_direta(origin, Despesa):
+        return
+    dados = _dados_indice(instance)
+    if dados:
+        indice_categoria.remover_despesa(instance.user_id, *dados)
+
+@receiver(post_delete, sender=Categoria)
+def atualizar_indice_categoria_ao_excluir_categoria(sender, instance: Categoria, origin=None, **kwargs):
+    if not _exclusao_direta(origin, Categoria):
+        return
+    indice_categoria.remover_categoria(instance.user_id, instance.pk)
+
+def _dados_indice(despesa: Despesa):
+    # Parcelas e recorrências seguintes não votam: cada compra conta uma vez no índice.
+    if not indice_categoria.conta_como_compra(despesa.parcela_atual, despesa.observacoes):
+        return None
+    return (despesa.categoria_id, despesa.emitente_nome, despesa.emitente_cnpj, despesa.data)
+
+def _exclusao_direta(origin, modelo) -> bool:
+    return origin is None or isinstance(origin, modelo) or getattr(origin, 'model', None) is modelo
+
 def _agendar_verificacao(user, data_ref):
     perfil, _ = Usuario.objects.get_or_create(user=user)
     task_verificar_alertas_orcamento.delay(perfil.id, data_ref)
\ No newline at end of file
@@ -42,4 +42,58 @@ def task_verificar_alertas_orcamento(self, perfil_id, data_referencia=None):
             connections.close_all()
 
     thread = threading.Thread(target=_execucao_background)
-    thread.start()
\ No newline at end of file
+    thread.start()
+
+@shared_task(bind=True)
+def task_processar_importacao_nfe(self, importacao_id):
+    """
+    Processa um job de importação de NFe em background.
+
+    Segue o mesmo modelo de thread de `task_verificar_alertas_orcamento`, liberando a
+    thread do Gunicorn enquanto a imagem é decodificada e a página da SEFAZ é consultada.
+
+    Args:
+        importacao_id (int): ID do ImportacaoNFe a ser processado.
+    """
+    import threading
+    from django.db import connections
+    from despesas.services.importacao_nfe import executar_importacao
+
+    def _execucao_background():
+        try:
+            connections.close_all()
+            try:
+                executar_importacao(importacao_id)
+            except Exception as e:
+                logger.error(f"Erro na execução background da importação {importacao_id}: {e}")
+        finally:
+            connections.close_all()
+
+    thread = threading.Thread(target=_execucao_background)
+    thread.start()
+
+
+@shared_task(bind=True)
+def task_processar_lote_nfe(self, lote_id):
+    """
+    Processa um lote de importações de NFe em background.
+
+    Args:
+        lote_id (int): ID do LoteImportacaoNFe a ser processado.
+    """
+    import threading
+    from django.db import connections
+    from despesas.services.importacao_nfe import executar_lote
+
+    def _execucao_background():
+        try:
+            connections.close_all()
+            try:
+                executar_lote(lote_id)
+            except Exception as e:
+                logger.error(f"Erro na execução background do lote {lote_id}: {e}")
+        finally:
+            connections.close_all()
+
+    thread = threading.Thread(target=_execucao_background)
+    thread.start()
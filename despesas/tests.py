@@ -6,13 +6,42 @@ from decimal import Decimal
 import pandas as pd
 from datetime import timedelta
 
-from despesas.models import Despesa, Receita, Usuario, Categoria
+from despesas.models import Despesa, Receita, Usuario, Categoria, ImportacaoNFe
 from despesas.services.dashboard_dados import calcular_kpis_mensais, to_float
 from despesas.services.nfe_service import NFeService
+from despesas.services.qr_worker import ServidorQRWorker, status_worker
 from despesas.enums.forma_pagamento_enum import FormaPagamento
+from despesas.enums.status_importacao_enum import StatusImportacao
+from despesas.services.importacao_nfe import executar_importacao
 
 User = get_user_model()
 
+CHAVE_EXEMPLO = "43260106990590000123650010000012341000012342"
+URL_NFCE_EXEMPLO = f"https://www.sefaz.rs.gov.br/NFCE/NFCE-COM.aspx?p={CHAVE_EXEMPLO}|2|1|1|ABCDEF"
+HTML_NFCE_EXEMPLO = """
+<html><body>
+<div class="txtTopo">MERCADO TESTE LTDA</div>
+<div class="text">CNPJ: 06.990.590/0001-23 , Rua A, 100</div>
+<div><strong>Emissão: </strong>10/01/2026 12:00:00</div>
+<table id="tabResult">
+  <tr id="Item + 1"><td><span class="txtTit">ARROZ 5KG</span><span class="Rqtd"><strong>Qtde.:</strong>2</span>
+    <span class="RUN"><strong>UN: </strong>UN</span><span class="RvlUnit"><strong>Vl. Unit.:</strong> 5,00</span></td>
+    <td><span class="valor">10,00</span></td></tr>
+  <tr id="Item + 2"><td><span class="txtTit">FEIJAO</span><span class="Rqtd"><strong>Qtde.:</strong>1,5</span>
+    <span class="RUN"><strong>UN: </strong>KG</span><span class="RvlUnit"><strong>Vl. Unit.:</strong> 8,00</span></td>
+    <td><span class="valor">12,00</span></td></tr>
+</table>
+<div id="totalNota">
+  <div id="linhaTotal"><label>Qtd. total de itens:</label><span class="totalNumb">2</span></div>
+  <div id="linhaTotal"><label>Valor total R$:</label><span class="totalNumb">22,00</span></div>
+  <div id="linhaTotal"><label>Descontos R$:</label><span class="totalNumb">1,00</span></div>
+  <div id="linhaTotal"><label>Valor a pagar R$:</label><span class="totalNumb">21,00</span></div>
+  <div id="linhaForma"><label>Forma de pagamento:</label><span class="totalNumb txtTitR">Valor pago R$:</span></div>
+  <div id="linhaTotal"><label class="tx">Cartão de Débito</label><span class="totalNumb">21,00</span></div>
+</div>
+</body></html>
+"""
+
 
 class TestUsuarioModel(TestCase):
     """
@@ -310,3 +339,1537 @@ class TestViewsIntegracao(TestCase):
             self.assertEqual(desp.data.year, 2026)
             self.assertEqual(desp.valor, Decimal('1000.00'))
             self.assertEqual(str(desp.tipo), "FIXA")
+
+class TestQRWorker(TestCase):
+    """
+    Testes do processo dedicado de leitura de QR Code.
+
+    Sobe o servidor em threads locais com um decodificador falso, sem carregar o QReader.
+    """
+    def setUp(self):
+        """Inicia o servidor em um socket temporário."""
+        import tempfile, threading
+        self.tmpdir = tempfile.mkdtemp()
+        self.endereco = f"{self.tmpdir}/qr.sock"
+        self.servidor = ServidorQRWorker(self.endereco, capacidade_fila=2, decodificador=lambda b: b.decode())
+        self.servidor.iniciar()
+        threading.Thread(target=self.servidor.servir, daemon=True).start()
+        self.servidor.aquecido.wait(5)
+
+    def tearDown(self):
+        self.servidor.encerrar()
+
+    def test_decodificacao_remota(self):
+        """
+        Valida o envio de bytes ao worker e o retorno da string decodificada.
+
+        Valida:
+            - O serviço usa o worker quando QR_WORKER_ENDERECO está definido.
+            - O status reporta o worker aquecido e a fila vazia.
+        """
+        with self.settings(QR_WORKER_ENDERECO=self.endereco):
+            service = NFeService()
+            with patch.object(service, 'decodificar_qr_code_local') as mock_local:
+                self.assertEqual(service.decodificar_qr_code(b"https://nfce.sefaz.rs.gov.br/x"), "https://nfce.sefaz.rs.gov.br/x")
+                mock_local.assert_not_called()
+            estado = status_worker()
+        self.assertTrue(estado["aquecido"])
+        self.assertEqual(estado["fila"], 0)
+        self.assertEqual(estado["processados"], 1)
+
+    def test_fallback_local_worker_indisponivel(self):
+        """
+        Valida o fallback para decodificação local quando o socket não existe.
+        """
+        with self.settings(QR_WORKER_ENDERECO=f"{self.tmpdir}/inexistente.sock"):
+            service = NFeService()
+            with patch.object(service, 'decodificar_qr_code_local', return_value="local") as mock_local:
+                self.assertEqual(service.decodificar_qr_code(b"img"), "local")
+                mock_local.assert_called_once()
+
+    def test_timeout_do_worker_nao_repete_cascata_completa(self):
+        """
+        Valida que, sem resposta do worker a tempo, o processo web não roda o QReader.
+
+        Valida:
+            - Apenas as camadas baratas são tentadas localmente (`pular=("qreader",)`).
+            - A falha não é cacheada, permitindo que um novo envio seja atendido pelo worker.
+        """
+        import threading
+        from despesas.services import cache_nfe
+        liberar = threading.Event()
+        endereco = f"{self.tmpdir}/lento.sock"
+        lento = ServidorQRWorker(endereco, capacidade_fila=2, decodificador=lambda b: liberar.wait(5) and None)
+        lento.iniciar()
+        self.addCleanup(lento.encerrar)
+        self.addCleanup(liberar.set)
+        threading.Thread(target=lento.servir, daemon=True).start()
+        lento.aquecido.wait(5)
+        with self.settings(QR_WORKER_ENDERECO=endereco, QR_WORKER_TIMEOUT=0.2):
+            service = NFeService()
+            with patch.object(service, 'decodificar_qr_code_local', return_value=None) as mock_local:
+                self.assertIsNone(service.decodificar_qr_code(b"img-lenta"))
+                mock_local.assert_called_once_with(b"img-lenta", pular=("qreader",))
+        self.assertEqual(cache_nfe.obter_qr(cache_nfe.hash_conteudo(b"img-lenta")), (False, None))
+
+class TestCascataQR(TestCase):
+    """
+    Testes da cascata de decodificadores de QR Code.
+
+    Gera um QR Code sintético com o OpenCV para validar que as camadas baratas
+    resolvem imagens limpas sem acionar o QReader.
+    """
+    def _gerar_png_qr(self, conteudo):
+        import cv2
+        qr = cv2.QRCodeEncoder.create().encode(conteudo)
+        qr = cv2.resize(qr, None, fx=8, fy=8, interpolation=cv2.INTER_NEAREST)
+        qr = cv2.copyMakeBorder(qr, 40, 40, 40, 40, cv2.BORDER_CONSTANT, value=255)
+        return cv2.imencode(".png", qr)[1].tobytes()
+
+    def test_camadas_baratas_antes_do_qreader(self):
+        """
+        Valida que uma imagem limpa é decodificada sem chegar à camada QReader.
+
+        Valida:
+            - Conteúdo decodificado corretamente.
+            - A camada 'qreader' não registra tentativas.
+        """
+        import cv2
+        import numpy as np
+        from despesas.services.qr_cascata import CascataDecodificadores, ImagemQR
+        url = "https://www.sefaz.rs.gov.br/NFCE/NFCE-COM.aspx?p=43240100000000000000650010000000011000000011|2|1|1|ABC"
+        imagem = cv2.imdecode(np.frombuffer(self._gerar_png_qr(url), np.uint8), cv2.IMREAD_COLOR)
+        obter_qreader = MagicMock()
+        cascata = CascataDecodificadores(["opencv", "limiar", "qreader"])
+
+        self.assertEqual(cascata.decodificar(ImagemQR(imagem, obter_qreader=obter_qreader)), url)
+        estatisticas = cascata.estatisticas()
+        self.assertEqual(estatisticas["opencv"]["acertos"], 1)
+        self.assertEqual(estatisticas["qreader"]["tentativas"], 0)
+        obter_qreader.assert_not_called()
+
+    def test_camada_desconhecida(self):
+        """Valida que uma configuração com decodificador inexistente é rejeitada."""
+        from despesas.services.qr_cascata import CascataDecodificadores
+        with self.assertRaises(ValueError):
+            CascataDecodificadores(["zbar", "tesseract"])
+
+    def test_resolucao_reduzida_e_recorte(self):
+        """
+        Decodifica uma foto sintética de 12 MP pelo caminho de resolução reduzida.
+
+        Valida:
+            - A imagem de trabalho é lida já reduzida (fator 4, largura de 1000 px).
+            - A nova tentativa usa apenas o recorte do QR, relido do original em resolução plena.
+        """
+        from despesas.management.commands.benchmark_nfe import gerar_foto_qr
+        from despesas.services.qr_cascata import carregar_imagem, decodificar_limiar
+        url = "https://www.sefaz.rs.gov.br/NFCE/NFCE-COM.aspx?p=43260106990590000123650010000012341000012342|2|1|1|ABCDEF"
+        img = carregar_imagem(gerar_foto_qr(url, lado_qr=400), largura_maxima=1000)
+        self.assertEqual(img.imagem.shape[:2], (750, 1000))
+        self.assertEqual(img.escala, 4.0)
+        self.assertEqual(decodificar_limiar(img), url)
+        altura, largura = img.recorte.shape
+        self.assertTrue(400 <= largura < 700 and 400 <= altura < 700)
+
+    def test_decodificacao_servico(self):
+        """Valida a decodificação ponta a ponta pelo NFeService sem QR worker."""
+        with self.settings(QR_WORKER_ENDERECO=""):
+            self.assertEqual(NFeService().decodificar_qr_code(self._gerar_png_qr("teste-qr")), "teste-qr")
+
+    def test_detector_onnx(self):
+        """
+        Valida o pós-processamento do detector ONNX com uma saída sintética do YOLO.
+
+        Contexto:
+            - Foto 640x480 com o QR de 120 px em (288, 192); o modelo não é carregado.
+
+        Valida:
+            - A caixa volta às coordenadas da foto (sem o preenchimento do letterbox) e a
+              detecção duplicada é suprimida.
+            - O recorte detectado é decodificado, no mesmo contrato do QReader.
+            - A versão em lote empilha até `tamanho_lote` imagens por inferência.
+            - `criar_leitor` monta o leitor ONNX conforme `QR_DETECTOR_BACKEND`.
+        """
+        import cv2
+        import numpy as np
+        from despesas.management.commands.benchmark_nfe import gerar_foto_qr
+        from despesas.services.detector_qr import LeitorQRONNX, criar_leitor
+        foto = cv2.imdecode(np.frombuffer(gerar_foto_qr(URL_NFCE_EXEMPLO, 120, 640, 480), np.uint8), cv2.IMREAD_COLOR)
+        saida = np.zeros((1, 37, 3), dtype=np.float32)
+        saida[0, :5, 0] = [348, 332, 120, 120, 0.9]
+        saida[0, :5, 1] = [350, 334, 118, 118, 0.8]
+        saida[0, :5, 2] = [100, 100, 50, 50, 0.1]
+
+        with patch.object(LeitorQRONNX, '_carregar'), patch.object(LeitorQRONNX, '_inferir', return_value=saida):
+            leitor = LeitorQRONNX("qrdet-n.onnx", backend="opencv")
+            deteccoes = leitor.detectar(foto)
+            self.assertEqual(len(deteccoes), 1)
+            self.assertEqual([round(v) for v in deteccoes[0][:4]], [288, 192, 408, 312])
+            self.assertEqual(leitor.detect_and_decode(image=foto), (URL_NFCE_EXEMPLO,))
+        with patch.object(LeitorQRONNX, '_carregar'), patch.object(LeitorQRONNX, '_inferir', side_effect=lambda blob: np.repeat(saida, len(blob), axis=0)) as mock_inferir:
+            leitor = LeitorQRONNX("qrdet-n.onnx", backend="opencv", tamanho_lote=2)
+            self.assertEqual(leitor.detect_and_decode_lote([foto] * 3), [(URL_NFCE_EXEMPLO,)] * 3)
+            self.assertEqual([c.args[0].shape[0] for c in mock_inferir.call_args_list], [2, 1])
+            with self.settings(QR_DETECTOR_BACKEND="onnxruntime", QR_DETECTOR_MODELO="/modelos/qrdet-n.onnx"):
+                leitor = criar_leitor()
+        self.assertIsInstance(leitor, LeitorQRONNX)
+        self.assertEqual((leitor.backend, leitor.caminho), ("onnxruntime", "/modelos/qrdet-n.onnx"))
+
+    def test_corrida_de_variantes(self):
+        """
+        Valida a corrida de variantes pré-processadas com cancelamento no primeiro acerto.
+
+        Contexto:
+            - Decodificador dublê que só lê a variante ampliada (lenta nas demais).
+
+        Valida:
+            - A variante vencedora é retornada e contabilizada.
+            - As tentativas ainda na fila são descartadas após o acerto.
+            - Em sequência (1 thread), a ordem configurada é respeitada.
+        """
+        import time
+        import numpy as np
+        from despesas.services.qr_cascata import VARIANTES_PADRAO, CorridaVariantes
+        base = np.full((60, 60), 200, dtype=np.uint8)
+        chamadas = []
+
+        def decodificador(imagem):
+            chamadas.append(imagem.shape)
+            if imagem.shape == (120, 120):
+                return "ampliada"
+            time.sleep(0.05)
+            return None
+
+        corrida = CorridaVariantes(VARIANTES_PADRAO, threads=2)
+        self.assertEqual(corrida.decodificar(base, decodificador), "ampliada")
+        estatisticas = corrida.estatisticas()
+        self.assertEqual(estatisticas["ampliacao"]["vitorias"], 1)
+        self.assertLess(len(chamadas), len(VARIANTES_PADRAO))
+        self.assertGreaterEqual(sum(e["canceladas"] for e in estatisticas.values()), 1)
+
+        chamadas.clear()
+        sequencial = CorridaVariantes(["inversao", "ampliacao", "rotacao"], threads=1)
+        self.assertEqual(sequencial.decodificar(base, decodificador), "ampliada")
+        self.assertEqual(len(chamadas), 2)
+        with self.assertRaises(ValueError):
+            CorridaVariantes(["limiar", "sepia"])
+
+    def test_variantes_do_leitor_neural_em_sequencia(self):
+        """
+        Valida que o leitor neural (não thread-safe) nunca roda em duas threads ao mesmo tempo.
+
+        Valida:
+            - As variantes da camada 'qreader' são tentadas uma a uma, na ordem configurada.
+        """
+        import threading
+        import time
+        import numpy as np
+        from despesas.services.qr_cascata import VARIANTES_PADRAO, CorridaVariantes, ImagemQR, decodificar_qreader
+        ativos, maximo, chamadas = [0], [0], []
+        trava = threading.Lock()
+
+        class LeitorLento:
+            def detect_and_decode(self, image):
+                with trava:
+                    ativos[0] += 1
+                    maximo[0] = max(maximo[0], ativos[0])
+                chamadas.append(image.shape)
+                time.sleep(0.01)
+                with trava:
+                    ativos[0] -= 1
+                return (None,)
+
+        leitor = LeitorLento()
+        img = ImagemQR(np.full((80, 80), 200, dtype=np.uint8), obter_qreader=lambda: leitor)
+        img.registrar_regiao(None)
+        with patch('despesas.services.qr_cascata.obter_corrida', return_value=CorridaVariantes(VARIANTES_PADRAO, threads=3)):
+            self.assertIsNone(decodificar_qreader(img))
+        self.assertEqual(maximo[0], 1)
+        self.assertEqual(len(chamadas), 1 + len(VARIANTES_PADRAO))
+
+    def test_decodificacao_em_lote(self):
+        """
+        Valida a cascata em lote com imagens mistas.
+
+        Contexto:
+            - Dois QR legíveis, uma imagem em branco, bytes que não são imagem; o leitor
+              neural é um dublê com `detect_and_decode_lote`.
+
+        Valida:
+            - Os resultados voltam na ordem de entrada.
+            - Só a imagem em branco chega à camada neural, em uma única chamada em lote
+              (mais a primeira variante pré-processada, também em lote).
+        """
+        import cv2
+        import numpy as np
+        from despesas.services.qr_cascata import CascataDecodificadores, carregar_imagem
+        leitor = MagicMock()
+        leitor.detect_and_decode_lote.side_effect = [[(None,)], [("neural",)]]
+        branca = cv2.imencode(".png", np.full((200, 200), 255, dtype=np.uint8))[1].tobytes()
+        conteudos = [self._gerar_png_qr("qr-a"), branca, b"nao e imagem", self._gerar_png_qr("qr-b")]
+        cascata = CascataDecodificadores(["opencv", "limiar", "qreader"])
+
+        resultados = cascata.decodificar_lote(conteudos, carregar=lambda b: carregar_imagem(b, obter_qreader=lambda: leitor), threads=3)
+
+        self.assertEqual(resultados, ["qr-a", "neural", None, "qr-b"])
+        self.assertEqual(leitor.detect_and_decode_lote.call_count, 2)
+        self.assertEqual(len(leitor.detect_and_decode_lote.call_args_list[0].args[0]), 1)
+        self.assertEqual(cascata.estatisticas()["qreader"]["tentativas"], 1)
+
+class TestCacheQR(TestCase):
+    """
+    Testes do cache endereçado por conteúdo das imagens de nota.
+
+    Valida que reenvios da mesma foto não refazem a decodificação.
+    """
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        self.service = NFeService()
+
+    def test_reenvio_usa_cache(self):
+        """
+        Valida que o segundo envio dos mesmos bytes é servido pelo cache.
+
+        Valida:
+            - O decodificador é chamado uma única vez para dois envios iguais.
+            - Bytes diferentes não compartilham a entrada.
+        """
+        with self.settings(QR_WORKER_ENDERECO=""), patch.object(self.service, 'decodificar_qr_code_local', return_value="https://sefaz.rs.gov.br/qr") as mock_local:
+            self.assertEqual(self.service.decodificar_qr_code(b"foto"), "https://sefaz.rs.gov.br/qr")
+            self.assertEqual(self.service.decodificar_qr_code(b"foto"), "https://sefaz.rs.gov.br/qr")
+            self.assertEqual(mock_local.call_count, 1)
+            self.service.decodificar_qr_code(b"outra foto")
+            self.assertEqual(mock_local.call_count, 2)
+
+    def test_resultado_negativo_em_cache(self):
+        """Valida que imagens sem QR legível também são memorizadas."""
+        with self.settings(QR_WORKER_ENDERECO=""), patch.object(self.service, 'decodificar_qr_code_local', return_value=None) as mock_local:
+            self.assertIsNone(self.service.decodificar_qr_code(b"borrada"))
+            self.assertIsNone(self.service.decodificar_qr_code(b"borrada"))
+            self.assertEqual(mock_local.call_count, 1)
+
+    def test_lote_usa_cache_e_deduplica(self):
+        """
+        Valida que `decodificar_qr_codes` consulta o cache e decodifica cada conteúdo uma vez.
+
+        Valida:
+            - Imagem já em cache não é enviada à cascata; repetidas viram uma entrada.
+            - A saída segue a ordem de entrada e o resultado novo é gravado no cache.
+        """
+        self.service.decodificar_qr_code_local = MagicMock(return_value="em-cache")
+        with self.settings(QR_WORKER_ENDERECO=""):
+            self.service.decodificar_qr_code(b"foto-1")
+            with patch.object(self.service, '_decodificar_lote_local', return_value=["novo", None]) as mock_lote:
+                resultados = self.service.decodificar_qr_codes([b"foto-2", b"foto-1", b"foto-3", b"foto-2"])
+            self.assertEqual(resultados, ["novo", "em-cache", None, "novo"])
+            self.assertEqual(mock_lote.call_args.args[0], [b"foto-2", b"foto-3"])
+            self.assertEqual(self.service.decodificar_qr_codes([b"foto-2"]), ["novo"])
+
+class TestImportacaoAssincrona(TestCase):
+    """
+    Testes dos jobs de importação de NFe em background.
+
+    Cobre a criação do job via AJAX, a deduplicação de reenvios, o processamento,
+    o endpoint de status e o cancelamento.
+    """
+    def setUp(self):
+        """Autentica o usuário e isola os uploads em um diretório temporário."""
+        import tempfile
+        self.user = User.objects.create_user(username='jobuser', password='password')
+        Usuario.objects.create(user=self.user, renda_fixa=5000)
+        self.client.force_login(self.user)
+        self.media = self.settings(MEDIA_ROOT=tempfile.mkdtemp())
+        self.media.enable()
+
+    def tearDown(self):
+        self.media.disable()
+
+    def _enviar(self, conteudo=b"foto-da-nota"):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        arquivo = SimpleUploadedFile("nota.jpg", conteudo, content_type="image/jpeg")
+        with patch('despesas.views.nfe.task_processar_importacao_nfe') as mock_task:
+            response = self.client.post('/importar/NFe/', {"imagem": arquivo}, HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        return response, mock_task
+
+    def test_upload_retorna_job_e_deduplica(self):
+        """
+        Valida que o upload responde imediatamente com o job e que reenvios o reaproveitam.
+
+        Valida:
+            - HTTP 202 com status PENDENTE e URL de status.
+            - Reenvio do mesmo arquivo retorna o mesmo ID sem criar outro job.
+        """
+        response, _ = self._enviar()
+        self.assertEqual(response.status_code, 202)
+        dados = response.json()
+        self.assertEqual(dados["status"], StatusImportacao.PENDENTE)
+        self.assertIn(str(dados["id"]), dados["status_url"])
+
+        response, _ = self._enviar()
+        self.assertEqual(response.json()["id"], dados["id"])
+        self.assertEqual(ImportacaoNFe.objects.filter(user=self.user).count(), 1)
+
+    def test_job_parado_expira_e_libera_reenvio(self):
+        """
+        Valida que um job abandonado em processamento não bloqueia o reenvio do arquivo.
+
+        Contexto:
+            - O worker morreu com o job em PROCESSANDO; a última atualização passou do prazo.
+
+        Valida:
+            - Dentro do prazo, o reenvio devolve o mesmo job.
+            - Após o prazo, o reenvio cria um novo job e o status de um job parado responde erro.
+        """
+        from datetime import timedelta
+        from django.utils import timezone
+        response, _ = self._enviar()
+        job_id = response.json()["id"]
+        ImportacaoNFe.objects.filter(pk=job_id).update(status=StatusImportacao.PROCESSANDO, atualizado_em=timezone.now())
+        with self.settings(NFE_IMPORTACAO_PRAZO=600):
+            self.assertEqual(self._enviar()[0].json()["id"], job_id)
+
+            ImportacaoNFe.objects.filter(pk=job_id).update(atualizado_em=timezone.now() - timedelta(minutes=11))
+            response, _ = self._enviar()
+            self.assertEqual(response.status_code, 202)
+            self.assertNotEqual(response.json()["id"], job_id)
+            self.assertEqual(ImportacaoNFe.objects.get(pk=job_id).status, StatusImportacao.ERRO)
+
+            novo_id = response.json()["id"]
+            ImportacaoNFe.objects.filter(pk=novo_id).update(
+                status=StatusImportacao.PROCESSANDO, atualizado_em=timezone.now() - timedelta(minutes=11)
+            )
+            status = self.client.get(f'/importar/NFe/{novo_id}/status/').json()
+        self.assertEqual(status["status"], StatusImportacao.ERRO)
+        self.assertTrue(status["finalizada"])
+
+    def test_upload_em_disco_com_limite(self):
+        """
+        Valida o limite de tamanho aplicado na leitura do upload e a leitura por mmap.
+
+        Valida:
+            - Arquivo acima de `NFE_UPLOAD_TAMANHO_MAXIMO` é recusado (HTTP 400) sem criar job.
+            - O job entrega ao leitor de QR o arquivo mapeado, não uma cópia em bytes.
+        """
+        import mmap
+        with self.settings(NFE_UPLOAD_TAMANHO_MAXIMO=1024):
+            response, mock_task = self._enviar(b"x" * 4096)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("grande demais (limite de 1 KB)", str(response.json()["errors"]["imagem"]))
+        self.assertFalse(ImportacaoNFe.objects.filter(user=self.user).exists())
+
+        response, _ = self._enviar(b"foto-em-disco")
+        lidos = []
+        with patch.object(NFeService, 'decodificar_qr_code', side_effect=lambda conteudo: lidos.append((type(conteudo), bytes(conteudo)))):
+            executar_importacao(response.json()["id"])
+        self.assertEqual(lidos, [(mmap.mmap, b"foto-em-disco")])
+
+    def test_processamento_e_status(self):
+        """
+        Valida o processamento do job e o rascunho servido pelo endpoint de status.
+
+        Valida:
+            - Job CONCLUIDA com o resultado serializado.
+            - Endpoint de status devolve o HTML do formulário com o emitente.
+        """
+        response, _ = self._enviar()
+        job_id = response.json()["id"]
+        dados_nota = {"emitente": "Mercado Teste", "cnpj": None, "data_emissao": timezone.localdate(), "valor_total": 12.5, "itens": []}
+        with patch.object(NFeService, 'decodificar_qr_code', return_value="https://www.sefaz.rs.gov.br/nfce?p=1"), \
+             patch.object(NFeService, 'extrair_dados_url', return_value=dados_nota):
+            executar_importacao(job_id)
+
+        importacao = ImportacaoNFe.objects.get(pk=job_id)
+        self.assertEqual(importacao.status, StatusImportacao.CONCLUIDA)
+        self.assertFalse(importacao.arquivo)
+        status = self.client.get(f'/importar/NFe/{job_id}/status/').json()
+        self.assertTrue(status["finalizada"])
+        self.assertIn("Mercado Teste", status["html"])
+
+    def test_rascunho_parcial_da_chave(self):
+        """
+        Valida o rascunho montado só com a chave de acesso, antes da consulta à SEFAZ.
+
+        Contexto:
+            - O CNPJ da chave já está no diretório de emitentes.
+
+        Valida:
+            - Decodificação da chave (UF, mês, CNPJ, modelo, série, número).
+            - Durante a consulta, o status traz `parcial` com CNPJ, emitente e mês preenchidos.
+            - Se a consulta falha, o job conclui com o rascunho parcial.
+        """
+        from despesas.models import EmitenteCNPJ
+        from despesas.services.chave_acesso import decodificar_chave_acesso
+        self.assertEqual(decodificar_chave_acesso(CHAVE_EXEMPLO), {
+            "uf": "RS", "ano": 2026, "mes": 1, "cnpj": "06990590000123", "modelo": "65",
+            "serie": 1, "numero": 1234, "tipo_emissao": "1",
+        })
+        EmitenteCNPJ.objects.create(cnpj="06990590000123", nome="MERCADO TESTE LTDA", categoria_padrao="Mercado")
+        response, _ = self._enviar()
+        job_id = response.json()["id"]
+        durante = {}
+
+        def consultar_sefaz(url):
+            durante.update(self.client.get(f'/importar/NFe/{job_id}/status/').json())
+            return {}
+
+        with patch.object(NFeService, 'decodificar_qr_code', return_value=URL_NFCE_EXEMPLO), \
+             patch.object(NFeService, 'extrair_dados_url', side_effect=consultar_sefaz):
+            executar_importacao(job_id)
+
+        self.assertFalse(durante["finalizada"])
+        self.assertTrue(durante["parcial"])
+        self.assertIn("MERCADO TESTE LTDA", durante["html"])
+        self.assertIn("06.990.590/0001-23", durante["html"])
+        self.assertIn("2026-01-01", durante["html"])
+        self.assertIn("avisoRascunhoParcial", durante["html"])
+        status = self.client.get(f'/importar/NFe/{job_id}/status/').json()
+        self.assertEqual(status["status"], StatusImportacao.CONCLUIDA)
+        self.assertNotIn("avisoRascunhoParcial", status["html"])
+        self.assertIn(CHAVE_EXEMPLO, status["html"])
+
+    def test_medicao_das_etapas(self):
+        """
+        Valida os tempos por etapa do job e o cabeçalho `Server-Timing` do rascunho.
+
+        Valida:
+            - O log estruturado do job traz origem, host, itens e as etapas QR, SEFAZ e HTML.
+            - O status concluído devolve no `Server-Timing` as etapas do job, a categorização
+              e o formulário, com o host e a quantidade de itens.
+            - Sem `NFE_SERVER_TIMING`, o cabeçalho só é enviado a usuários staff.
+        """
+        from django.core.cache import cache
+        cache.clear()
+        response, _ = self._enviar(b"foto-medida")
+        job_id = response.json()["id"]
+        resposta_sefaz = MagicMock(status_code=200, text=HTML_NFCE_EXEMPLO)
+        with patch.object(NFeService, 'decodificar_qr_code_local', return_value=URL_NFCE_EXEMPLO), \
+             patch('despesas.services.nfe_service.obter_cliente') as mock_cliente, \
+             self.assertLogs('despesas.services.medicao', 'INFO') as logs:
+            mock_cliente.return_value.get.return_value = resposta_sefaz
+            executar_importacao(job_id)
+
+        registro = logs.records[-1].medicao
+        self.assertEqual(registro["origem"], "qr")
+        self.assertEqual(registro["host"], "www.sefaz.rs.gov.br")
+        self.assertEqual(registro["itens"], 2)
+        self.assertLessEqual({"qr", "sefaz", "html"}, set(registro["etapas_ms"]))
+
+        with self.settings(NFE_SERVER_TIMING=False):
+            self.assertFalse(self.client.get(f'/importar/NFe/{job_id}/status/').has_header("Server-Timing"))
+            self.user.is_staff = True
+            self.user.save(update_fields=["is_staff"])
+            response = self.client.get(f'/importar/NFe/{job_id}/status/')
+        cabecalho = response["Server-Timing"]
+        for metrica in ("qr;dur=", 'sefaz;dur=', 'desc="www.sefaz.rs.gov.br"', "html;dur=", "categoria;dur=", "formulario;dur=", "job;dur="):
+            self.assertIn(metrica, cabecalho)
+        self.assertIn("itens=2", cabecalho)
+
+    def test_cancelamento(self):
+        """Valida que um job cancelado não é processado."""
+        response, _ = self._enviar()
+        job_id = response.json()["id"]
+        self.assertTrue(self.client.post(f'/importar/NFe/{job_id}/cancelar/').json()["success"])
+        with patch.object(NFeService, 'decodificar_qr_code') as mock_decode:
+            executar_importacao(job_id)
+            mock_decode.assert_not_called()
+        self.assertEqual(ImportacaoNFe.objects.get(pk=job_id).status, StatusImportacao.CANCELADA)
+
+
+class TestServerTimingMiddleware(TestCase):
+    """
+    Testes de quem recebe o cabeçalho `Server-Timing`.
+    """
+    def setUp(self):
+        from django.contrib.auth.models import AnonymousUser
+        self.factory = RequestFactory()
+        self.anonimo = AnonymousUser()
+        self.comum = User.objects.create_user(username='timing', password='123')
+        self.staff = User.objects.create_user(username='timingstaff', password='123', is_staff=True)
+
+    def _cabecalho(self, user, medir=True):
+        from django.http import HttpResponse
+        from despesas.middleware import ServerTimingMiddleware
+        from despesas.services import medicao
+
+        def view(request):
+            if medir:
+                medicao.adicionar("sefaz", 12.5)
+            return HttpResponse("ok")
+
+        request = self.factory.get('/importar/NFe/1/status/')
+        request.user = user
+        return ServerTimingMiddleware(view)(request).get("Server-Timing")
+
+    def test_cabecalho_so_para_staff_ou_com_a_flag(self):
+        """
+        Valida:
+            - Com `NFE_SERVER_TIMING` desligado, anônimos e usuários comuns não recebem o cabeçalho.
+            - Usuários staff recebem o cabeçalho mesmo com a flag desligada.
+            - Com a flag ligada, qualquer requisição medida recebe o cabeçalho.
+            - Requisições sem etapas medidas nunca recebem o cabeçalho.
+        """
+        with self.settings(NFE_SERVER_TIMING=False):
+            self.assertIsNone(self._cabecalho(self.anonimo))
+            self.assertIsNone(self._cabecalho(self.comum))
+            self.assertIn("sefaz;dur=12.5", self._cabecalho(self.staff))
+        with self.settings(NFE_SERVER_TIMING=True):
+            self.assertIn("sefaz;dur=12.5", self._cabecalho(self.anonimo))
+            self.assertIsNone(self._cabecalho(self.staff, medir=False))
+
+    def test_padrao_acompanha_debug(self):
+        """
+        Valida:
+            - Sem a variável `NFE_SERVER_TIMING`, o cabeçalho fica ligado só com DEBUG.
+
+        Contexto:
+            - O valor é lido na carga do settings, então cada caso roda em um processo novo.
+        """
+        import os
+        import subprocess
+        import sys
+        from django.conf import settings
+        for debug, esperado in (("True", "True"), ("False", "False")):
+            ambiente = {k: v for k, v in os.environ.items() if k != "NFE_SERVER_TIMING"}
+            ambiente["DEBUG"] = debug
+            saida = subprocess.run(
+                [sys.executable, "-c", "import financas.settings as s; print(s.NFE_SERVER_TIMING)"],
+                cwd=settings.BASE_DIR, env=ambiente, capture_output=True, text=True, check=True,
+            )
+            self.assertEqual(saida.stdout.strip(), esperado)
+
+class TestImportacaoLote(TestCase):
+    """
+    Testes da importação de várias notas em um único envio.
+
+    O pool de processos é substituído por threads e a extração por uma função falsa,
+    validando a criação do lote, a expansão de ZIPs e o registro da vazão.
+    """
+    def setUp(self):
+        """Autentica o usuário e isola os uploads em um diretório temporário."""
+        import tempfile
+        self.user = User.objects.create_user(username='loteuser', password='password')
+        Usuario.objects.create(user=self.user, renda_fixa=5000)
+        self.client.force_login(self.user)
+        self.media = self.settings(MEDIA_ROOT=tempfile.mkdtemp())
+        self.media.enable()
+
+    def tearDown(self):
+        self.media.disable()
+
+    def _zip(self, arquivos):
+        import io, zipfile
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, "w") as zf:
+            for nome, conteudo in arquivos.items():
+                zf.writestr(nome, conteudo)
+        return SimpleUploadedFile("notas.zip", buffer.getvalue(), content_type="application/zip")
+
+    def test_limites_do_zip(self):
+        """
+        Valida que as recusas do ZIP informam o limite que foi de fato aplicado.
+
+        Valida:
+            - Conteúdo descompactado acima de `NFE_LOTE_TAMANHO_MAXIMO_ZIP` cita esse limite.
+            - Nota acima de `NFE_UPLOAD_TAMANHO_MAXIMO` cita o limite por nota.
+        """
+        from django import forms
+        from despesas.forms.leitura_nf import EXTENSOES_NOTA, expandir_zip
+        with self.settings(NFE_LOTE_TAMANHO_MAXIMO_ZIP=2048, NFE_UPLOAD_TAMANHO_MAXIMO=4 * 1024 * 1024):
+            with self.assertRaisesMessage(forms.ValidationError, "limite de 2 KB descompactado"):
+                expandir_zip(self._zip({"nota1.jpg": b"x" * 1500, "nota2.jpg": b"x" * 1500}), EXTENSOES_NOTA)
+        with self.settings(NFE_LOTE_TAMANHO_MAXIMO_ZIP=4 * 1024 * 1024, NFE_UPLOAD_TAMANHO_MAXIMO=1024):
+            with self.assertRaisesMessage(forms.ValidationError, "nota1.jpg: o arquivo é grande demais (limite de 1 KB por nota)"):
+                expandir_zip(self._zip({"nota1.jpg": b"x" * 1500}), EXTENSOES_NOTA)
+
+    def test_upload_zip_e_processamento_paralelo(self):
+        """
+        Valida o fluxo completo de um lote enviado como ZIP.
+
+        Contexto:
+            - ZIP com uma foto, um PDF e um arquivo irrelevante (.txt).
+
+        Valida:
+            - Lote com 2 jobs (o .txt é ignorado).
+            - Todos os jobs concluídos e a vazão calculada ao final.
+            - A página de revisão lista os emitentes extraídos.
+        """
+        from concurrent.futures import ThreadPoolExecutor
+        from despesas.models import LoteImportacaoNFe
+        from despesas.services.importacao_nfe import executar_lote
+
+        arquivo = self._zip({"nota1.jpg": b"foto", "nota2.pdf": b"%PDF", "leia-me.txt": b"x"})
+        with patch('despesas.views.nfe.task_processar_lote_nfe'):
+            response = self.client.post('/importar/NFe/lote/', {"arquivos": [arquivo]})
+        lote = LoteImportacaoNFe.objects.get(user=self.user)
+        self.assertRedirects(response, f'/importar/NFe/lote/{lote.pk}/', fetch_redirect_response=False)
+        self.assertEqual(lote.total_arquivos, 2)
+
+        def extrair_falso(caminho, content_type, nome):
+            return {"emitente": f"Loja {nome}", "valor_total": 10.0, "itens": []}, None
+
+        with ThreadPoolExecutor(max_workers=2) as pool, \
+             patch('despesas.processamento_paralelo.obter_pool', return_value=pool), \
+             patch('despesas.processamento_paralelo.processar_arquivo_em_processo', side_effect=extrair_falso):
+            executar_lote(lote.pk)
+
+        lote.refresh_from_db()
+        self.assertEqual(lote.importacoes.filter(status=StatusImportacao.CONCLUIDA).count(), 2)
+        self.assertIsNotNone(lote.duracao_segundos)
+        response = self.client.get(f'/importar/NFe/lote/{lote.pk}/')
+        self.assertContains(response, "Loja nota1.jpg")
+        self.assertContains(response, "Loja nota2.pdf")
+
+    def test_lote_em_storage_remoto(self):
+        """
+        Valida o lote com um storage sem caminho local (ex.: S3).
+
+        Valida:
+            - Cada processo recebe uma cópia temporária em disco com o conteúdo enviado.
+            - As cópias são removidas ao fim do lote.
+        """
+        import os
+        from concurrent.futures import ThreadPoolExecutor
+        from django.core.files.storage import InMemoryStorage
+        from despesas.models import ImportacaoNFe, LoteImportacaoNFe
+        from despesas.services.importacao_nfe import executar_lote
+
+        lidos = {}
+
+        def extrair_falso(caminho, content_type, nome):
+            with open(caminho, "rb") as arquivo:
+                lidos[caminho] = arquivo.read()
+            return {"emitente": f"Loja {nome}", "valor_total": 10.0, "itens": []}, None
+
+        with patch.object(ImportacaoNFe._meta.get_field("arquivo"), "storage", InMemoryStorage()):
+            with patch('despesas.views.nfe.task_processar_lote_nfe'):
+                self.client.post('/importar/NFe/lote/', {"arquivos": [self._zip({"nota1.jpg": b"foto", "nota2.pdf": b"%PDF"})]})
+            lote = LoteImportacaoNFe.objects.get(user=self.user)
+            with ThreadPoolExecutor(max_workers=2) as pool, \
+                 patch('despesas.processamento_paralelo.obter_pool', return_value=pool), \
+                 patch('despesas.processamento_paralelo.processar_arquivo_em_processo', side_effect=extrair_falso):
+                executar_lote(lote.pk)
+
+        self.assertEqual(lote.importacoes.filter(status=StatusImportacao.CONCLUIDA).count(), 2)
+        self.assertEqual(sorted(lidos.values()), [b"%PDF", b"foto"])
+        self.assertFalse(any(os.path.exists(caminho) for caminho in lidos))
+
+    def test_cancelamento_e_lote_interrompido(self):
+        """
+        Valida o cancelamento do lote e o encerramento de um lote cujo pool morreu.
+
+        Valida:
+            - O lote cancelado não processa nenhum arquivo e deixa de aparecer em andamento.
+            - Jobs parados além de `NFE_IMPORTACAO_PRAZO` são marcados com erro ao abrir o lote.
+        """
+        from datetime import timedelta
+        from django.utils import timezone
+        from despesas.models import LoteImportacaoNFe
+        from despesas.services.importacao_nfe import executar_lote
+
+        with patch('despesas.views.nfe.task_processar_lote_nfe'):
+            self.client.post('/importar/NFe/lote/', {"arquivos": [self._zip({"nota1.jpg": b"foto", "nota2.pdf": b"%PDF"})]})
+        lote = LoteImportacaoNFe.objects.get(user=self.user)
+        response = self.client.post(f'/importar/NFe/lote/{lote.pk}/cancelar/')
+        self.assertRedirects(response, f'/importar/NFe/lote/{lote.pk}/', fetch_redirect_response=False)
+        with patch('despesas.processamento_paralelo.processar_arquivo_em_processo') as mock_extrair:
+            executar_lote(lote.pk)
+            mock_extrair.assert_not_called()
+        self.assertEqual(lote.importacoes.filter(status=StatusImportacao.CANCELADA).count(), 2)
+        self.assertNotContains(self.client.get(f'/importar/NFe/lote/{lote.pk}/'), "Cancelar lote")
+
+        with patch('despesas.views.nfe.task_processar_lote_nfe'):
+            self.client.post('/importar/NFe/lote/', {"arquivos": [self._zip({"nota3.jpg": b"outra"})]})
+        parado = LoteImportacaoNFe.objects.filter(user=self.user).latest("pk")
+        parado.importacoes.update(status=StatusImportacao.PROCESSANDO, atualizado_em=timezone.now() - timedelta(hours=1))
+        LoteImportacaoNFe.objects.filter(pk=parado.pk).update(iniciado_em=timezone.now() - timedelta(hours=1))
+        response = self.client.get(f'/importar/NFe/lote/{parado.pk}/')
+        self.assertNotContains(response, "Processando...")
+        self.assertEqual(parado.importacoes.get().status, StatusImportacao.ERRO)
+        parado.refresh_from_db()
+        self.assertIsNotNone(parado.concluido_em)
+
+    def test_rejeita_tipo_invalido(self):
+        """Valida que arquivos fora dos tipos aceitos são rejeitados no formulário."""
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        arquivo = SimpleUploadedFile("planilha.xlsx", b"x", content_type="application/vnd.ms-excel")
+        response = self.client.post('/importar/NFe/lote/', {"arquivos": [arquivo]})
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(ImportacaoNFe.objects.filter(user=self.user).exists())
+
+
+class TestCacheNotaSefaz(TestCase):
+    """
+    Testes do cache da página da SEFAZ indexado pela chave de acesso.
+
+    Valida que reimportações da mesma nota não repetem a requisição nem o parsing.
+    """
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        self.service = NFeService()
+
+    def test_extrair_chave_acesso(self):
+        """Valida a extração da chave de 44 dígitos das URLs de QR Code (v1 e v2)."""
+        from despesas.services.chave_acesso import extrair_chave_acesso
+        self.assertEqual(extrair_chave_acesso(URL_NFCE_EXEMPLO), CHAVE_EXEMPLO)
+        self.assertEqual(extrair_chave_acesso(f"https://nfce.sefaz.pe.gov.br/nfce?chNFe={CHAVE_EXEMPLO}&nVersao=100"), CHAVE_EXEMPLO)
+        self.assertIsNone(extrair_chave_acesso("https://www.sefaz.rs.gov.br/sem-chave"))
+
+    def test_reimportacao_usa_cache(self):
+        """
+        Valida que a segunda extração da mesma nota não acessa a rede.
+
+        Valida:
+            - Uma única chamada HTTP para duas extrações.
+            - Os dados retornados do cache são iguais aos da primeira extração.
+        """
+        resposta = MagicMock(status_code=200, text=HTML_NFCE_EXEMPLO)
+        with patch('despesas.services.nfe_service.obter_cliente') as mock_cliente:
+            mock_cliente.return_value.get.return_value = resposta
+            primeira = self.service.extrair_dados_url(URL_NFCE_EXEMPLO)
+            segunda = self.service.extrair_dados_url(URL_NFCE_EXEMPLO)
+        self.assertEqual(mock_cliente.return_value.get.call_count, 1)
+        self.assertEqual(primeira, segunda)
+        self.assertEqual(primeira["emitente"], "MERCADO TESTE LTDA")
+        self.assertEqual(primeira["valor_total"], 21.0)
+        self.assertEqual(len(primeira["itens"]), 2)
+
+
+class TestClienteHTTPSefaz(TestCase):
+    """
+    Testes do cliente HTTP compartilhado das consultas à SEFAZ.
+
+    Usa um servidor HTTP local com keep-alive para validar retry e reuso de conexões.
+    """
+    def setUp(self):
+        """Sobe um servidor local que falha com 503 na primeira requisição."""
+        import threading
+        import time
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        self.chamadas = 0
+        teste = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                teste.chamadas += 1
+                if self.path == "/lenta":
+                    time.sleep(1)
+                status = 503 if teste.chamadas == 1 else 200
+                corpo = b"ok"
+                self.send_response(status)
+                self.send_header("Content-Length", str(len(corpo)))
+                self.end_headers()
+                self.wfile.write(corpo)
+
+            def log_message(self, *args):
+                pass
+
+        self.servidor = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=self.servidor.serve_forever, daemon=True).start()
+        self.url = f"http://127.0.0.1:{self.servidor.server_address[1]}/nfce"
+
+    def tearDown(self):
+        self.servidor.shutdown()
+        self.servidor.server_close()
+
+    def test_retry_e_reuso_de_conexao(self):
+        """
+        Valida a repetição em 5xx e o reaproveitamento da conexão keep-alive.
+
+        Valida:
+            - A primeira chamada recebe 200 após uma nova tentativa (503 → 200).
+            - Três chamadas (quatro tentativas) abrem uma única conexão TCP.
+        """
+        from despesas.services.http_sefaz import ClienteHTTPSefaz
+        cliente = ClienteHTTPSefaz(tentativas=2, backoff=0)
+        for _ in range(3):
+            self.assertEqual(cliente.get(self.url).status_code, 200)
+        self.assertEqual(self.chamadas, 4)
+        metricas = cliente.metricas()["127.0.0.1"]
+        self.assertEqual(metricas["requisicoes"], 3)
+        self.assertEqual(metricas["tentativas"], 4)
+        self.assertEqual(metricas["conexoes_novas"], 1)
+        self.assertEqual(metricas["reuso"], 3)
+
+    def test_timeout_de_leitura_nao_repetido(self):
+        """
+        Valida que uma resposta lenta não é repetida nem passa do prazo total.
+
+        Valida:
+            - O ReadTimeout é propagado após uma única tentativa.
+            - A chamada termina dentro do prazo total configurado.
+        """
+        import time
+        import requests
+        from despesas.services.http_sefaz import ClienteHTTPSefaz
+        cliente = ClienteHTTPSefaz(tentativas=2, backoff=0, timeout_leitura=5, prazo_total=0.3)
+        inicio = time.monotonic()
+        with self.assertRaises(requests.Timeout):
+            cliente.get(self.url.replace("/nfce", "/lenta"))
+        self.assertLess(time.monotonic() - inicio, 1)
+        self.assertEqual(self.chamadas, 1)
+        self.assertEqual(cliente.metricas()["127.0.0.1"]["erros"], 1)
+
+    def test_espera_pela_vaga_conta_no_prazo(self):
+        """
+        Valida que a fila do host fica sob o prazo total, e não sob o timeout de leitura.
+
+        Valida:
+            - Uma vaga liberada depois do timeout de leitura, mas dentro do prazo, é aproveitada.
+            - Sem vaga, a chamada desiste ao fim do prazo total.
+        """
+        import threading
+        import time
+        import requests
+        from despesas.services.http_sefaz import ClienteHTTPSefaz
+        cliente = ClienteHTTPSefaz(simultaneas_por_host=1, backoff=0, timeout_leitura=0.05, prazo_total=1)
+        vaga = cliente._semaforo("127.0.0.1")
+        vaga.acquire()
+        threading.Timer(0.2, vaga.release).start()
+        self.assertEqual(cliente.get(self.url).status_code, 200)
+
+        cliente.prazo_total = 0.3
+        vaga.acquire()
+        inicio = time.monotonic()
+        with self.assertRaises(requests.ConnectionError):
+            cliente.get(self.url)
+        self.assertGreaterEqual(time.monotonic() - inicio, 0.3)
+        vaga.release()
+
+
+class TestExtracaoHTMLSefaz(TestCase):
+    """
+    Testes do extrator lxml das páginas da SEFAZ.
+
+    Garante que o extrator rápido mantém o mesmo contrato do caminho BeautifulSoup.
+    """
+    def setUp(self):
+        self.service = NFeService()
+
+    def test_mesmo_resultado_que_bs4(self):
+        """
+        Compara os dois extratores na página de exemplo e em uma nota sintética de 150 itens.
+
+        Valida:
+            - Os dicionários retornados são idênticos.
+            - Os totais e o pagamento da página de exemplo são extraídos.
+        """
+        from despesas.management.commands.benchmark_nfe import gerar_html_nfce
+        from despesas.services import sefaz_html
+        for html in (HTML_NFCE_EXEMPLO, gerar_html_nfce(150)):
+            self.assertEqual(sefaz_html.extrair_dados(html, self.service), self.service.extrair_dados_html_bs4(html))
+        dados = self.service.extrair_dados_html(HTML_NFCE_EXEMPLO)
+        self.assertEqual(dados["valor_total"], 21.0)
+        self.assertEqual(dados["forma_pagamento_key"], FormaPagamento.DEBITO)
+        self.assertEqual(len(dados["itens"]), 2)
+
+    def test_fallback_bs4(self):
+        """Valida que uma falha no extrator lxml recorre ao BeautifulSoup."""
+        with patch('despesas.services.sefaz_html.extrair_dados', side_effect=ValueError("falha")):
+            dados = self.service.extrair_dados_html(HTML_NFCE_EXEMPLO)
+        self.assertEqual(dados["emitente"], "MERCADO TESTE LTDA")
+
+    def test_fallback_e_metricas_por_host(self):
+        """
+        Recorre ao genérico quando o extrator lxml não encontra a nota e mede cada host.
+
+        Valida:
+            - Uma página sem itens nem total no extrator lxml cai no genérico.
+            - A leitura não grava no banco; os contadores do processo são descarregados em lote.
+            - As métricas, por host e parser, registram a falha e os sucessos.
+        """
+        from despesas.models import MetricaParserSefaz
+        from despesas.services import parsers_sefaz
+        parsers_sefaz.descarregar_metricas()
+        MetricaParserSefaz.objects.all().delete()
+
+        vazio = {"emitente": "Consumidor", "itens": [], "valor_total": 0.0}
+        with self.settings(NFE_PARSER_METRICAS_INTERVALO=3600), self.assertNumQueries(0):
+            with patch('despesas.services.sefaz_html.extrair_dados', return_value=vazio):
+                dados = self.service.extrair_dados_html(HTML_NFCE_EXEMPLO, "www.nfce.teste.gov.br")
+            self.service.extrair_dados_html(HTML_NFCE_EXEMPLO, "www.sefaz.rs.gov.br")
+            self.service.extrair_dados_html(HTML_NFCE_EXEMPLO, "www.sefaz.rs.gov.br")
+        self.assertEqual(dados["emitente"], "MERCADO TESTE LTDA")
+        self.assertEqual(len(dados["itens"]), 2)
+
+        metricas = parsers_sefaz.metricas()
+        self.assertEqual(metricas["www.nfce.teste.gov.br"]["portal_nfce"]["falhas"], 1)
+        self.assertEqual(metricas["www.nfce.teste.gov.br"]["generico"]["sucessos"], 1)
+        self.assertEqual(metricas["www.sefaz.rs.gov.br"]["portal_nfce"]["sucessos"], 2)
+        self.assertNotIn("generico", metricas["www.sefaz.rs.gov.br"])
+
+        self.service.extrair_dados_html(HTML_NFCE_EXEMPLO, "www.sefaz.rs.gov.br")
+        parsers_sefaz.descarregar_metricas()
+        self.assertEqual(MetricaParserSefaz.objects.get(host="www.sefaz.rs.gov.br", parser="portal_nfce").chamadas, 3)
+
+        import io
+        import json
+        from django.core.management import call_command
+        saida = io.StringIO()
+        call_command("metricas_sefaz", json=True, stdout=saida)
+        relatorio = json.loads(saida.getvalue())
+        self.assertEqual(relatorio["parsers"], parsers_sefaz.metricas())
+        self.assertEqual(relatorio["circuitos"]["www.sefaz.rs.gov.br"]["estado"], "fechado")
+
+
+class TestBenchmarkCorpus(TestCase):
+    """
+    Testes do corpus versionado e do comando `benchmark_corpus_nfe`.
+    """
+    def test_resultado_em_json(self):
+        """
+        Mede as etapas rápidas sobre o corpus versionado.
+
+        Valida:
+            - Todos os arquivos do manifesto existem.
+            - O JSON traz o tempo de cada página HTML e da categorização, com os resultados conferidos.
+            - A etapa HTML mede o parser direto, sem gravar nas métricas de produção dos parsers.
+        """
+        import json
+        import tempfile
+        from pathlib import Path
+        from django.core.management import call_command
+        from despesas.management.commands.benchmark_corpus_nfe import CORPUS_PADRAO
+
+        manifesto = json.loads((CORPUS_PADRAO / "manifesto.json").read_text(encoding="utf-8"))
+        for entrada in manifesto["html"] + manifesto["pdf"] + manifesto["fotos"]:
+            self.assertTrue((CORPUS_PADRAO / entrada["arquivo"]).is_file(), entrada["arquivo"])
+
+        with tempfile.TemporaryDirectory() as pasta:
+            saida = Path(pasta) / "resultado.json"
+            with patch('despesas.services.parsers_sefaz._registrar_metrica') as mock_metrica:
+                call_command("benchmark_corpus_nfe", etapas=["html", "categoria"], repeticoes=1, saida=str(saida), stdout=MagicMock())
+            mock_metrica.assert_not_called()
+            relatorio = json.loads(saida.read_text(encoding="utf-8"))
+        etapas = [r["etapa"] for r in relatorio["resultados"]]
+        self.assertEqual(etapas.count("html"), len(manifesto["html"]))
+        self.assertEqual(etapas.count("categoria"), 1)
+        self.assertTrue(all(r["ok"] and r["mediana_ms"] > 0 for r in relatorio["resultados"]))
+
+
+class TestDanfePDF(TestCase):
+    """
+    Testes do processamento de DANFE em PDF em passagem única.
+    """
+    def test_passagem_unica(self):
+        """
+        Processa um DANFE de três páginas sem tabelas.
+
+        Valida:
+            - O PDF é aberto uma única vez.
+            - Cabeçalho (emitente, CNPJ da chave, data e valor total) e itens de todas as páginas.
+        """
+        import pdfplumber
+        from io import BytesIO
+        from despesas.management.commands.benchmark_nfe import gerar_pdf_danfe
+        pdf = BytesIO(gerar_pdf_danfe(130))
+        with patch('pdfplumber.open', wraps=pdfplumber.open) as mock_open:
+            dados = NFeService().processar_danfe_pdf(pdf)
+        self.assertEqual(mock_open.call_count, 1)
+        self.assertEqual(dados["emitente"], "MERCADO PDF LTDA")
+        self.assertEqual(dados["cnpj"], "06.990.590/0001-23")
+        self.assertEqual(dados["data_emissao"].isoformat(), "2026-01-10")
+        self.assertEqual(dados["valor_total"], 21.0)
+        self.assertEqual(len(dados["itens"]), 130)
+        self.assertEqual(dados["itens"][-1]["vl_total"], 10.0)
+
+    def test_paginas_em_paralelo(self):
+        """
+        Processa o mesmo DANFE com as páginas divididas entre o pool.
+
+        Contexto:
+            - Pool substituído por threads, limiar de 2 páginas e 2 processos.
+
+        Valida:
+            - Cada processo recebe uma faixa contígua de páginas.
+            - Itens em ordem e cabeçalho idênticos à leitura sequencial.
+        """
+        from concurrent.futures import ThreadPoolExecutor
+        from io import BytesIO
+        from despesas.management.commands.benchmark_nfe import gerar_pdf_danfe
+        from despesas.processamento_paralelo import extrair_paginas_pdf_em_processo
+        conteudo = gerar_pdf_danfe(130)
+        with self.settings(NFE_PDF_PAGINAS_PARALELO=0):
+            sequencial = NFeService().processar_danfe_pdf(BytesIO(conteudo))
+
+        with self.settings(NFE_PDF_PAGINAS_PARALELO=2, NFE_PROCESSOS=2), ThreadPoolExecutor(max_workers=2) as pool, \
+             patch('despesas.processamento_paralelo.obter_pool', return_value=pool), \
+             patch('despesas.processamento_paralelo.extrair_paginas_pdf_em_processo', wraps=extrair_paginas_pdf_em_processo) as mock_faixa:
+            paralelo = NFeService().processar_danfe_pdf(BytesIO(conteudo))
+        self.assertEqual([c.args[1:] for c in mock_faixa.call_args_list], [(0, 2), (2, 3)])
+        self.assertEqual(paralelo, sequencial)
+
+
+class TestImportacaoXML(TestCase):
+    """
+    Testes da importação pelo XML autorizado da NF-e (procNFe).
+    """
+    def test_extrai_itens_totais_e_pagamento(self):
+        """
+        Valida a leitura em streaming de um procNFe com 3000 itens.
+
+        Valida:
+            - Emitente, CNPJ, data, totais, desconto e tributos exatos.
+            - Pagamento no crédito (tPag 03) com três duplicatas.
+            - Todos os itens com quantidade, unidade e valores.
+        """
+        from io import BytesIO
+        from despesas.management.commands.benchmark_nfe import gerar_xml_nfe
+        dados = NFeService().processar_nfe_xml(BytesIO(gerar_xml_nfe(3000)))
+        self.assertEqual(dados["emitente"], "LOJA VIRTUAL XML LTDA")
+        self.assertEqual(dados["cnpj"], "06.990.590/0001-23")
+        self.assertEqual(dados["data_emissao"].isoformat(), "2026-01-10")
+        self.assertEqual(dados["valor_total"], 29995.0)
+        self.assertEqual(dados["desconto"], 5.0)
+        self.assertEqual(dados["valor_tributos"], 4500.0)
+        self.assertEqual(dados["forma_pagamento_key"], FormaPagamento.CREDITO)
+        self.assertEqual(dados["parcelas"], 3)
+        self.assertEqual(len(dados["itens"]), 3000)
+        self.assertEqual(
+            dados["itens"][0],
+            {"nome": "PRODUTO XML 1", "qtd": 2.0, "unidade": "UN", "vl_unit": 5.0, "vl_total": 10.0},
+        )
+
+    def test_xml_invalido(self):
+        """Valida que um XML que não é NF-e é rejeitado."""
+        from io import BytesIO
+        with self.assertRaises(ValueError):
+            NFeService().processar_nfe_xml(BytesIO(b"<pedido><item/></pedido>"))
+
+    def test_importar_zip_com_xml(self):
+        """
+        Envia um ZIP com o XML e o PDF da nota pela importação em background.
+
+        Valida:
+            - O XML é escolhido dentro do ZIP.
+            - O rascunho do job concluído traz o emitente e os itens da nota.
+        """
+        import io
+        import tempfile
+        import zipfile
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        from despesas.management.commands.benchmark_nfe import gerar_xml_nfe
+        user = User.objects.create_user(username='xmluser', password='password')
+        Usuario.objects.create(user=user, renda_fixa=5000)
+        self.client.force_login(user)
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, "w") as zf:
+            zf.writestr("danfe.pdf", b"%PDF")
+            zf.writestr("nota.xml", gerar_xml_nfe(2))
+        arquivo = SimpleUploadedFile("nota.zip", buffer.getvalue(), content_type="application/zip")
+        with self.settings(MEDIA_ROOT=tempfile.mkdtemp()):
+            with patch('despesas.views.nfe.task_processar_importacao_nfe'):
+                job = self.client.post('/importar/NFe/', {"imagem": arquivo}, HTTP_X_REQUESTED_WITH='XMLHttpRequest').json()
+            self.assertEqual(ImportacaoNFe.objects.get(pk=job["id"]).nome_arquivo, "nota.xml")
+            executar_importacao(job["id"])
+        dados = self.client.get(job["status_url"]).json()
+        self.assertEqual(dados["status"], StatusImportacao.CONCLUIDA)
+        self.assertIn("LOJA VIRTUAL XML LTDA", dados["html"])
+        self.assertIn("PRODUTO XML 2", dados["html"])
+
+
+class TestCategorizacaoEmitente(TestCase):
+    """
+    Testes do matcher de palavras-chave de estabelecimentos.
+    """
+    def test_palavras_inteiras_e_prioridade(self):
+        """
+        Valida os casos em que a busca por substring errava.
+
+        Valida:
+            - Palavras-chave curtas não casam dentro de outras ("bar" em "barbearia", "ale" em "alegre").
+            - Acentos e plurais são ignorados na comparação.
+            - O termo mais específico vence ("mercado livre", "clinica veterinaria").
+            - Sem termo, nenhuma sugestão.
+        """
+        from despesas.services.categorizacao import sugerir_categoria
+        casos = {
+            "BARBEARIA DOS AMIGOS": "Serviços",
+            "UNIMED PORTO ALEGRE": "Saúde",
+            "ALE COMBUSTIVEIS S.A.": "Transporte",
+            "FARMÁCIAS SÃO JOÃO S.A.": "Farmácia",
+            "WMS SUPERMERCADOS DO BRASIL LTDA": "Mercado",
+            "MERCADO LIVRE - EBAZAR.COM.BR LTDA": "Eletrônicos",
+            "CLINICA VETERINARIA AMIGO FIEL": "Pet Shop",
+            "HABIB'S PORTO ALEGRE": "Alimentação",
+            "C&A MODAS S.A.": "Vestuário",
+            "KANGURU BRINQUEDOS LTDA": None,
+        }
+        for nome, esperado in casos.items():
+            self.assertEqual(sugerir_categoria(nome), esperado, nome)
+
+
+class TestIndiceCategoriaEmitente(TestCase):
+    """
+    Testes do índice emitente -> categoria mantido pelos signals de Despesa.
+    """
+    def setUp(self):
+        self.user = User.objects.create_user(username='indice', password='123')
+        self.lazer = Categoria.objects.get(user=self.user, nome="Lazer")
+        self.casa = Categoria.objects.get(user=self.user, nome="Casa")
+        self.service = NFeService()
+
+    def _despesa(self, categoria, data, nome="Kanguru Brinquedos", cnpj=None):
+        return Despesa.objects.create(
+            user=self.user, emitente_nome=nome, emitente_cnpj=cnpj, categoria=categoria,
+            valor=Decimal('10.00'), forma_pagamento=FormaPagamento.DINHEIRO, data=data,
+        )
+
+    def test_atualizacao_incremental(self):
+        """
+        Valida:
+            - Inclusão, troca de categoria e exclusão ajustam contagens, última e mais frequente.
+            - Variações de caixa/acentos do nome caem na mesma chave.
+            - O CNPJ tem precedência sobre o nome na consulta.
+        """
+        from despesas.models import CategoriaEmitente
+        hoje = timezone.localdate()
+        self._despesa(self.lazer, hoje - timedelta(days=30))
+        self._despesa(self.lazer, hoje - timedelta(days=20), nome="KANGURU BRINQUEDOS")
+        recente = self._despesa(self.casa, hoje)
+
+        linha = CategoriaEmitente.objects.get(user=self.user, chave="nome:kanguru brinquedos")
+        self.assertEqual(linha.contagens, {str(self.lazer.pk): 2, str(self.casa.pk): 1})
+        self.assertEqual(linha.ultima_categoria_id, self.casa.pk)
+        self.assertEqual(linha.categoria_frequente_id, self.lazer.pk)
+        with self.assertNumQueries(1):
+            self.assertEqual(self.service.identificar_categoria(self.user, "Kanguru Brinquedos"), self.casa.pk)
+
+        recente.categoria = self.lazer
+        recente.save()
+        linha.refresh_from_db()
+        self.assertEqual(linha.contagens, {str(self.lazer.pk): 3})
+        self.assertEqual(linha.ultima_categoria_id, self.lazer.pk)
+
+        self._despesa(self.casa, hoje - timedelta(days=60), nome="Outra Loja", cnpj="06.990.590/0001-23")
+        self.assertEqual(
+            self.service.identificar_categoria(self.user, "Kanguru Brinquedos", "06990590000123"), self.casa.pk
+        )
+
+        Despesa.objects.filter(user=self.user, emitente_nome__icontains="kanguru").delete()
+        self.assertFalse(CategoriaEmitente.objects.filter(user=self.user, chave="nome:kanguru brinquedos").exists())
+
+    def test_exclusao_de_categoria(self):
+        """
+        Valida:
+            - Ao excluir a última categoria usada, a consulta passa à categoria restante.
+        """
+        hoje = timezone.localdate()
+        self._despesa(self.lazer, hoje - timedelta(days=10))
+        self._despesa(self.casa, hoje)
+        self.casa.delete()
+        self.assertEqual(self.service.identificar_categoria(self.user, "Kanguru Brinquedos"), self.lazer.pk)
+
+    def test_um_voto_por_compra(self):
+        """
+        Valida:
+            - Uma compra em 12 parcelas conta uma vez: duas compras à vista em outra categoria vencem.
+            - Uma despesa fixa conta só a primeira recorrência.
+            - A recontagem da migração 0025 chega ao mesmo índice mantido pelos signals.
+            - Excluir todas as parcelas tira exatamente o voto da compra, sem contagens negativas.
+
+        Contexto:
+            - `criar_despesa` grava uma Despesa por parcela e uma por mês das despesas fixas.
+        """
+        from despesas.enums.tipo_despesa_enum import TipoDespesa
+        from despesas.models import CategoriaEmitente
+        hoje = timezone.localdate()
+        for i in range(12):
+            Despesa.objects.create(
+                user=self.user, emitente_nome="Kanguru Brinquedos", categoria=self.casa,
+                valor=Decimal('10.00'), forma_pagamento=FormaPagamento.CREDITO,
+                data=hoje - timedelta(days=90 - 30 * i), parcela_atual=i + 1, total_parcelas=12,
+            )
+        self._despesa(self.lazer, hoje - timedelta(days=100))
+        self._despesa(self.lazer, hoje - timedelta(days=95))
+
+        linha = CategoriaEmitente.objects.get(user=self.user, chave="nome:kanguru brinquedos")
+        self.assertEqual(linha.contagens, {str(self.lazer.pk): 2, str(self.casa.pk): 1})
+        self.assertEqual(linha.categoria_frequente_id, self.lazer.pk)
+
+        for i in range(3):
+            Despesa.objects.create(
+                user=self.user, emitente_nome="Academia", categoria=self.casa, tipo=TipoDespesa.FIXA,
+                valor=Decimal('90.00'), forma_pagamento=FormaPagamento.DINHEIRO,
+                data=hoje + timedelta(days=30 * i), observacoes=f"Plano (Recorrência {i + 1}/3)",
+            )
+        fixa = CategoriaEmitente.objects.get(user=self.user, chave="nome:academia")
+        self.assertEqual(fixa.contagens, {str(self.casa.pk): 1})
+
+        import importlib
+        from django.apps import apps
+        incremental = list(CategoriaEmitente.objects.order_by("chave").values("chave", "contagens", "categoria_frequente_id"))
+        importlib.import_module("despesas.migrations.0025_recontar_categoriaemitente").recontar_indice(apps, None)
+        recontado = list(CategoriaEmitente.objects.order_by("chave").values("chave", "contagens", "categoria_frequente_id"))
+        self.assertEqual(recontado, incremental)
+        linha = CategoriaEmitente.objects.get(user=self.user, chave="nome:kanguru brinquedos")
+
+        Despesa.objects.filter(user=self.user, total_parcelas=12).delete()
+        linha.refresh_from_db()
+        self.assertEqual(linha.contagens, {str(self.lazer.pk): 2})
+        self.assertEqual(linha.ultima_categoria_id, None)
+        self.assertEqual(linha.categoria_frequente_id, self.lazer.pk)
+
+    def test_migracoes_congelam_as_regras_do_indice(self):
+        """
+        Valida:
+            - As cópias congeladas nas migrações de carga do índice geram as mesmas chaves do serviço.
+            - A recontagem (0025) aplica a mesma regra de um voto por compra.
+
+        Contexto:
+            - Migrações não podem importar o serviço: uma mudança nele alteraria dados já migrados.
+        """
+        import importlib
+        from despesas.services import indice_categoria
+        carga = importlib.import_module("despesas.migrations.0021_preencher_categoriaemitente")
+        recontagem = importlib.import_module("despesas.migrations.0025_recontar_categoriaemitente")
+        emitentes = [
+            ("Kanguru Brinquedos", None),
+            ("  D'ÁGUA Café & Cia. ", "06.990.590/0001-23"),
+            ("Posto Ipiranga", "123"),
+            ("X" * 300, "06990590000123"),
+            (None, None),
+        ]
+        for nome, cnpj in emitentes:
+            esperado = indice_categoria.chaves_emitente(nome, cnpj)
+            self.assertEqual(carga.chaves_emitente(nome, cnpj), esperado)
+            self.assertEqual(recontagem.chaves_emitente(nome, cnpj), esperado)
+
+        casos = [(1, None), (2, None), (1, "Plano (Recorrência 1/12)"), (1, "Plano (Recorrência 2/12)"), (None, "")]
+        for parcela, observacoes in casos:
+            self.assertEqual(
+                recontagem.conta_como_compra(parcela, observacoes),
+                indice_categoria.conta_como_compra(parcela, observacoes),
+            )
+
+
+class TestDiretorioEmitentes(TestCase):
+    """
+    Testes do diretório global de emitentes por CNPJ.
+    """
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        self.service = NFeService()
+        self.user = User.objects.create_user(username='diretorio', password='123')
+
+    def test_importacao_alimenta_e_consulta_diretorio(self):
+        """
+        Valida:
+            - A extração da página da SEFAZ registra nome, host e categoria padrão do CNPJ.
+            - Uma nota sem nome do emitente (ex.: DANFE fora do padrão) recebe o nome do diretório.
+            - Arquivos enviados (sem URL da SEFAZ) só consultam: não renomeiam nem criam emitentes.
+            - A categoria padrão do diretório é usada antes das palavras-chave do nome.
+        """
+        from despesas.models import EmitenteCNPJ
+        resposta = MagicMock(status_code=200, text=HTML_NFCE_EXEMPLO)
+        with patch('despesas.services.nfe_service.obter_cliente') as mock_cliente:
+            mock_cliente.return_value.get.return_value = resposta
+            self.service.extrair_dados_url(URL_NFCE_EXEMPLO)
+
+        emitente = EmitenteCNPJ.objects.get(cnpj="06990590000123")
+        self.assertEqual(emitente.nome, "MERCADO TESTE LTDA")
+        self.assertEqual(emitente.host_sefaz, "www.sefaz.rs.gov.br")
+        self.assertEqual(emitente.categoria_padrao, "Mercado")
+        self.assertEqual(emitente.notas_importadas, 1)
+
+        dados = self.service.aplicar_diretorio_emitentes({"emitente": "Consumidor", "cnpj": "06.990.590/0001-23"})
+        self.assertEqual(dados["emitente"], "MERCADO TESTE LTDA")
+        self.service.aplicar_diretorio_emitentes({"emitente": "NOME FORJADO", "cnpj": "06.990.590/0001-23"})
+        self.service.aplicar_diretorio_emitentes({"emitente": "PET SHOP FORJADO", "cnpj": "11.222.333/0001-81"})
+        emitente.refresh_from_db()
+        self.assertEqual((emitente.nome, emitente.notas_importadas), ("MERCADO TESTE LTDA", 1))
+        self.assertFalse(EmitenteCNPJ.objects.filter(cnpj="11222333000181").exists())
+
+        EmitenteCNPJ.objects.filter(pk=emitente.pk).update(categoria_padrao="Pet Shop")
+        pet = Categoria.objects.get(user=self.user, nome="Pet Shop")
+        self.assertEqual(self.service.identificar_categoria(self.user, "MERCADO TESTE LTDA", "06.990.590/0001-23"), pet.pk)
+
+    def test_arquivo_enviado_nao_altera_diretorio(self):
+        """
+        Valida:
+            - Um XML enviado com outro nome para um CNPJ conhecido não renomeia o emitente nem soma notas.
+            - Um XML ou PDF com CNPJ desconhecido não cria emitente no diretório.
+            - Só a consulta na SEFAZ (com URL) grava no diretório.
+
+        Contexto:
+            - O diretório é compartilhado entre usuários; arquivos enviados não são verificados.
+        """
+        from io import BytesIO
+        from despesas.management.commands.benchmark_nfe import gerar_xml_nfe
+        from despesas.models import EmitenteCNPJ
+        resposta = MagicMock(status_code=200, text=HTML_NFCE_EXEMPLO)
+        with patch('despesas.services.nfe_service.obter_cliente') as mock_cliente:
+            mock_cliente.return_value.get.return_value = resposta
+            self.service.extrair_dados_url(URL_NFCE_EXEMPLO)
+        antes = EmitenteCNPJ.objects.values("nome", "host_sefaz", "notas_importadas", "categoria_padrao").get(
+            cnpj="06990590000123"
+        )
+
+        xml = gerar_xml_nfe(2)
+        dados = self.service.processar_nfe_xml(BytesIO(xml.replace(b"LOJA VIRTUAL XML LTDA", b"NOME FORJADO LTDA")))
+        self.assertEqual(dados["emitente"], "NOME FORJADO LTDA")
+        self.service.processar_nfe_xml(BytesIO(xml.replace(b"06990590000123", b"11222333000181")))
+        danfe = {"emitente": "PET SHOP FORJADO", "cnpj": "33.000.167/0001-01", "itens": []}
+        with patch.object(NFeService, '_extrair_danfe_pdf', return_value=danfe):
+            self.service.processar_danfe_pdf(BytesIO(b"%PDF"))
+
+        depois = EmitenteCNPJ.objects.values("nome", "host_sefaz", "notas_importadas", "categoria_padrao").get(
+            cnpj="06990590000123"
+        )
+        self.assertEqual(depois, antes)
+        self.assertEqual(EmitenteCNPJ.objects.count(), 1)
+
+
+class TestChaveAcessoDuplicada(TestCase):
+    """
+    Testes da detecção de notas repetidas pela chave de acesso.
+    """
+    CHAVE_XML = "43260106990590000123550010000012341000012340"
+
+    def setUp(self):
+        import tempfile
+        self.user = User.objects.create_user(username='chaveuser', password='password')
+        Usuario.objects.create(user=self.user, renda_fixa=5000)
+        self.client.force_login(self.user)
+        self.media = self.settings(MEDIA_ROOT=tempfile.mkdtemp())
+        self.media.enable()
+
+    def tearDown(self):
+        self.media.disable()
+
+    def test_validacao_da_chave(self):
+        """Valida o dígito verificador (módulo 11) e a leitura da chave impressa no DANFE."""
+        from despesas.services.chave_acesso import localizar_chave_acesso, validar_chave_acesso
+        self.assertTrue(validar_chave_acesso(CHAVE_EXEMPLO))
+        self.assertFalse(validar_chave_acesso(CHAVE_EXEMPLO[:-1] + "3"))
+        self.assertFalse(validar_chave_acesso("123"))
+        texto = "CHAVE DE ACESSO\n4326 0106 9905 9000 0123 6500 1000 0012 3410 0001 2342\nPROTOCOLO"
+        self.assertEqual(localizar_chave_acesso(texto), CHAVE_EXEMPLO)
+
+    def test_segunda_importacao_volta_para_despesa_existente(self):
+        """
+        Importa o XML de uma nota, lança a despesa parcelada e reenvia a mesma nota.
+
+        Valida:
+            - O rascunho carrega a chave de acesso; só a primeira parcela a grava.
+            - O reenvio responde com a despesa existente sem criar job nem ler o XML.
+            - O formulário recusa lançar a mesma chave outra vez.
+        """
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        from despesas.management.commands.benchmark_nfe import gerar_xml_nfe
+        xml = gerar_xml_nfe(2)
+
+        with patch('despesas.views.nfe.task_processar_importacao_nfe'):
+            job = self.client.post(
+                '/importar/NFe/', {"imagem": SimpleUploadedFile("nota.xml", xml, content_type="text/xml")},
+                HTTP_X_REQUESTED_WITH='XMLHttpRequest',
+            ).json()
+        executar_importacao(job["id"])
+        self.assertIn(self.CHAVE_XML, self.client.get(job["status_url"]).json()["html"])
+
+        dados = {
+            "valor": "29,95", "data": "2026-01-10", "categoria": Categoria.objects.filter(user=self.user).first().pk,
+            "emitente_nome": "LOJA VIRTUAL XML LTDA", "tipo": "VARIAVEL", "forma_pagamento": "CREDITO",
+            "parcelas_selecao": "3", "chave_acesso": self.CHAVE_XML,
+            "itens-TOTAL_FORMS": "0", "itens-INITIAL_FORMS": "0", "itens-MIN_NUM_FORMS": "0", "itens-MAX_NUM_FORMS": "1000",
+        }
+        self.assertTrue(self.client.post('/despesas/criar/', dados).json()["success"])
+        parcelas = Despesa.objects.filter(user=self.user, emitente_nome="LOJA VIRTUAL XML LTDA").order_by("data")
+        self.assertEqual([d.chave_acesso for d in parcelas], [self.CHAVE_XML, None, None])
+
+        with patch('despesas.services.nfe_service.NFeService.processar_nfe_xml') as mock_xml:
+            resposta = self.client.post(
+                '/importar/NFe/', {"imagem": SimpleUploadedFile("copia.xml", xml, content_type="text/xml")},
+                HTTP_X_REQUESTED_WITH='XMLHttpRequest',
+            )
+            mock_xml.assert_not_called()
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(resposta.json()["despesa_existente"], parcelas[0].pk)
+        self.assertIn("já foi lançada", resposta.json()["html"])
+        self.assertEqual(ImportacaoNFe.objects.filter(user=self.user).count(), 1)
+
+        resposta = self.client.post('/despesas/criar/', dados)
+        self.assertEqual(resposta.status_code, 400)
+        self.assertEqual(parcelas.count(), 3)
+
+
+class TestCircuitoSefaz(TestCase):
+    """
+    Testes do circuit breaker por host em torno da consulta à SEFAZ.
+    """
+    def setUp(self):
+        from despesas.services import circuito_sefaz
+        circuito_sefaz._armazenamento().clear()
+        self.service = NFeService()
+
+    def tearDown(self):
+        from despesas.services import circuito_sefaz
+        circuito_sefaz._armazenamento().clear()
+
+    def test_abre_recusa_e_fecha_apos_teste(self):
+        """
+        Valida:
+            - Falhas de rede na janela abrem o circuito; 404 não conta como falha do host.
+            - Com o circuito aberto, a consulta retorna vazio sem requisição.
+            - Após a espera, uma requisição de teste bem-sucedida fecha o circuito.
+        """
+        import requests
+        from despesas.services import circuito_sefaz
+        host = "www.sefaz.rs.gov.br"
+        nao_encontrada = MagicMock(status_code=404)
+        nao_encontrada.raise_for_status.side_effect = requests.HTTPError(response=nao_encontrada)
+
+        with self.settings(NFE_CIRCUITO_MIN_REQUISICOES=3), \
+             patch('despesas.services.nfe_service.obter_cliente') as mock_cliente:
+            mock_cliente.return_value.get.return_value = nao_encontrada
+            self.assertEqual(self.service.extrair_dados_url(URL_NFCE_EXEMPLO), {})
+            self.assertEqual(circuito_sefaz.contadores(host), (1, 0))
+
+            mock_cliente.return_value.get.side_effect = requests.ConnectionError("timeout")
+            for _ in range(3):
+                self.service.extrair_dados_url(URL_NFCE_EXEMPLO)
+            self.assertEqual(circuito_sefaz.estado(host), circuito_sefaz.ABERTO)
+            chamadas = mock_cliente.return_value.get.call_count
+            with self.assertLogs('despesas.services.nfe_service', level='WARNING'):
+                self.assertEqual(self.service.extrair_dados_url(URL_NFCE_EXEMPLO), {})
+            self.assertEqual(mock_cliente.return_value.get.call_count, chamadas)
+
+            circuito_sefaz._armazenamento().delete(f"nfe:circuito:{host}:aberto")
+            self.assertEqual(circuito_sefaz.estado(host), circuito_sefaz.MEIO_ABERTO)
+            self.assertTrue(circuito_sefaz.permitir(host))
+            self.assertFalse(circuito_sefaz.permitir(host))
+            circuito_sefaz.registrar(host, True, 0.2)
+        self.assertEqual(circuito_sefaz.estado(host), circuito_sefaz.FECHADO)
+        self.assertEqual(circuito_sefaz.contadores(host), (0, 0))
+
+    def test_armazenamento_e_validade_das_chaves(self):
+        """
+        Valida:
+            - Sem Redis (cache de banco), os contadores ficam no próprio processo.
+            - Todas as chaves do circuito aberto expiram, inclusive a do meio aberto.
+            - A sonda vale pelo pior caso da consulta (`NFE_HTTP_PRAZO_TOTAL`, com novas tentativas).
+        """
+        from django.core.cache import cache
+        from despesas.services import circuito_sefaz
+        host = "www.sefaz.rs.gov.br"
+        armazenamento = circuito_sefaz._armazenamento()
+        self.assertIs(armazenamento, circuito_sefaz._LOCAL)
+
+        with self.settings(NFE_CIRCUITO_MIN_REQUISICOES=2, NFE_HTTP_PRAZO_TOTAL=40), \
+             patch.object(armazenamento, 'set', wraps=armazenamento.set) as mock_set, \
+             patch.object(armazenamento, 'add', wraps=armazenamento.add) as mock_add:
+            for _ in range(2):
+                circuito_sefaz.registrar(host, False, 0.1)
+            self.assertEqual(circuito_sefaz.estado(host), circuito_sefaz.ABERTO)
+            self.assertTrue(all(c.args[2] is not None for c in mock_set.call_args_list))
+            self.assertIsNone(cache.get(f"nfe:circuito:{host}:aberto"))
+
+            armazenamento.delete(f"nfe:circuito:{host}:aberto")
+            self.assertTrue(circuito_sefaz.permitir(host))
+            self.assertGreaterEqual(mock_add.call_args.args[2], 40)
@@ -0,0 +1,146 @@
+import logging
+import mmap
+import os
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.files.uploadhandler import FileUploadHandler, SkipFile
+
+logger = logging.getLogger(__name__)
+
+
+def descrever_tamanho(tamanho: int) -> str:
+    """Tamanho em bytes para mensagens ao usuário (ex.: "25 MB", "512 KB")."""
+    if tamanho >= 1024 * 1024:
+        return f"{tamanho / (1024 * 1024):g} MB"
+    return f"{max(1, tamanho // 1024)} KB"
+
+
+def limite_upload(nome: str, content_type: str | None = None) -> int:
+    """Tamanho máximo aceito para um arquivo: `NFE_LOTE_TAMANHO_MAXIMO_ZIP` para ZIPs, senão `NFE_UPLOAD_TAMANHO_MAXIMO`."""
+    if (content_type or "").lower() in ("application/zip", "application/x-zip-compressed") or (nome or "").lower().endswith(".zip"):
+        return settings.NFE_LOTE_TAMANHO_MAXIMO_ZIP
+    return settings.NFE_UPLOAD_TAMANHO_MAXIMO
+
+
+class LimiteTamanhoUploadHandler(FileUploadHandler):
+    """
+    Recusa arquivos acima do limite enquanto o corpo da requisição é lido.
+
+    Fica antes do `TemporaryFileUploadHandler` em `FILE_UPLOAD_HANDLERS`: conta os bytes
+    de cada bloco e, ao passar do limite (ou se o Content-Length do arquivo já o excede),
+    descarta o arquivo sem gravar o restante. Os recusados ficam em
+    `request.uploads_recusados`, como (nome, limite aplicado), para que o formulário
+    explique o erro com o limite que de fato valeu.
+    """
+
+    def new_file(self, field_name, file_name, content_type, content_length, charset=None, content_type_extra=None):
+        super().new_file(field_name, file_name, content_type, content_length, charset, content_type_extra)
+        self.recebidos = 0
+        self.limite = limite_upload(file_name, content_type)
+        if content_length and content_length > self.limite:
+            self._recusar()
+
+    def receive_data_chunk(self, raw_data, start):
+        self.recebidos += len(raw_data)
+        if self.recebidos > self.limite:
+            self._recusar()
+        return raw_data
+
+    def file_complete(self, file_size):
+        return None
+
+    def _recusar(self):
+        logger.warning(f"Upload {self.file_name} recusado: acima de {descrever_tamanho(self.limite)}.")
+        if self.request is not None:
+            if not hasattr(self.request, "uploads_recusados"):
+                self.request.uploads_recusados = []
+            self.request.uploads_recusados.append((self.file_name, self.limite))
+        raise SkipFile()
+
+
+def caminho_local(arquivo) -> str | None:
+    """
+    Caminho em disco do arquivo, quando existe um.
+
+    Cobre uploads já gravados em arquivo temporário (`TemporaryUploadedFile`), arquivos
+    do `FileSystemStorage` e arquivos abertos com `open()`.
+
+    Returns:
+        str | None: Caminho do arquivo ou None para conteúdo em memória.
+    """
+    if hasattr(arquivo, "temporary_file_path"):
+        return arquivo.temporary_file_path()
+    nome = getattr(getattr(arquivo, "file", arquivo), "name", None)
+    if isinstance(nome, str) and os.path.isfile(nome):
+        return nome
+    return None
+
+
+@contextmanager
+def conteudo_mapeado(arquivo):
+    """
+    Expõe o conteúdo do arquivo sem copiá-lo para a memória do processo.
+
+    Arquivos em disco são mapeados (`mmap`, somente leitura): `hashlib`, `np.frombuffer`
+    e o Pillow leem direto das páginas do arquivo. Conteúdo sem arquivo em disco
+    (`BytesIO`) é lido normalmente.
+
+    Args:
+        arquivo (file): Upload, arquivo armazenado ou arquivo aberto em modo binário.
+
+    Yields:
+        mmap.mmap | bytes: Conteúdo do arquivo.
+    """
+    arquivo.seek(0)
+    caminho = caminho_local(arquivo)
+    if caminho is None:
+        yield arquivo.read()
+        return
+
+    try:
+        with open(caminho, "rb") as aberto:
+            mapa = mmap.mmap(aberto.fileno(), 0, access=mmap.ACCESS_READ)
+    except ValueError:
+        # Arquivo vazio: não há o que mapear.
+        yield b""
+        return
+    try:
+        yield mapa
+    finally:
+        try:
+            mapa.close()
+        except BufferError:
+            # Ainda há arrays apontando para o mapa; ele é liberado quando forem coletados.
+            logger.debug("Mapa do upload mantido até a coleta dos buffers exportados.")
+
+
+@contextmanager
+def caminho_em_disco(arquivo, sufixo: str = ""):
+    """
+    Garante um caminho em disco para o conteúdo (ex.: para abri-lo em outro processo).
+
+    Usa o próprio arquivo quando ele já está em disco; conteúdo em memória é copiado
+    para um arquivo temporário, removido ao sair.
+
+    Args:
+        arquivo (file): Upload, arquivo armazenado ou arquivo aberto em modo binário.
+        sufixo (str): Extensão do arquivo temporário (ex.: `.pdf`).
+
+    Yields:
+        str: Caminho do arquivo.
+    """
+    caminho = caminho_local(arquivo)
+    if caminho is not None:
+        yield caminho
+        return
+
+    import shutil
+    import tempfile
+    arquivo.seek(0)
+    with tempfile.NamedTemporaryFile(suffix=sufixo, delete=False) as temporario:
+        shutil.copyfileobj(arquivo, temporario, 1024 * 1024)
+    try:
+        yield temporario.name
+    finally:
+        os.unlink(temporario.name)
@@ -23,6 +23,11 @@ urlpatterns = [
     path("receitas/<int:pk>/editar/", v.editar_receita, name="receita_editar"),
     path("receitas/<int:pk>/deletar/", v.deletar_receita, name="receita_deletar"),
     path("importar/NFe/", v.importar_NFe, name="despesa_importar_nfe"),
+    path("importar/NFe/lote/", v.importar_lote_NFe, name="despesa_importar_nfe_lote"),
+    path("importar/NFe/lote/<int:pk>/", v.lote_importacao_NFe, name="despesa_importar_nfe_lote_detalhe"),
+    path("importar/NFe/lote/<int:pk>/cancelar/", v.cancelar_lote_importacao_NFe, name="despesa_importar_nfe_lote_cancelar"),
+    path("importar/NFe/<int:pk>/status/", v.status_importacao_NFe, name="despesa_importar_nfe_status"),
+    path("importar/NFe/<int:pk>/cancelar/", v.cancelar_importacao_NFe, name="despesa_importar_nfe_cancelar"),
     path('primeiros-passos/renda/', v.onboarding_renda, name='onboarding_renda'),
     path('primeiros-passos/alertas/', v.onboarding_notificacoes, name='onboarding_notificacoes'),
 ]
\ No newline at end of file
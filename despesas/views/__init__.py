@@ -2,7 +2,7 @@ from .core import home, pagina_login, pagina_cadastro
 from .despesa import listar_despesa, criar_despesa, editar_despesa, deletar_despesa
 from .categoria import listar_categorias, criar_categoria, editar_categoria, deletar_categoria
 from .receita import listar_receitas, criar_receita, editar_receita, deletar_receita
-from .nfe import importar_NFe
+from .nfe import importar_NFe, status_importacao_NFe, cancelar_importacao_NFe, importar_lote_NFe, lote_importacao_NFe, cancelar_lote_importacao_NFe
 from .configuracao import configurar_notificacoes, configurar_financas, deletar_conta
 from .dashboard import dashboard
 from .onboarding import onboarding_renda, onboarding_notificacoes
\ No newline at end of file
@@ -149,6 +149,7 @@ def criar_despesa(request):
                                     forma_pagamento=dados_base['forma_pagamento'],
                                     tipo=dados_base['tipo'],
                                     observacoes=dados_base['observacoes'] + f" (Recorrência {i+1}/{meses_restantes})",
+                                    chave_acesso=dados_base.get('chave_acesso') if i == 0 else None,
                                     desconto=dados_base.get('desconto', 0),
                                     valor=valor_parcela_atual,
                                     parcela_atual=1,
@@ -196,6 +197,7 @@ def criar_despesa(request):
                                     forma_pagamento=dados_base['forma_pagamento'],
                                     tipo=dados_base['tipo'],
                                     observacoes=dados_base['observacoes'],
+                                    chave_acesso=dados_base.get('chave_acesso') if i == 0 else None,
                                     desconto=desc_parcela,                            
                                     valor=valor_parcela_atual,
                                     parcela_atual=i + 1,
@@ -1,105 +1,339 @@
-from django.shortcuts import render
+from django.shortcuts import render, redirect, get_object_or_404
+from django.contrib import messages
 from django.contrib.auth.decorators import login_required
+from django.db import transaction
+from django.http import JsonResponse
+from django.template.loader import render_to_string
+from django.urls import reverse
 from django.utils import timezone
+from django.views.decorators.http import require_POST
 from django import forms
-from despesas.models import ItemDespesa, Despesa
-from despesas.forms import DespesaForm, UploadNFeForm, ItemDespesaForm
+from despesas.enums.status_importacao_enum import StatusImportacao
+from despesas.models import ItemDespesa, Despesa, ImportacaoNFe, LoteImportacaoNFe
+from despesas.forms import DespesaForm, UploadNFeForm, UploadLoteNFeForm, ItemDespesaForm, ItemDespesaFormSet
+from despesas.services import medicao
 from despesas.services.nfe_service import NFeService
+from despesas.services.importacao_nfe import (
+    atualizar_lote_parado,
+    cancelar_importacao,
+    cancelar_lote,
+    criar_importacao,
+    criar_lote,
+    desserializar_dados,
+    despesa_lancada,
+    eh_pdf,
+    expirar_importacoes_paradas,
+    hash_upload,
+    localizar_despesa_lancada,
+    processar_arquivo,
+)
+from despesas.tasks import task_processar_importacao_nfe, task_processar_lote_nfe
 import logging
 
 logger = logging.getLogger(__name__)
 
+
+def _montar_formulario_despesa(request, scraped: dict, url: str | None, is_pdf: bool):
+    """
+    Monta o formulário de despesa e o formset de itens a partir dos dados extraídos da nota.
+
+    Args:
+        request (HttpRequest): A requisição HTTP (usada para o usuário dono da despesa).
+        scraped (dict): Dados extraídos pelo NFeService.
+        url (str | None): URL do QR Code lido, quando houver.
+        is_pdf (bool): Se a nota veio de um arquivo PDF.
+
+    Returns:
+        tuple[DespesaForm, BaseInlineFormSet]: Formulário e formset pré-preenchidos.
+    """
+    service = NFeService()
+    emitente = scraped.get("emitente") or ""
+    pagamento_detectado = scraped.get("forma_pagamento_key")
+    with medicao.etapa("categoria"):
+        categoria = service.identificar_categoria(request.user, emitente or "", scraped.get("cnpj"))
+    initial_data = {
+        "emitente_nome": emitente,
+        "emitente_cnpj": scraped.get("cnpj") or "",
+        "descricao": emitente,
+        "valor": scraped.get("valor_total") or 0,
+        "desconto": scraped.get("desconto") or 0,
+        "parcelas_selecao": scraped.get("parcelas") or 1,
+        "forma_pagamento": pagamento_detectado if pagamento_detectado else None,
+        "data": scraped.get("data_emissao") or timezone.localdate(),
+        "categoria": categoria,
+        "chave_acesso": scraped.get("chave_acesso") or "",
+        "observacoes": f"Importado via QR Code.\nLink SEFAZ: {url}" if (url and not is_pdf) else "Importado via arquivo."
+    }
+
+    form_desp = DespesaForm(user=request.user, initial=initial_data)
+    initial_itens = []
+    for item in scraped.get("itens", []):
+        initial_itens.append({
+            'nome': item['nome'],
+            'quantidade': item.get('qtd') or 1,
+            'unidade': item.get('unidade', 'UN'),
+            'valor_unitario': item.get('vl_unit') or 0,
+            'valor_total': item.get('vl_total') or 0
+        })
+
+    medicao.marcar(itens=len(initial_itens))
+    qtd_itens = len(initial_itens) or 1
+
+    ItemDespesaNFeFormSet = forms.inlineformset_factory(
+        Despesa,
+        ItemDespesa,
+        form=ItemDespesaForm,
+        extra=qtd_itens,
+        min_num=0,
+        validate_min=False,
+        can_delete=True
+    )
+
+    formset = ItemDespesaNFeFormSet(
+        queryset=ItemDespesa.objects.none(),
+        initial=initial_itens,
+        prefix='itens'
+    )
+    return form_desp, formset
+
+
 @login_required
 def importar_NFe(request):
     """
     Controlador para o processo de importação de NFe (Nota Fiscal Eletrônica).
 
-    Recebe o upload de imagem (QR Code) ou PDF. Delega o processamento ao NFeService,
-    captura os dados retornados (emitente, totais, itens) e prepara o formulário
-    de despesa pré-preenchido para revisão do usuário.
+    Recebe o upload de imagem (QR Code) ou PDF. Em requisições AJAX, registra um job
+    de importação processado em background e responde imediatamente com a URL de status;
+    nas demais, delega o processamento ao NFeService na própria requisição e prepara o
+    formulário de despesa pré-preenchido para revisão do usuário. Se a chave de acesso
+    da nota já foi lançada (lida do XML ou do QR Code já decodificado), responde com a
+    despesa existente antes de qualquer processamento.
 
     Args:
         request (HttpRequest): A requisição HTTP contendo o arquivo 'imagem'.
 
     Returns:
-        HttpResponse: Renderiza o formulário de despesa preenchido ou a página de upload.
+        HttpResponse | JsonResponse: Dados do job (AJAX), formulário preenchido ou a página de upload.
     """
     if request.method == "POST":
-        form = UploadNFeForm(request.POST, request.FILES)
+        form = UploadNFeForm(request.POST, request.FILES, recusados=getattr(request, "uploads_recusados", None))
         if not form.is_valid():
+            if request.headers.get('x-requested-with') == 'XMLHttpRequest':
+                return JsonResponse({"success": False, "errors": form.errors.get_json_data()}, status=400)
             return render(request, "despesas/importar_NFe.html", {"form": form})
 
         arquivo = form.cleaned_data["imagem"]
-        content_type = (arquivo.content_type or "").lower()
-        filename = (arquivo.name or "").lower()        
-        scraped = {}
-        url = None
-        is_pdf = content_type == 'application/pdf' or filename.endswith('.pdf')
-        
-        service = NFeService()
+        ajax = request.headers.get('x-requested-with') == 'XMLHttpRequest'
+        hash_arquivo = hash_upload(arquivo)
+        existente = localizar_despesa_lancada(request.user, arquivo, hash_arquivo)
+        if existente:
+            return _responder_nota_lancada(request, existente, ajax)
 
+        if ajax:
+            importacao, criada = criar_importacao(request.user, arquivo, hash_arquivo=hash_arquivo)
+            if criada:
+                transaction.on_commit(lambda: task_processar_importacao_nfe.delay(importacao.pk))
+            return JsonResponse(_status_importacao(request, importacao), status=202)
+
+        is_pdf = eh_pdf(arquivo.content_type, arquivo.name)
+        scraped, url = {}, None
         try:
-            if is_pdf:
-                scraped = service.processar_danfe_pdf(arquivo)
-            else:
-                img_bytes = arquivo.read()
-                url = service.decodificar_qr_code(img_bytes)
-                if url:
-                    scraped = service.extrair_dados_url(url)
+            scraped, url = processar_arquivo(NFeService(), arquivo, arquivo.content_type, arquivo.name)
         except Exception as e:
             logger.error(f"Error importing NFe: {e}")
 
-        
-        emitente = scraped.get("emitente") or ""
-        pagamento_detectado = scraped.get("forma_pagamento_key")        
-        initial_data = {
-            "emitente_nome": emitente,
-            "emitente_cnpj": scraped.get("cnpj") or "",
-            "descricao": emitente,
-            "valor": scraped.get("valor_total") or 0, 
-            "desconto": scraped.get("desconto") or 0,
-            "parcelas_selecao": scraped.get("parcelas") or 1,
-            "forma_pagamento": pagamento_detectado if pagamento_detectado else None,
-            "data": scraped.get("data_emissao") or timezone.localdate(),
-            "categoria": service.identificar_categoria(request.user, emitente or ""),
-            "observacoes": f"Importado via QR Code.\nLink SEFAZ: {url}" if (url and not is_pdf) else "Importado via arquivo."
-        }
-
-        form_desp = DespesaForm(user=request.user, initial=initial_data)        
-        initial_itens = []
-        for item in scraped.get("itens", []):
-            initial_itens.append({
-                'nome': item['nome'],
-                'quantidade': item.get('qtd') or 1, 
-                'unidade': item.get('unidade', 'UN'), 
-                'valor_unitario': item.get('vl_unit') or 0,
-                'valor_total': item.get('vl_total') or 0
-            })
-            
-        qtd_itens = len(initial_itens) or 1
-        
-        ItemDespesaNFeFormSet = forms.inlineformset_factory(
-            Despesa, 
-            ItemDespesa, 
-            form=ItemDespesaForm,
-            extra=qtd_itens, 
-            min_num=0, 
-            validate_min=False,
-            can_delete=True
-        )
-        
-        formset = ItemDespesaNFeFormSet(
-            queryset=ItemDespesa.objects.none(), 
-            initial=initial_itens,
-            prefix='itens' 
-        )
-
-        if request.headers.get('x-requested-with') == 'XMLHttpRequest':
-            return render(request, "despesas/despesa_form/main.html", {
-                "form": form_desp, 
-                "formset": formset
-            })
-
-        return render(request, "despesas/despesa_form/despesa_form_completo.html", {"form": form_desp, "formset": formset})
-
-    return render(request, "despesas/importar_NFe.html", {"form": UploadNFeForm()})
\ No newline at end of file
+        existente = despesa_lancada(request.user.pk, scraped.get("chave_acesso"))
+        if existente:
+            return _responder_nota_lancada(request, existente, ajax)
+        form_desp, formset = _montar_formulario_despesa(request, scraped, url, is_pdf)
+        with medicao.etapa("formulario"):
+            return render(request, "despesas/despesa_form/despesa_form_completo.html", {"form": form_desp, "formset": formset})
+
+    return render(request, "despesas/importar_NFe.html", {"form": UploadNFeForm()})
+
+
+def _html_nota_lancada(request, despesa: Despesa) -> str:
+    """Formulário de edição da despesa já lançada com a mesma chave de acesso."""
+    form_desp = DespesaForm(instance=despesa, user=request.user)
+    formset = ItemDespesaFormSet(instance=despesa, prefix="itens")
+    return render_to_string(
+        "despesas/despesa_form/main.html",
+        {"form": form_desp, "formset": formset, "edicao": True, "despesa_obj": despesa, "nota_ja_lancada": True},
+        request=request,
+    )
+
+
+def _responder_nota_lancada(request, despesa: Despesa, ajax: bool):
+    """
+    Encerra a importação de uma nota já lançada apontando para a despesa existente.
+
+    Em AJAX responde no formato do status de um job concluído, com o formulário de
+    edição da despesa no lugar do rascunho; nas demais, redireciona para a edição.
+    """
+    logger.info(f"Nota já lançada na despesa {despesa.pk}; importação dispensada.")
+    if ajax:
+        return JsonResponse({
+            "status": StatusImportacao.CONCLUIDA,
+            "finalizada": True,
+            "despesa_existente": despesa.pk,
+            "html": _html_nota_lancada(request, despesa),
+        })
+    messages.info(request, "Esta nota já foi lançada.")
+    return redirect("despesa_editar", pk=despesa.pk)
+
+
+def _incorporar_medicao_job(medicao_job: dict | None):
+    """
+    Repassa à medição da requisição as etapas do job concluído (QR, SEFAZ, parsing).
+
+    Assim o `Server-Timing` da resposta que entrega o rascunho mostra o tempo de cada
+    etapa do processamento em background, além da categorização e do formulário.
+    """
+    if not medicao_job:
+        return
+    for nome, duracao in (medicao_job.get("etapas_ms") or {}).items():
+        medicao.adicionar(nome, duracao)
+    medicao.adicionar("job", medicao_job.get("total_ms") or 0.0)
+    medicao.marcar(**{chave: valor for chave, valor in medicao_job.items() if chave not in ("etapas_ms", "total_ms")})
+
+
+def _status_importacao(request, importacao: ImportacaoNFe) -> dict:
+    dados = {
+        "id": importacao.pk,
+        "status": importacao.status,
+        "finalizada": importacao.finalizada,
+        "status_url": reverse("despesa_importar_nfe_status", args=[importacao.pk]),
+        "cancelar_url": reverse("despesa_importar_nfe_cancelar", args=[importacao.pk]),
+    }
+    if importacao.status == StatusImportacao.ERRO:
+        dados["erro"] = "Não foi possível processar a nota."
+    existente = None
+    if importacao.status == StatusImportacao.CONCLUIDA and (importacao.resultado or {}).get("despesa_existente"):
+        existente = Despesa.objects.filter(pk=importacao.resultado["despesa_existente"], user=request.user).first()
+    parcial = importacao.status == StatusImportacao.PROCESSANDO and bool((importacao.resultado or {}).get("parcial"))
+    if existente:
+        dados["despesa_existente"] = existente.pk
+        dados["html"] = _html_nota_lancada(request, existente)
+    elif importacao.status == StatusImportacao.CONCLUIDA or parcial:
+        scraped = desserializar_dados(importacao.resultado)
+        _incorporar_medicao_job(scraped.get("medicao"))
+        is_pdf = eh_pdf(importacao.content_type, importacao.nome_arquivo)
+        form_desp, formset = _montar_formulario_despesa(request, scraped, importacao.url or None, is_pdf)
+        dados["parcial"] = parcial
+        with medicao.etapa("formulario"):
+            dados["html"] = render_to_string(
+                "despesas/despesa_form/main.html",
+                {"form": form_desp, "formset": formset, "rascunho_parcial": parcial},
+                request=request,
+            )
+    return dados
+
+
+@login_required
+def status_importacao_NFe(request, pk: int):
+    """
+    Retorna o andamento de um job de importação.
+
+    Enquanto o job está pendente responde apenas o status (um job parado além de
+    `NFE_IMPORTACAO_PRAZO` passa a erro). Em processamento, assim que
+    o QR Code é lido, inclui o rascunho parcial montado a partir da chave de acesso
+    (`parcial=True`); quando concluído, o formulário de despesa completo.
+
+    Args:
+        request (HttpRequest): A requisição HTTP.
+        pk (int): ID do job de importação.
+
+    Returns:
+        JsonResponse: Status do job e, quando pronto, o rascunho da despesa.
+    """
+    expirar_importacoes_paradas(ImportacaoNFe.objects.filter(pk=pk, user=request.user))
+    importacao = get_object_or_404(ImportacaoNFe, pk=pk, user=request.user)
+    return JsonResponse(_status_importacao(request, importacao))
+
+
+@login_required
+@require_POST
+def cancelar_importacao_NFe(request, pk: int):
+    """
+    Cancela um job de importação pendente ou em processamento.
+
+    Args:
+        request (HttpRequest): A requisição HTTP.
+        pk (int): ID do job de importação.
+
+    Returns:
+        JsonResponse: Indica se o job foi cancelado.
+    """
+    importacao = get_object_or_404(ImportacaoNFe, pk=pk, user=request.user)
+    return JsonResponse({"success": cancelar_importacao(importacao)})
+
+
+@login_required
+def importar_lote_NFe(request):
+    """
+    Recebe várias notas (imagens, PDFs ou um ZIP) em um único envio.
+
+    Cria um lote com um job por arquivo, agenda o processamento paralelo e
+    redireciona para a página de revisão do lote.
+
+    Args:
+        request (HttpRequest): A requisição HTTP contendo os arquivos em 'arquivos'.
+
+    Returns:
+        HttpResponse: Página de upload ou redirecionamento para o lote criado.
+    """
+    if request.method == "POST":
+        form = UploadLoteNFeForm(request.POST, request.FILES, recusados=getattr(request, "uploads_recusados", None))
+        if form.is_valid():
+            lote = criar_lote(request.user, form.cleaned_data["arquivos"])
+            transaction.on_commit(lambda: task_processar_lote_nfe.delay(lote.pk))
+            return redirect("despesa_importar_nfe_lote_detalhe", pk=lote.pk)
+    else:
+        form = UploadLoteNFeForm()
+    return render(request, "despesas/importacao_lote.html", {"form": form})
+
+
+@login_required
+def lote_importacao_NFe(request, pk: int):
+    """
+    Exibe os rascunhos de despesa de um lote para revisão, com a vazão do processamento.
+
+    Um lote interrompido (jobs parados além de `NFE_IMPORTACAO_PRAZO`) é encerrado aqui,
+    com os jobs parados marcados com erro.
+
+    Args:
+        request (HttpRequest): A requisição HTTP.
+        pk (int): ID do lote.
+
+    Returns:
+        HttpResponse: Lista dos jobs do lote com status e dados extraídos.
+    """
+    lote = get_object_or_404(LoteImportacaoNFe, pk=pk, user=request.user)
+    atualizar_lote_parado(lote)
+    importacoes = list(lote.importacoes.order_by("id"))
+    context = {
+        "lote": lote,
+        "importacoes": importacoes,
+        "concluidas": sum(1 for i in importacoes if i.status == StatusImportacao.CONCLUIDA),
+        "erros": sum(1 for i in importacoes if i.status == StatusImportacao.ERRO),
+        "em_andamento": any(not i.finalizada for i in importacoes),
+    }
+    return render(request, "despesas/importacao_lote.html", context)
+
+
+@login_required
+@require_POST
+def cancelar_lote_importacao_NFe(request, pk: int):
+    """
+    Cancela as notas ainda não processadas de um lote.
+
+    Args:
+        request (HttpRequest): A requisição HTTP.
+        pk (int): ID do lote.
+
+    Returns:
+        HttpResponse: Redirecionamento para a página do lote.
+    """
+    lote = get_object_or_404(LoteImportacaoNFe, pk=pk, user=request.user)
+    cancelar_lote(lote)
+    return redirect("despesa_importar_nfe_lote_detalhe", pk=lote.pk)
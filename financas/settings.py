@@ -28,6 +28,7 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
     "whitenoise.middleware.WhiteNoiseMiddleware",
+    "despesas.middleware.ServerTimingMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
@@ -66,6 +67,74 @@ DATABASES = {
     )
 }
 
+# Cache compartilhado entre os workers do Gunicorn: Redis quando configurado, senão tabela no banco
+# (criada com `manage.py createcachetable`). MAX_ENTRIES limita o tamanho no backend de banco; no Redis
+# o limite é o maxmemory do servidor.
+CACHE_REDIS_URL = config('CACHE_REDIS_URL', default='')
+if CACHE_REDIS_URL:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": CACHE_REDIS_URL,
+            "KEY_PREFIX": "financas",
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.db.DatabaseCache",
+            "LOCATION": "financas_cache",
+            "OPTIONS": {
+                "MAX_ENTRIES": config('CACHE_MAX_ENTRADAS', default=5000, cast=int),
+                "CULL_FREQUENCY": 4,
+            },
+        }
+    }
+
+NFE_CACHE_QR_TTL = config('NFE_CACHE_QR_TTL', default=60 * 60 * 24 * 30, cast=int)
+NFE_CACHE_QR_TTL_NEGATIVO = config('NFE_CACHE_QR_TTL_NEGATIVO', default=60 * 10, cast=int)
+NFE_CACHE_NOTA_TTL = config('NFE_CACHE_NOTA_TTL', default=60 * 60 * 24 * 180, cast=int)
+# Cliente HTTP dos portais da SEFAZ: pool keep-alive por host, concorrência limitada e retry com jitter.
+NFE_HTTP_TIMEOUT_CONEXAO = config('NFE_HTTP_TIMEOUT_CONEXAO', default=5, cast=float)
+NFE_HTTP_TIMEOUT_LEITURA = config('NFE_HTTP_TIMEOUT_LEITURA', default=15, cast=float)
+NFE_HTTP_TENTATIVAS = config('NFE_HTTP_TENTATIVAS', default=2, cast=int)
+# Teto de uma consulta inteira, somando as novas tentativas (só falhas de conexão e 5xx são repetidas).
+NFE_HTTP_PRAZO_TOTAL = config('NFE_HTTP_PRAZO_TOTAL', default=20, cast=float)
+NFE_HTTP_CONEXOES_POR_HOST = config('NFE_HTTP_CONEXOES_POR_HOST', default=4, cast=int)
+NFE_HTTP_SIMULTANEAS_POR_HOST = config('NFE_HTTP_SIMULTANEAS_POR_HOST', default=4, cast=int)
+# Circuit breaker por host da SEFAZ (estado no Redis do cache, compartilhado entre os workers;
+# sem CACHE_REDIS_URL, por processo): abre com a taxa de falhas ou
+# respostas acima do orçamento de latência na janela e recusa consultas durante a espera.
+NFE_CIRCUITO_JANELA = config('NFE_CIRCUITO_JANELA', default=60, cast=int)
+NFE_CIRCUITO_MIN_REQUISICOES = config('NFE_CIRCUITO_MIN_REQUISICOES', default=5, cast=int)
+NFE_CIRCUITO_TAXA_FALHAS = config('NFE_CIRCUITO_TAXA_FALHAS', default=0.5, cast=float)
+NFE_CIRCUITO_LATENCIA_MAXIMA = config('NFE_CIRCUITO_LATENCIA_MAXIMA', default=8, cast=float)
+NFE_CIRCUITO_ESPERA = config('NFE_CIRCUITO_ESPERA', default=30, cast=int)
+
+# Importações de NFe em background: reenvios do mesmo arquivo dentro da janela reaproveitam o job.
+NFE_IMPORTACAO_JANELA_DEDUP = config('NFE_IMPORTACAO_JANELA_DEDUP', default=60 * 60, cast=int)
+# Jobs em processamento sem atualização por mais que este prazo (s) são dados como interrompidos
+# (thread ou worker morto) e marcados com erro, liberando o reenvio do arquivo.
+NFE_IMPORTACAO_PRAZO = config('NFE_IMPORTACAO_PRAZO', default=10 * 60, cast=int)
+# Intervalo (s) entre as gravações em lote das métricas dos parsers SEFAZ de cada processo.
+NFE_PARSER_METRICAS_INTERVALO = config('NFE_PARSER_METRICAS_INTERVALO', default=60, cast=int)
+# Tempos por etapa da importação (QR, SEFAZ, parsing, categoria, formulário) no cabeçalho Server-Timing.
+# Expõe o host da SEFAZ e tempos internos: fora do DEBUG, só usuários staff recebem o cabeçalho.
+NFE_SERVER_TIMING = config('NFE_SERVER_TIMING', default=DEBUG, cast=bool)
+# Importação em lote: arquivos processados em paralelo por um pool de processos.
+NFE_PROCESSOS = config('NFE_PROCESSOS', default=max(1, min(4, (os.cpu_count() or 1))), cast=int)
+# DANFEs a partir deste número de páginas têm as páginas divididas entre o pool (0 desliga).
+NFE_PDF_PAGINAS_PARALELO = config('NFE_PDF_PAGINAS_PARALELO', default=8, cast=int)
+NFE_LOTE_MAX_ARQUIVOS = config('NFE_LOTE_MAX_ARQUIVOS', default=50, cast=int)
+NFE_LOTE_TAMANHO_MAXIMO_ZIP = config('NFE_LOTE_TAMANHO_MAXIMO_ZIP', default=200 * 1024 * 1024, cast=int)
+# Uploads vão direto para arquivos temporários (nunca inteiros na memória) e são recusados ainda
+# durante a leitura ao passar do limite; a leitura de QR e de PDF usa o arquivo por mmap/caminho.
+NFE_UPLOAD_TAMANHO_MAXIMO = config('NFE_UPLOAD_TAMANHO_MAXIMO', default=25 * 1024 * 1024, cast=int)
+FILE_UPLOAD_HANDLERS = [
+    "despesas.uploads.LimiteTamanhoUploadHandler",
+    "django.core.files.uploadhandler.TemporaryFileUploadHandler",
+]
+
 if DEBUG:
     # Em desenvolvimento local, usa sistema de arquivos para evitar dependencias extras (como redis ou sqlalchemy)
     import os
@@ -84,6 +153,30 @@ else:
     CELERY_TASK_ALWAYS_EAGER = True 
     CELERY_TASK_EAGER_PROPAGATES = True
 
+# Processo dedicado de leitura de QR Code (manage.py qr_worker). Vazio = decodifica no próprio worker web.
+QR_WORKER_ENDERECO = config('QR_WORKER_ENDERECO', default='')
+QR_WORKER_CAPACIDADE_FILA = config('QR_WORKER_CAPACIDADE_FILA', default=8, cast=int)
+QR_WORKER_TIMEOUT = config('QR_WORKER_TIMEOUT', default=30, cast=float)
+QR_WORKER_FALLBACK_LOCAL = config('QR_WORKER_FALLBACK_LOCAL', default=True, cast=bool)
+# Ordem da cascata de decodificação de QR Code: zbar, opencv, limiar, qreader.
+QR_DECODIFICADORES = config('QR_DECODIFICADORES', default='zbar,opencv,limiar,qreader', cast=Csv())
+# Backend da camada neural (qreader): torch (QReader) ou o mesmo modelo em ONNX via onnxruntime ou
+# opencv (cv2.dnn), sem torch. O modelo ONNX é gerado por `manage.py exportar_detector_qr`.
+QR_DETECTOR_BACKEND = config('QR_DETECTOR_BACKEND', default='torch')
+QR_DETECTOR_MODELO = config('QR_DETECTOR_MODELO', default=str(BASE_DIR / 'modelos' / 'qrdet-n.onnx'))
+QR_DETECTOR_TAMANHO = config('QR_DETECTOR_TAMANHO', default=640, cast=int)
+QR_DETECTOR_CONFIANCA = config('QR_DETECTOR_CONFIANCA', default=0.5, cast=float)
+# Variantes pré-processadas do recorte do QR tentadas em paralelo quando a leitura direta falha
+# (limiar, clahe, nitidez, ampliacao, inversao, rotacao); a primeira que decodifica vence.
+QR_VARIANTES = config('QR_VARIANTES', default='limiar,clahe,nitidez,ampliacao,inversao,rotacao', cast=Csv())
+QR_VARIANTES_THREADS = config('QR_VARIANTES_THREADS', default=3, cast=int)
+# Largura da imagem de trabalho da cascata; a nova tentativa relê o recorte do QR em resolução plena.
+QR_LARGURA_MAXIMA = config('QR_LARGURA_MAXIMA', default=1000, cast=int)
+# Lotes de imagens (NFeService.decodificar_qr_codes): threads do pré-processamento e máximo de
+# imagens por inferência do detector ONNX.
+QR_LOTE_THREADS = config('QR_LOTE_THREADS', default=min(4, os.cpu_count() or 1), cast=int)
+QR_LOTE_TAMANHO = config('QR_LOTE_TAMANHO', default=8, cast=int)
+
 CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
@@ -41,6 +41,24 @@ document.addEventListener('DOMContentLoaded', function () {
     }
 });
 
+window.revisarImportacao = function(statusUrl) {
+    fetch(statusUrl, { headers: { "X-Requested-With": "XMLHttpRequest" } })
+    .then(res => res.json())
+    .then(dados => {
+        if (dados.html) exibirRascunhoImportado(dados.html);
+    })
+    .catch(err => {
+        alert("Erro ao carregar nota. Tente novamente.");
+        console.error(err);
+    });
+};
+document.addEventListener('DOMContentLoaded', function () {
+    const lote = document.getElementById('loteImportacao');
+    if (lote && lote.dataset.emAndamento === 'true') {
+        setTimeout(() => window.location.reload(), 3000);
+    }
+});
+
 document.addEventListener('submit', function(e) {
     if (e.target && e.target.id === 'formImportarNF') {
         e.preventDefault(); 
@@ -122,6 +140,97 @@ function conectarSubmitFormulario() {
         });
     });
 }
+function exibirRascunhoImportado(html) {
+    const modalImportarEl = document.getElementById('modalImportar');
+    const modalInstance = modalImportarEl ? bootstrap.Modal.getInstance(modalImportarEl) : null;
+    if (modalInstance) modalInstance.hide();
+    const modalDespesaEl = document.getElementById('modalNovaDespesa');
+    const modalDespesa = bootstrap.Modal.getOrCreateInstance(modalDespesaEl);        
+    document.getElementById('modalDespesaBody').innerHTML = html;
+    modalDespesa.show();
+    conectarSubmitFormulario();
+    if (typeof window.inicializarScriptsFormulario === 'function') {
+        window.inicializarScriptsFormulario();
+    }
+}
+function exibirRascunhoParcial(html) {
+    exibirRascunhoImportado(html);
+    const form = document.getElementById('formNovaDespesa');
+    if (form) form.addEventListener('input', () => { form.dataset.editado = 'true'; }, { once: true });
+}
+function aplicarRascunhoFinal(html) {
+    const aviso = document.getElementById('avisoRascunhoParcial');
+    if (!aviso) {
+        exibirRascunhoImportado(html);
+        return;
+    }
+    const modalDespesaEl = document.getElementById('modalNovaDespesa');
+    if (!modalDespesaEl.classList.contains('show')) return;
+    const form = document.getElementById('formNovaDespesa');
+    if (!form || form.dataset.editado !== 'true') {
+        exibirRascunhoImportado(html);
+        return;
+    }
+    aviso.className = 'alert alert-success py-2 small d-flex justify-content-between align-items-center';
+    aviso.innerHTML = '<span>Itens e totais da nota carregados.</span>';
+    const btn = document.createElement('button');
+    btn.type = 'button';
+    btn.className = 'btn btn-sm btn-success';
+    btn.textContent = 'Aplicar';
+    btn.addEventListener('click', () => exibirRascunhoImportado(html));
+    aviso.appendChild(btn);
+}
+function acompanharImportacao(job, csrfToken) {
+    const modalImportarEl = document.getElementById('modalImportar');
+    return new Promise((resolve, reject) => {
+        let encerrado = false;
+        let parcialExibido = false;
+        let intervalo = 250;
+        const aoFecharModal = () => {
+            if (encerrado) return;
+            encerrado = true;
+            fetch(job.cancelar_url, {
+                method: 'POST',
+                headers: { "X-Requested-With": "XMLHttpRequest", "X-CSRFToken": csrfToken }
+            });
+            resolve(null);
+        };
+        modalImportarEl.addEventListener('hidden.bs.modal', aoFecharModal, { once: true });
+        const consultar = (dados) => {
+            if (encerrado) return;
+            if (dados.finalizada) {
+                encerrado = true;
+                modalImportarEl.removeEventListener('hidden.bs.modal', aoFecharModal);
+                if (dados.html) resolve(dados.html);
+                else if (parcialExibido) {
+                    const aviso = document.getElementById('avisoRascunhoParcial');
+                    if (aviso) {
+                        aviso.className = 'alert alert-warning py-2 small';
+                        aviso.textContent = 'Não foi possível obter os itens da nota. Complete os dados manualmente.';
+                    }
+                    resolve(null);
+                }
+                else reject(new Error(dados.erro || dados.status));
+                return;
+            }
+            if (dados.parcial && dados.html && !parcialExibido) {
+                // O rascunho da chave de acesso aparece antes da consulta à SEFAZ; fechar o
+                // modal de importação a partir daqui não cancela mais o job.
+                parcialExibido = true;
+                modalImportarEl.removeEventListener('hidden.bs.modal', aoFecharModal);
+                exibirRascunhoParcial(dados.html);
+            }
+            setTimeout(() => {
+                fetch(dados.status_url, { headers: { "X-Requested-With": "XMLHttpRequest" } })
+                    .then(res => res.json())
+                    .then(consultar)
+                    .catch(err => { encerrado = true; reject(err); });
+            }, intervalo);
+            intervalo = Math.min(intervalo * 2, 1000);
+        };
+        consultar(job);
+    });
+}
 function handleImportarNF_Lista(e) {
     e.preventDefault(); 
     const form = e.target;
@@ -130,24 +239,23 @@ function handleImportarNF_Lista(e) {
     if(btn) btn.disabled = true;
     if(loading) loading.classList.remove('d-none');
     const formData = new FormData(form);
+    const csrfToken = formData.get('csrfmiddlewaretoken');
     fetch(form.action, {
         method: 'POST',
         body: formData,
         headers: { "X-Requested-With": "XMLHttpRequest" }
     })
-    .then(res => res.text())
-    .then(html => {
-        const modalImportarEl = document.getElementById('modalImportar');
-        const modalInstance = bootstrap.Modal.getInstance(modalImportarEl);
-        if (modalInstance) modalInstance.hide();
-        const modalDespesaEl = document.getElementById('modalNovaDespesa');
-        const modalDespesa = bootstrap.Modal.getOrCreateInstance(modalDespesaEl);        
-        document.getElementById('modalDespesaBody').innerHTML = html;
-        modalDespesa.show();
-        conectarSubmitFormulario();
-        if (typeof window.inicializarScriptsFormulario === 'function') {
-            window.inicializarScriptsFormulario();
+    .then(async res => {
+        const contentType = res.headers.get('content-type');
+        if (!(contentType && contentType.includes('application/json'))) {
+            return res.text();
         }
+        const job = await res.json();
+        if (!res.ok) throw new Error("Arquivo inválido");
+        return acompanharImportacao(job, csrfToken);
+    })
+    .then(html => {
+        if (html) aplicarRascunhoFinal(html);
     })
     .catch(err => {
         alert("Erro ao processar nota. Tente novamente.");